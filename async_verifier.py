@@ -0,0 +1,446 @@
+"""
+纯 Python (asyncio) 验证引擎, 供没有 Go 环境的机器使用。
+
+输入输出与 Go 引擎一致: protocol / deep 模式接受 socks5.py 验证器的参数 (-inputFile -outputFile -threads
+-timeout -recordFile -recordMode), http 模式接受 http.py 扫描器的参数 (-pfile 或 stdin, -cfile -target
+-workers -output -record)。可用目标逐行打印到 stdout 并写入输出文件, 每个目标写一条 32 字节结果记录
+(格式见 result_log.py), 状态码与 Go 引擎相同。输入按批流式读取, 并发由固定数量的协程限制, 输出与记录
+攒批写出。支持 -topK / -maxLatency / -budget 与 -memLimit (按预算压低并发, RSS 接近预算时放慢派发,
+见 net_limits.MemoryGuard); 主机健康表、套接字配置与时间线参数会被接受但忽略。
+装有 uvloop 时自动使用。
+
+socks5.py 与 http.py 找不到 Go (且没有已编译的引擎) 时自动改用本引擎, --engine python 可强制使用。
+与 Go 引擎的吞吐对比见 engine_bench.py; 其它服务可通过 proxy_api.py 在进程内调用同样的检查。
+
+用法:
+    python async_verifier.py -mode deep -inputFile raw.txt -outputFile ok.txt -threads 500 -timeout 5
+    python async_verifier.py -mode http -pfile proxies.txt -cfile creds.txt -output valid.txt -workers 200
+"""
+import argparse
+import asyncio
+import base64
+import heapq
+import json
+import socket
+import ssl
+import sys
+import time
+from collections import namedtuple
+from urllib.parse import quote_plus, urlsplit
+
+import net_limits
+import result_log
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+READ_HINT = 1 << 16          # 每批读取约 64KB 输入
+FLUSH_INTERVAL = 0.5         # 输出与记录最多缓冲的秒数
+FLUSH_COUNT = 1024           # 缓冲的结果达到该条数时立即写出
+MAX_BODY = 1 << 20           # http 模式读取响应体的上限
+HTTP_EXTRA_TIMEOUT = 5       # 与 Go 扫描器相同: 整个请求的超时为 -timeout 加 5 秒
+DEEP_DEST = b"example.com"
+DEEP_PORT = 80
+DEFAULT_TARGET = "http://httpbin.org/ip"
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+_timeout = getattr(asyncio, "timeout", None)
+MODE_NAMES = {"protocol": "SOCKS5 协议验证", "deep": "深度连接验证", "http": "HTTP 代理验证"}
+MEM_TASK_KB = {"protocol": 24, "deep": 24, "http": 96}   # 每个进行中目标的估算内存
+
+Task = namedtuple("Task", "target host port user password")
+Result = namedtuple("Result", "task status latency_ms")
+
+
+def err_status(exc):
+    if isinstance(exc, (asyncio.TimeoutError, TimeoutError)):
+        return result_log.STATUS_TIMEOUT
+    return result_log.STATUS_CONNECT_FAILED
+
+
+async def _within(aw, timeout):
+    # Python 3.11+ 的 asyncio.timeout 不像 wait_for 那样为每次读写额外创建任务
+    if _timeout is None:
+        return await asyncio.wait_for(aw, timeout)
+    async with _timeout(timeout):
+        return await aw
+
+
+async def _dial(host, port, timeout):
+    return await _within(asyncio.open_connection(host, port), timeout)
+
+
+# ---------------- SOCKS5 -----------------
+
+async def _connect(host, port, timeout):
+    # SOCKS5 探测直接使用非阻塞套接字, 比 open_connection 少一层流对象, 回环测试中吞吐高约三成
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setblocking(False)
+    try:
+        await _within(asyncio.get_running_loop().sock_connect(sock, (host, port)), timeout)
+    except BaseException:
+        sock.close()
+        raise
+    return sock
+
+
+async def check_socks5(task, timeout, deep):
+    """与 Go 的 verifyProtocol / verifyProxyConnectivity 相同的判定, 返回状态码。"""
+    loop = asyncio.get_running_loop()
+    try:
+        sock = await _connect(task.host, task.port, timeout)
+    except (OSError, asyncio.TimeoutError) as e:
+        return err_status(e)
+    try:
+        await loop.sock_sendall(sock, b"\x05\x01\x00")
+        resp = await _within(loop.sock_recv(sock, 2), timeout)
+        if not resp:
+            return result_log.STATUS_CONNECT_FAILED
+        if resp != b"\x05\x00":
+            return result_log.STATUS_BAD_HANDSHAKE
+        if not deep:
+            return result_log.STATUS_OK
+        await loop.sock_sendall(sock, b"\x05\x01\x00\x03" + bytes([len(DEEP_DEST)]) + DEEP_DEST + DEEP_PORT.to_bytes(2, "big"))
+        reply = await _within(loop.sock_recv(sock, 10), timeout)
+        if not reply:
+            return result_log.STATUS_CONNECT_FAILED
+        return reply[1] if len(reply) >= 4 else result_log.STATUS_BAD_HANDSHAKE
+    except (OSError, asyncio.TimeoutError) as e:
+        return err_status(e)
+    finally:
+        sock.close()
+
+
+# ---------------- HTTP 代理 -----------------
+
+async def _read_response(reader, head_only=False):
+    """读取一个 HTTP/1.x 响应, 返回 (状态码, 响应体); 格式错误抛出 ValueError。"""
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError) as e:
+        if isinstance(e, asyncio.IncompleteReadError) and not e.partial:
+            raise ConnectionResetError("连接被关闭") from None
+        raise ValueError("响应头不完整") from None
+    lines = head.decode("latin-1").split("\r\n")
+    parts = lines[0].split(" ", 2)
+    if len(parts) < 2 or not parts[0].startswith("HTTP/") or not parts[1].isdigit():
+        raise ValueError("不是 HTTP 响应")
+    code = int(parts[1])
+    if head_only:
+        return code, b""
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        body = bytearray()
+        while len(body) <= MAX_BODY:
+            size = int((await reader.readuntil(b"\r\n")).split(b";", 1)[0], 16)
+            if size == 0:
+                break
+            body += await reader.readexactly(size + 2)
+            del body[-2:]
+        return code, bytes(body)
+    if "content-length" in headers:
+        return code, await reader.readexactly(min(int(headers["content-length"]), MAX_BODY))
+    return code, await reader.read(MAX_BODY)
+
+
+def _proxy_auth(task):
+    if not (task.user and task.password):
+        return ""
+    token = base64.b64encode(f"{task.user}:{task.password}".encode("utf-8")).decode("ascii")
+    return f"Proxy-Authorization: Basic {token}\r\n"
+
+
+async def _fetch_via_proxy(task, target, timeout):
+    url = urlsplit(target)
+    path = (url.path or "/") + (f"?{url.query}" if url.query else "")
+    reader, writer = await _dial(task.host, task.port, timeout)
+    try:
+        if url.scheme == "https":
+            port = url.port or 443
+            writer.write(f"CONNECT {url.hostname}:{port} HTTP/1.1\r\nHost: {url.hostname}:{port}\r\n{_proxy_auth(task)}\r\n".encode())
+            code, _ = await _read_response(reader, head_only=True)
+            if code != 200:
+                return code, b""
+            await writer.start_tls(ssl.create_default_context(), server_hostname=url.hostname)
+            request_target, auth = path, ""
+        else:
+            request_target, auth = target, _proxy_auth(task)
+        writer.write(f"GET {request_target} HTTP/1.1\r\nHost: {url.netloc}\r\nUser-Agent: {USER_AGENT}\r\n{auth}"
+                     f"Connection: close\r\n\r\n".encode())
+        return await _read_response(reader)
+    finally:
+        writer.transport.abort()
+
+
+async def _is_web_server(task, timeout):
+    # 直接请求代理地址本身, 2xx/3xx 说明这是一个 Web 服务器而不是代理 (不跟随重定向)
+    try:
+        reader, writer = await _dial(task.host, task.port, timeout)
+    except (OSError, asyncio.TimeoutError):
+        return False
+    try:
+        writer.write(f"GET / HTTP/1.1\r\nHost: {task.target}\r\nUser-Agent: Go-http-client/1.1\r\nConnection: close\r\n\r\n".encode())
+        code, _ = await _within(_read_response(reader, head_only=True), timeout)
+        return 200 <= code < 400
+    except (OSError, ValueError, asyncio.TimeoutError):
+        return False
+    finally:
+        writer.transport.abort()
+
+
+async def check_http(task, timeout, target):
+    """与 Go 扫描器的 checkProxy 相同: 经代理请求验证 URL, 返回的出口 IP 须包含代理主机, 再排除 Web 服务器。"""
+    try:
+        code, body = await _within(_fetch_via_proxy(task, target, timeout), timeout + HTTP_EXTRA_TIMEOUT)
+    except (OSError, asyncio.TimeoutError) as e:
+        return err_status(e), None
+    except (ValueError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+        return result_log.STATUS_CONNECT_FAILED, None  # Go 的 http.Client 把畸形响应也当作请求失败
+    if code != 200:
+        return code, None
+    try:
+        origin = json.loads(body).get("origin", "")
+    except (ValueError, AttributeError):
+        return result_log.STATUS_BAD_RESPONSE, None
+    if task.host not in str(origin):
+        return result_log.STATUS_BAD_RESPONSE, None
+    end = time.monotonic()  # 延迟不含 Web 服务器复核, 与 Go 扫描器一致
+    if await _is_web_server(task, timeout):
+        return result_log.STATUS_WEB_SERVER, end
+    return result_log.STATUS_OK, end
+
+
+async def probe(task, mode, timeout, target=DEFAULT_TARGET):
+    """按模式检查一个目标, 返回 (状态码, 延迟毫秒)。"""
+    start = time.monotonic()
+    if task.host is None:
+        return result_log.STATUS_CONNECT_FAILED, 0
+    if mode == "http":
+        status, end = await check_http(task, timeout, target)
+    else:
+        status, end = await check_socks5(task, timeout, mode == "deep"), None
+    return status, int(((end or time.monotonic()) - start) * 1000)
+
+
+# ---------------- 输出 -----------------
+
+class ResultSink:
+    """攒批写出可用目标与结果记录; top_k > 0 时只保留最快的 K 个, 凑满后通知停止。"""
+
+    def __init__(self, output_path, record_path, mode_id, echo, top_k=0, max_latency=0):
+        self.out = open(output_path, "w", encoding="utf-8")
+        self.rec = open(record_path, "ab") if record_path else None
+        self.mode_id = mode_id
+        self.echo = echo
+        self.top_k, self.max_latency = top_k, max_latency
+        self.best = []               # (-延迟, 序号, 行) 的最大堆
+        self.valid = 0
+        self.stop_reason = None
+        self.stopped = asyncio.Event()
+        self._lines, self._echo, self._records = [], [], []
+        self._last_flush = time.monotonic()
+
+    def add(self, result, line):
+        task = result.task
+        if self.rec:
+            rec = result_log.pack_record(task.host, task.port, self.mode_id, result.status, result.latency_ms)
+            if rec:
+                self._records.append(rec)
+        if result.status == result_log.STATUS_OK and not self.stopped.is_set():
+            self.valid += 1
+            self._echo.append(self.echo(line))
+            if self.top_k > 0:
+                self._offer(line, result.latency_ms)
+            else:
+                self._lines.append(line + "\n")
+        if len(self._records) + len(self._echo) >= FLUSH_COUNT or time.monotonic() - self._last_flush >= FLUSH_INTERVAL:
+            self.flush()
+
+    def _offer(self, line, latency_ms):
+        if self.max_latency and latency_ms > self.max_latency:
+            return
+        heapq.heappush(self.best, (-latency_ms, self.valid, line))
+        if len(self.best) > self.top_k:
+            heapq.heappop(self.best)
+        if len(self.best) >= self.top_k:
+            self.stop(f"已找到 {self.top_k} 个满足条件的目标")
+
+    def stop(self, reason):
+        if not self.stopped.is_set():
+            self.stop_reason = reason
+            self.stopped.set()
+
+    def flush(self):
+        if self._echo:
+            sys.stdout.write("".join(self._echo))
+            sys.stdout.flush()
+        if self._lines:
+            self.out.writelines(self._lines)
+            self.out.flush()
+        if self._records:
+            self.rec.write(b"".join(self._records))
+        self._lines, self._echo, self._records = [], [], []
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        self.flush()
+        if self.top_k > 0:
+            self.best.sort(key=lambda e: (-e[0], e[1]))
+            self.out.writelines(line + "\n" for _, _, line in self.best)
+            print(f"Top-K: 保留最快的 {len(self.best)}/{self.top_k} 个目标。", file=sys.stderr)
+        if self.stop_reason:
+            print(f"提前结束: {self.stop_reason}。", file=sys.stderr)
+        self.out.close()
+        if self.rec:
+            self.rec.close()
+
+
+# ---------------- 主流程 -----------------
+
+def _read_creds(path):
+    creds = []
+    if path:
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            for line in f:
+                user, sep, password = line.strip().partition(":")
+                if sep:
+                    creds.append((user, password))
+    return creds
+
+
+def _tasks(lines, creds):
+    for line in lines:
+        target = line.strip()
+        if not target:
+            continue
+        host, port = result_log.parse_endpoint(target) or (None, 0)
+        for user, password in creds or [(None, None)]:
+            yield Task(target, host, port, user, password)
+
+
+async def _read_batches(f):
+    loop = asyncio.get_running_loop()
+    while True:
+        lines = await loop.run_in_executor(None, f.readlines, READ_HINT)
+        if not lines:
+            return
+        yield lines
+
+
+async def run(args):
+    mode_id = args.recordMode or result_log.MODES[args.mode]
+    if args.mode == "http":
+        echo = lambda url: f"{time.strftime('%H:%M:%S')} ✅ 发现高可信度代理: {url}\n"
+        output_line = lambda task: (f"http://{quote_plus(task.user)}:{quote_plus(task.password)}@{task.target}"
+                                    if task.user and task.password else f"http://{task.target}")
+    else:
+        echo = lambda target: target + "\n"
+        output_line = lambda task: task.target
+    sink = ResultSink(args.outputFile, args.recordFile, mode_id, echo, args.topK, args.maxLatency)
+    creds = _read_creds(args.cfile)
+    guard = None
+    if args.memLimit > 0:
+        threads = net_limits.memory_cap(args.threads, args.memLimit, MEM_TASK_KB[args.mode], quiet=True)
+        if threads < args.threads:
+            print(f"内存预算 {args.memLimit} MB: 并发数 {args.threads} 调整为 {threads}", file=sys.stderr)
+        args.threads, guard = threads, net_limits.MemoryGuard(args.memLimit)
+    queue = asyncio.Queue(maxsize=args.threads * 2)
+    counts = {"targets": 0, "busy": 0}
+    if args.budget > 0:
+        asyncio.get_running_loop().call_later(args.budget, sink.stop, "时间预算用尽")
+
+    async def worker():
+        while True:
+            task = await queue.get()
+            if task is None:
+                return
+            if not sink.stopped.is_set():
+                counts["busy"] += 1
+                try:
+                    sink.add(Result(task, *await probe(task, args.mode, args.timeout, args.target)), output_line(task))
+                finally:
+                    counts["busy"] -= 1
+
+    async def producer():
+        source = open(args.inputFile, "r", encoding="utf-8", errors="ignore") if args.inputFile else sys.stdin
+        try:
+            async for lines in _read_batches(source):
+                for task in _tasks(lines, creds):
+                    if sink.stopped.is_set():
+                        return
+                    counts["targets"] += 1
+                    if guard is not None:
+                        await guard.wait(lambda: counts["busy"], args.threads // 4)
+                    await queue.put(task)
+        finally:
+            if source is not sys.stdin:
+                source.close()
+            for _ in range(args.threads):
+                await queue.put(None)
+
+    async def ticker():
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            sink.flush()
+
+    print(f"开始{MODE_NAMES[args.mode]} (Python 异步引擎, 并发 {args.threads})...", file=sys.stderr)
+    workers = [asyncio.create_task(worker()) for _ in range(args.threads)]
+    feeder = asyncio.create_task(producer())
+    flusher = asyncio.create_task(ticker())
+    stop_wait = asyncio.create_task(sink.stopped.wait())
+    await asyncio.wait([asyncio.gather(*workers, return_exceptions=True), stop_wait], return_when=asyncio.FIRST_COMPLETED)
+    # 提前结束时不再等待进行中的探测, 与 Go 引擎一致
+    for t in workers + [feeder, flusher, stop_wait]:
+        t.cancel()
+    await asyncio.gather(*workers, feeder, flusher, stop_wait, return_exceptions=True)
+    sink.close()
+    if guard is not None:
+        print(guard.report() + "。", file=sys.stderr)
+    print(f"验证完成！从 {counts['targets']} 个目标中发现 {sink.valid} 个可用目标。", file=sys.stderr)
+    print(f"结果已保存至: {args.outputFile}", file=sys.stderr)
+    return 0
+
+
+def parse_args(argv=None):
+    # 不注册 -h: 否则 -hostFailLimit 等 Go 参数会被当作 -h 加参数
+    parser = argparse.ArgumentParser(description="纯 Python 异步验证引擎 (参数与 Go 引擎相同)", allow_abbrev=False, add_help=False)
+    parser.add_argument("--help", action="help", help="显示帮助")
+    parser.add_argument("-mode", choices=sorted(MODE_NAMES), default="deep")
+    parser.add_argument("-inputFile", "-pfile", dest="inputFile", help="输入文件 (http 模式为空时从 stdin 读取)")
+    parser.add_argument("-outputFile", "-output", dest="outputFile", default="valid_proxies.txt")
+    parser.add_argument("-threads", "-workers", dest="threads", type=int, default=100)
+    parser.add_argument("-timeout", type=float, default=10)
+    parser.add_argument("-recordFile", "-record", dest="recordFile", default="")
+    parser.add_argument("-recordMode", type=int, default=0, help="结果记录中的模式编号 (默认取 -mode 对应的编号)")
+    parser.add_argument("-cfile", default="", help="(http 模式) user:pass 认证文件")
+    parser.add_argument("-target", default=DEFAULT_TARGET, help="(http 模式) 验证 URL")
+    parser.add_argument("-topK", type=int, default=0)
+    parser.add_argument("-maxLatency", type=int, default=0)
+    parser.add_argument("-budget", type=int, default=0)
+    parser.add_argument("-memLimit", type=int, default=0, help="内存预算 (MB, 0 关闭)")
+    args, unknown = parser.parse_known_args(argv)
+    ignored = [a for a in unknown if a.startswith("-") and a != "-hostStats"]  # 包装器总会传 -hostStats
+    if ignored:
+        print(f"Python 引擎忽略不支持的参数: {' '.join(ignored)}", file=sys.stderr)
+    if args.mode != "http" and not args.inputFile:
+        parser.error("需要 -inputFile")
+    args.threads = max(1, args.threads)
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if uvloop is not None:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    try:
+        return asyncio.run(run(args))
+    except KeyboardInterrupt:
+        return 130
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+"""
+无人值守批处理任务的公共部分: 任务文件解析与机器可读的运行摘要。
+
+任务文件为 JSON, 可以是任务列表, 也可以带公共默认值:
+    {
+        "defaults": {"threads": 500, "timeout": 5},
+        "jobs": [
+            {"name": "fast", "mode": "protocol", "input": "raw.txt"},
+            {"mode": "deep", "input": "raw.txt", "threads": 200, "timeout": 10, "telegram": true,
+             "host_fail_limit": 2, "host_fail_timeout_ms": 0, "host_inflight": 4},
+            {"mode": "deep", "input": "raw.txt", "rank": true, "top_k": 200, "max_latency_ms": 1500, "budget_s": 600},
+            {"mode": "protocol", "input": "raw.txt", "threads": 5000, "socket_profile": true, "port_range": "20000-60000"},
+            {"mode": "deep", "input": "raw.txt", "trace_rate": 0.05, "trace_slow_ms": 5000},
+            {"mode": "deep", "input": "raw.txt", "threads": 2000, "memory_limit_mb": 400}
+        ]
+    }
+每个任务结束后向摘要输出 (文件或 stdout) 写入一行 JSON。host_* 字段调整 Go 引擎的主机健康表
+(见 go_snippets.py 中的 GO_HOST_TABLE), 其统计以 host_health 字段写入摘要; rank 按历史结果重排输入
+(见 history_rank.py), top_k / max_latency_ms / budget_s 控制引擎提前结束 (见 GO_TOP_K);
+socket_profile / sock_buf / port_range 开启高频建连的套接字配置 (见 GO_SOCKET_PROFILE 与 net_limits.py);
+trace_rate / trace_slow_ms 记录采样的阶段时间线 (见 GO_TRACE), 其分析结论以 trace 字段写入摘要;
+memory_limit_mb 为引擎设置内存预算 (见 go_snippets.GO_MEM_BUDGET)。引擎子进程的峰值 RSS 以 peak_rss_mb 字段写入摘要。
+"""
+import json
+import os
+import sys
+import time
+
+import history_rank
+import trace_analyze
+
+
+def load_jobs(path, required=("input",)):
+    """读取任务文件; 文件不可读或格式错误时抛出 ValueError (说明原因, 由调用方打印后以非零状态退出)。"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            spec = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        raise ValueError(f"无法读取任务文件 {path}: {e}") from e
+    if not isinstance(spec, (list, dict)):
+        raise ValueError(f"任务文件 {path} 应为任务列表或包含 jobs 的对象")
+    defaults, jobs = ({}, spec) if isinstance(spec, list) else (spec.get("defaults", {}), spec.get("jobs", []))
+    if not isinstance(jobs, list) or not all(isinstance(job, dict) for job in jobs):
+        raise ValueError(f"任务文件 {path} 中的 jobs 应为对象列表")
+    merged = []
+    for i, job in enumerate(jobs, 1):
+        item = dict(defaults)
+        item.update(job)
+        missing = [k for k in required if not item.get(k)]
+        if missing:
+            raise ValueError(f"第 {i} 个任务缺少字段: {', '.join(missing)}")
+        item.setdefault("name", f"job{i}")
+        merged.append(item)
+    return merged
+
+
+# 任务字段 -> Go 引擎参数 (主机健康表与 Top-K 提前结束)
+ENGINE_OPTIONS = {
+    "host_fail_limit": "-hostFailLimit", "host_fail_timeout_ms": "-hostFailTimeout", "host_inflight": "-hostInflight",
+    "top_k": "-topK", "max_latency_ms": "-maxLatency", "budget_s": "-budget",
+}
+# 套接字配置, 所有引擎 (含识别器与认证扫描器) 都支持
+SOCKET_OPTIONS = {"socket_profile": "-sockProfile", "sock_buf": "-sockBuf", "port_range": "-portRange"}
+# 内存预算, 同样所有引擎都支持
+MEMORY_OPTIONS = {"memory_limit_mb": "-memLimit"}
+COMMON_OPTIONS = {**SOCKET_OPTIONS, **MEMORY_OPTIONS}
+
+
+def failure_status(exc):
+    """引擎运行失败时写入摘要的状态: 非零退出为 'error: exit N', 无法启动时为错误信息。"""
+    code = getattr(exc, "returncode", None)
+    return f"error: exit {code}" if code is not None else f"error: {exc}"
+
+
+def engine_args(job, options=None):
+    args = []
+    for key, flag in (options or {**ENGINE_OPTIONS, **COMMON_OPTIONS}).items():
+        value = job.get(key)
+        if value is None or value is False or value == "":
+            continue
+        if value is True:
+            args.append(flag)
+        elif isinstance(value, str):
+            args += [flag, value]
+        else:
+            args += [flag, str(int(value))]
+    return args
+
+
+def trace_args(job, output_path):
+    """任务设置了 trace_rate / trace_slow_ms 时返回 (时间线参数, 时间线文件路径), 否则返回 ([], None)。"""
+    rate, slow = job.get("trace_rate"), job.get("trace_slow_ms")
+    if not rate and not slow:
+        return [], None
+    path = output_path + ".trace"
+    if os.path.exists(path):
+        os.remove(path)
+    return ["-traceFile", path, "-traceRate", str(float(rate or 0)), "-traceSlow", str(int(slow or 0))], path
+
+
+def trace_summary(path):
+    return trace_analyze.summarize(path) if path else None
+
+
+def ranked_input(job, output_path, mode=None):
+    """任务设置了 rank 时按历史结果重排输入, 返回 (实际输入路径, 排序统计或 None)。"""
+    if not job.get("rank"):
+        return job["input"], None
+    ranked = output_path + ".ranked"
+    info = history_rank.rank_file(job["input"], ranked, job.get("history_log", history_rank.result_log.DEFAULT_LOG_PATH), mode)
+    return ranked, info
+
+
+def read_host_stats(path, remove=True):
+    """汇总 Go 引擎追加写入的主机健康统计 (每次运行一行 JSON), 文件不存在时返回 None。"""
+    if not os.path.exists(path):
+        return None
+    totals = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                for k, v in json.loads(line).items():
+                    totals[k] = totals.get(k, 0) + v
+            except (ValueError, AttributeError):
+                continue
+    if remove:
+        os.remove(path)
+    return totals
+
+
+def count_lines(path):
+    if not path or not os.path.exists(path):
+        return 0
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        return sum(1 for line in f if line.strip() and not line.startswith("#"))
+
+
+class SummaryWriter:
+    """逐行写出 JSON 摘要; path 为 None 或 '-' 时写到 stdout。"""
+
+    def __init__(self, path=None):
+        self._own = bool(path) and path != "-"
+        self._f = open(path, "a", encoding="utf-8") if self._own else sys.stdout
+
+    def write(self, job, started, targets, found, status="ok", **extra):
+        duration = time.time() - started
+        entry = {
+            "job": job.get("name"), "input": job.get("input"), "status": status,
+            "started": int(started), "duration_s": round(duration, 3),
+            "targets": targets, "found": found,
+            "yield": round(found / targets, 6) if targets else 0.0,
+            "rate_per_s": round(targets / duration, 2) if status == "ok" and duration > 0 else None,
+        }
+        entry.update(extra)
+        self._f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._f.flush()
+        return entry
+
+    def close(self):
+        if self._own:
+            self._f.close()
@@ -0,0 +1,293 @@
+"""
+在回环地址上对比 Go 引擎与 Python 异步引擎 (async_verifier.py) 的吞吐。
+
+先启动一组本地 SOCKS5 模拟代理 (多进程, 每个进程监听若干端口, 问候与 CONNECT 都立即应答成功),
+另有一部分目标指向未监听的端口 (连接被拒绝); 然后用相同的目标文件和参数依次运行各引擎, 报告耗时、
+每秒目标数、子进程峰值内存以及两者的结果是否一致。Go 引擎需要 Go 环境或已缓存/预编译的二进制,
+不可用时只测 Python 引擎。模拟代理本身也占用 CPU, 结果用于相对比较。
+
+--replay 改用 net_replay.py 录制的真实目标行为代替模拟代理: 模式与超时取自录制文件 (可为 http 模式),
+另外报告各引擎结果状态与录制时判定一致的比例。
+
+--classifier-cases 不做吞吐对比, 只对识别器引擎跑回归用例 (如 CONNECT 应答 200 后拒绝重连),
+检查引擎正常退出且识别结果符合预期。
+
+用法:
+    python engine_bench.py --targets 50000 --threads 500
+    python engine_bench.py --modes deep --farm-procs 8 --prebuilt dist/
+    python engine_bench.py --replay deep.prc --threads 1000
+    python engine_bench.py --classifier-cases
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+import async_verifier
+import go_build
+import net_limits
+import net_replay
+import result_log
+import socks5
+
+ENGINES = {"protocol": "protocol_verifier", "deep": "deep_verifier", "http": "http_verifier"}
+CONNECT_REPLY = b"\x05\x00\x00\x01" + bytes(6)
+
+
+# ---------------- 模拟代理 -----------------
+
+async def _serve_socks5(reader, writer):
+    try:
+        if await reader.read(3):
+            writer.write(b"\x05\x00")
+            if await reader.read(262):
+                writer.write(CONNECT_REPLY)
+            await reader.read(1)
+    except OSError:
+        pass
+    finally:
+        writer.transport.abort()
+
+
+async def _farm_main(count, ready):
+    servers = [await asyncio.start_server(_serve_socks5, "127.0.0.1", 0, backlog=4096) for _ in range(count)]
+    ready.put([s.sockets[0].getsockname()[1] for s in servers])
+    await asyncio.Event().wait()
+
+
+def _farm_process(count, ready):
+    if async_verifier.uvloop is not None:
+        async_verifier.uvloop.install()
+    asyncio.run(_farm_main(count, ready))
+
+
+def start_farm(ports, procs):
+    """启动 procs 个进程共监听 ports 个端口, 返回 (进程列表, 端口列表)。"""
+    ready = multiprocessing.Queue()
+    workers = []
+    for i in range(procs):
+        n = ports // procs + (1 if i < ports % procs else 0)
+        if n:
+            p = multiprocessing.Process(target=_farm_process, args=(n, ready), daemon=True)
+            p.start()
+            workers.append(p)
+    open_ports = []
+    for _ in workers:
+        open_ports += ready.get(timeout=30)
+    return workers, open_ports
+
+
+def closed_ports(count):
+    # 绑定后立即释放的端口, 短时间内不会被其它进程占用, 用作连接被拒绝的目标
+    ports = []
+    for _ in range(count):
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            ports.append(s.getsockname()[1])
+    return ports
+
+
+# ---------------- 运行引擎 -----------------
+
+def run_engine(cmd):
+    """运行一次引擎, 返回 (耗时秒数, 峰值内存 MB 或 None)。"""
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    rss = net_limits.wait_peak_rss(proc)
+    return time.perf_counter() - start, rss
+
+
+def read_outcome(output_path, record_path, expected=None):
+    """返回 (可用目标列表, 状态分布, 与 expected 中录制状态一致的比例或 None)。"""
+    with open(output_path, "r", encoding="utf-8") as f:
+        found = sorted(line.strip() for line in f if line.strip())
+    with open(record_path, "rb") as f:
+        records = [(result_log.unpack_ip(rec[0]), rec[1], rec[4]) for rec in result_log.RECORD.iter_unpack(f.read())]
+    statuses = Counter(status for _, _, status in records)
+    match = None
+    if expected:
+        match = sum(1 for host, port, status in records if expected.get((host, port)) == status) / len(expected)
+    return found, statuses, match
+
+
+def engine_commands(mode):
+    commands = {}
+    try:
+        commands["go"] = [socks5.BUILD_CACHE.get(ENGINES[mode])]
+    except (go_build.BuildError, OSError) as e:
+        print(f"跳过 Go 引擎 ({mode}): {str(e).splitlines()[0]}")
+    commands["python"] = [sys.executable, async_verifier.__file__, "-mode", mode]
+    return commands
+
+
+def engine_args(mode, target_file, output_path, record_path, threads, timeout):
+    # http 引擎沿用 http.py 的参数名 (Python 引擎两种写法都接受)
+    if mode == "http":
+        return ["-pfile", target_file, "-output", output_path, "-workers", str(threads), "-timeout", str(timeout),
+                "-record", record_path]
+    return ["-inputFile", target_file, "-outputFile", output_path, "-threads", str(threads), "-timeout", str(timeout),
+            "-recordFile", record_path]
+
+
+def _farm_targets(args, target_file):
+    farm, open_ports = start_farm(args.ports, args.farm_procs)
+    refused = closed_ports(max(1, args.ports // 10))
+    rng = random.Random(args.seed)
+    with open(target_file, "w", encoding="utf-8") as f:
+        for _ in range(args.targets):
+            port = rng.choice(refused) if rng.random() < args.refused else rng.choice(open_ports)
+            f.write(f"127.0.0.1:{port}\n")
+    print(f"模拟代理 {len(open_ports)} 个端口 ({args.farm_procs} 个进程), 目标 {args.targets} 个 "
+          f"(约 {args.refused:.0%} 指向未监听端口), 并发 {args.threads}, 超时 {args.timeout} 秒")
+
+    def stop():
+        for p in farm:
+            p.terminate()
+    return stop, None
+
+
+def _replay_targets(args, target_file):
+    server = net_replay.ReplayServer(args.replay, port=args.replay_port, procs=args.farm_procs)
+    with open(target_file, "w", encoding="utf-8") as f:
+        f.writelines(t + "\n" for t in server.targets)
+    args.targets, args.modes = len(server.targets), [server.mode]
+    args.timeout = max(1, round(server.timeout_ms / 1000))
+    print(f"回放 {args.replay}: 目标 {args.targets} 个, 模式 {server.mode} ({len(server.procs)} 个进程), "
+          f"并发 {args.threads}, 超时 {args.timeout} 秒 (同录制)")
+    return server.stop, server.expected
+
+
+# ---------------- 识别器回归用例 -----------------
+
+# (说明, 服务端对第一个连接的应答, 期望协议, 期望状态); 服务端只接受一个连接, 之后的连接被拒绝
+CLASSIFIER_CASES = [
+    ("CONNECT 应答 200 后拒绝重连", b"HTTP/1.1 200 OK\r\nContent-Length: 5\r\n\r\nhello", "http-server", -5),
+]
+
+
+def _one_shot_server(reply):
+    """在回环地址上只接受一个连接: 读完请求头后回 reply; 接受后立即停止监听。返回端口。"""
+    srv = socket.socket()
+    srv.bind(("127.0.0.1", 0))
+    srv.listen(1)
+
+    def serve():
+        conn, _ = srv.accept()
+        srv.close()
+        with conn:
+            conn.settimeout(5)
+            buf = b""
+            try:
+                while b"\r\n\r\n" not in buf:
+                    chunk = conn.recv(4096)
+                    if not chunk:
+                        return
+                    buf += chunk
+                conn.sendall(reply)
+            except OSError:
+                pass
+    threading.Thread(target=serve, daemon=True).start()
+    return srv.getsockname()[1]
+
+
+def classifier_cases(args):
+    """逐个运行识别器回归用例, 返回失败数。"""
+    binary = socks5.BUILD_CACHE.get("classifier")
+    work_dir = tempfile.mkdtemp(prefix="engine_bench_")
+    failed = 0
+    try:
+        for desc, reply, proto, status in CLASSIFIER_CASES:
+            target_file, output_path, record_path = (os.path.join(work_dir, n) for n in ("t.txt", "o.txt", "r.rec"))
+            for path in (output_path, record_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            with open(target_file, "w", encoding="utf-8") as f:
+                f.write(f"127.0.0.1:{_one_shot_server(reply)}\n")
+            proc = subprocess.run([binary, "-inputFile", target_file, "-outputFile", output_path,
+                                   "-recordFile", record_path, "-timeout", str(args.timeout), "-httpFirst"],
+                                  capture_output=True, text=True, timeout=args.timeout * 10 + 30)
+            records = []
+            if os.path.exists(record_path):
+                with open(record_path, "rb") as f:
+                    raw = f.read()
+                records = [result_log.unpack_record(raw[i:i + result_log.RECORD.size])
+                           for i in range(0, len(raw), result_log.RECORD.size)]
+            got = (records[0].protocol, records[0].status) if len(records) == 1 else None
+            if proc.returncode == 0 and got == (proto, status):
+                print(f"通过  {desc}")
+                continue
+            failed += 1
+            print(f"失败  {desc}: 退出码 {proc.returncode}, 结果 {got}, 期望 {(proto, status)}")
+            for line in [l for l in proc.stderr.splitlines() if l.startswith("panic:")][:1]:
+                print("      " + line)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return failed
+
+
+def bench(args):
+    net_limits.raise_nofile()  # 子进程 (模拟代理与引擎) 继承提高后的描述符上限
+    work_dir = tempfile.mkdtemp(prefix="engine_bench_")
+    target_file = os.path.join(work_dir, "targets.txt")
+    stop, expected = (_replay_targets if args.replay else _farm_targets)(args, target_file)
+    try:
+        if "http" in args.modes:
+            socks5.BUILD_CACHE.register("http_verifier", go_build.load_http_source)
+        print(f"\n{'模式':<10}{'引擎':<8}{'耗时(s)':>9}{'目标/秒':>10}{'峰值内存(MB)':>14}{'可用':>8}  状态分布")
+        for mode in args.modes:
+            outcomes = {}
+            for name, prefix in engine_commands(mode).items():
+                output_path = os.path.join(work_dir, f"{mode}_{name}.txt")
+                record_path = os.path.join(work_dir, f"{mode}_{name}.rec")
+                if os.path.exists(record_path):
+                    os.remove(record_path)
+                cmd = prefix + engine_args(mode, target_file, output_path, record_path, args.threads, args.timeout) + \
+                    ["-hostFailLimit", "0", "-hostInflight", "0"]  # 目标都在回环地址上, 关闭主机健康表
+                seconds, rss = run_engine(cmd)
+                found, statuses, match = read_outcome(output_path, record_path, expected)
+                outcomes[name] = found
+                rss_text = f"{rss:.1f}" if rss is not None else "-"
+                match_text = f"  与录制一致 {match:.1%}" if match is not None else ""
+                print(f"{mode:<10}{name:<8}{seconds:>9.2f}{args.targets / seconds:>10.0f}{rss_text:>14}{len(found):>8}  "
+                      + ", ".join(f"{k}:{v}" for k, v in sorted(statuses.items())) + match_text)
+            if len(outcomes) == 2:
+                print(f"{'':<10}结果{'一致' if outcomes['go'] == outcomes['python'] else '不一致'}")
+    finally:
+        stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="在回环模拟代理上对比 Go 引擎与 Python 异步引擎的吞吐")
+    parser.add_argument("--targets", type=int, default=20000)
+    parser.add_argument("--threads", type=int, default=500)
+    parser.add_argument("--timeout", type=int, default=5)
+    parser.add_argument("--ports", type=int, default=64, help="模拟代理监听的端口数")
+    parser.add_argument("--farm-procs", type=int, default=min(4, os.cpu_count() or 1), help="模拟代理进程数")
+    parser.add_argument("--refused", type=float, default=0.1, help="指向未监听端口的目标比例")
+    parser.add_argument("--modes", default="protocol,deep", help="逗号分隔: protocol,deep")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--prebuilt", help="预编译Go核心程序目录 (见 go_build.py export)")
+    parser.add_argument("--replay", help="改用 net_replay.py 录制的文件回放真实目标行为")
+    parser.add_argument("--replay-port", type=int, default=net_replay.DEFAULT_PORT)
+    parser.add_argument("--classifier-cases", action="store_true", help="只运行识别器回归用例")
+    args = parser.parse_args(argv)
+    args.modes = [m for m in args.modes.split(",") if m in ENGINES and m != "http"]  # 模拟代理只说 SOCKS5
+    if args.prebuilt:
+        socks5.BUILD_CACHE.prebuilt_dir = args.prebuilt
+    if args.classifier_cases:
+        sys.exit(1 if classifier_cases(args) else 0)
+    bench(args)
+
+
+if __name__ == "__main__":
+    main()
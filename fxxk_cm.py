@@ -1,3 +1,4 @@
+import argparse
 import asyncio
 import json
 import os
@@ -7,6 +8,11 @@ import csv
 import aiohttp
 from tqdm.asyncio import tqdm
 
+import net_limits
+import result_log
+import result_summary
+import run_estimate
+
 CONFIG = {
     "api_base": "https://check.socks5.cmliussss.net/check",
     "token": "",
@@ -16,9 +22,26 @@ CONFIG = {
     "outdir": "api_output",
     "chunk_size": 10000,  # 每批写入条数
     "start_line": 0,       # 分布式运行：起始行
-    "end_line": None       # 分布式运行：结束行(None 表示到文件末尾)
+    "end_line": None,      # 分布式运行：结束行(None 表示到文件末尾)
+    "result_log": result_log.DEFAULT_LOG_PATH,  # 二进制结果日志 (None 表示不记录)
+    "geo_db": [],          # 本地前缀数据集, 补全 API 未返回的 ASN/国家 (见 geo_enrich.py)
+    "geo_dc": [],          # 本地数据中心前缀列表
+    "summary": "summary.json",  # outdir 下的汇总文件, 每批写出后更新 (None 表示不汇总, 见 result_summary.py)
+    "memory_limit_mb": None,  # 内存预算 (MB), 按预算压低并发与每批条数, 接近上限时放慢派发
 }
 
+TASK_KB = 64     # 每个进行中请求 (连接、TLS 与响应) 的估算内存
+RESULT_KB = 4    # 每条缓冲中的成功结果 (含响应 JSON) 的估算内存
+
+_ENRICHER = None
+
+def get_enricher():
+    global _ENRICHER
+    if _ENRICHER is None and (CONFIG['geo_db'] or CONFIG['geo_dc']):
+        import geo_enrich
+        _ENRICHER = geo_enrich.Enricher(CONFIG['geo_db'], CONFIG['geo_dc'])
+    return _ENRICHER
+
 async def fetch_check(session: aiohttp.ClientSession, api_base: str, proxy_str: str, extra_params: dict = None, timeout: int = 8):
     params = {}
     if extra_params:
@@ -35,21 +58,30 @@ async def fetch_check(session: aiohttp.ClientSession, api_base: str, proxy_str:
     except Exception as e:
         return proxy_str, False, {"error": str(e)}
 
-async def run_batch(proxies, api_base, concurrency, timeout, extra_params):
-    sem = asyncio.Semaphore(concurrency)
+async def run_batch(proxies, api_base, concurrency, timeout, extra_params, records=None, guard=None):
+    # 固定数量的工作协程共享一个迭代器, 不为每条代理预先创建任务
     results = []
+    pending = iter(proxies)
+    busy = [0]
     timeout_cfg = aiohttp.ClientTimeout(total=None, sock_connect=timeout, sock_read=timeout)
     async with aiohttp.ClientSession(timeout=timeout_cfg, headers={"User-Agent": "checker/1.0"}) as session:
-        async def worker(p):
-            async with sem:
-                proxy_str, ok, data = await fetch_check(session, api_base, p, extra_params, timeout)
+        async def worker(pbar):
+            for p in pending:
+                if guard is not None:
+                    await guard.wait(lambda: busy[0], concurrency // 4)
+                busy[0] += 1
+                t0 = time.monotonic()
+                try:
+                    proxy_str, ok, data = await fetch_check(session, api_base, p, extra_params, timeout)
+                finally:
+                    busy[0] -= 1
+                if records is not None:
+                    records.append((proxy_str, ok, data, (time.monotonic() - t0) * 1000))
                 if ok:
                     results.append((proxy_str, ok, data))
-        tasks = [asyncio.create_task(worker(p)) for p in proxies]
-        with tqdm(total=len(tasks), desc="Checking", unit="proxy") as pbar:
-            for f in asyncio.as_completed(tasks):
-                await f
                 pbar.update(1)
+        with tqdm(total=len(proxies), desc="Checking", unit="proxy") as pbar:
+            await asyncio.gather(*(worker(pbar) for _ in range(max(1, min(concurrency, len(proxies))))))
     return results
 
 # ---------------- 辅助 -----------------
@@ -79,7 +111,27 @@ def parse_asn_and_dc(data: dict):
         'datacenter': dc,
     }
 
-def write_chunk(outdir, chunk_id, results, mode):
+def result_status(ok, data):
+    """把 fetch_check 的结果映射为 result_log 状态码。"""
+    if ok:
+        return result_log.STATUS_OK
+    if not isinstance(data, dict):
+        return result_log.STATUS_BAD_RESPONSE
+    if "error" in data:
+        return result_log.STATUS_TIMEOUT if "timeout" in data["error"].lower() else result_log.STATUS_CONNECT_FAILED
+    return data.get("_status") or result_log.STATUS_BAD_RESPONSE
+
+def append_records(records):
+    if not CONFIG['result_log'] or not records:
+        return
+    with result_log.ResultLog(CONFIG['result_log']) as log:
+        for proxy, ok, data, latency in records:
+            ep = result_log.parse_endpoint(proxy)
+            if ep:
+                log.append(ep[0], ep[1], "api", result_status(ok, data), latency)
+    records.clear()
+
+def write_chunk(outdir, chunk_id, results, mode, summary=None):
     os.makedirs(outdir, exist_ok=True)
     txt_path = os.path.join(outdir, f"working_part{chunk_id}.txt")
     csv_path = os.path.join(outdir, f"details_part{chunk_id}.csv")
@@ -89,13 +141,22 @@ def write_chunk(outdir, chunk_id, results, mode):
             f.write(proxy + "\n")
     # CSV
     fields = ["proxy","mode","ip","asn","abuser_score","route","org","country","ip_type","datacenter_name","datacenter_domain","datacenter_network"]
+    enricher = get_enricher()
     with open(csv_path, "w", newline='', encoding="utf-8-sig") as f:
         writer = csv.DictWriter(f, fieldnames=fields)
         writer.writeheader()
         for proxy, ok, data in results:
             parsed = parse_asn_and_dc(data)
             dc = parsed.get('datacenter') or {}
-            writer.writerow({
+            if enricher and not (parsed.get('asn') and parsed.get('country')):
+                ep = result_log.parse_endpoint(proxy)
+                local = enricher.lookup(data.get('ip') or (ep[0] if ep else ""))
+                for key in ("asn", "org", "country"):
+                    parsed[key] = parsed.get(key) or local.get(key)
+                if local.get("datacenter") and not dc:
+                    parsed['ip_type'] = '数据中心'
+                    dc = {"datacenter": local["datacenter"]}
+            row = {
                 "proxy": proxy,
                 "mode": mode,
                 "ip": data.get('ip'),
@@ -108,19 +169,32 @@ def write_chunk(outdir, chunk_id, results, mode):
                 "datacenter_name": dc.get('datacenter'),
                 "datacenter_domain": dc.get('domain'),
                 "datacenter_network": dc.get('network'),
-            })
+            }
+            writer.writerow(row)
+            if summary is not None:
+                summary.add(row)
     print(f"已保存 {len(results)} 条 -> {txt_path}, {csv_path}")
 
 # ---------------- 主逻辑 -----------------
 
 def process_large_file(file_path):
     start, end = CONFIG['start_line'], CONFIG['end_line']
-    chunk_size = CONFIG['chunk_size']
+    chunk_size, concurrency, guard = CONFIG['chunk_size'], CONFIG['concurrency'], None
+    limit = CONFIG['memory_limit_mb']
+    if limit:
+        concurrency = net_limits.memory_cap(concurrency, limit, TASK_KB)
+        # 一批的成功结果在写出前都留在内存里, 最多占预算的四分之一
+        chunk_size = min(chunk_size, max(concurrency, int(limit * 1024 / 4 / RESULT_KB)))
+        guard = net_limits.MemoryGuard(limit)
     api_base = CONFIG['api_base']
     extra = {"token": CONFIG['token']} if CONFIG['token'] else {}
 
+    os.makedirs(CONFIG['outdir'], exist_ok=True)
+    summary = result_summary.Summary() if CONFIG['summary'] else None
+    summary_path = os.path.join(CONFIG['outdir'], CONFIG['summary']) if summary else None
     chunk_id = 1
     buffer = []
+    records = []
     processed = 0
 
     with open(file_path, "r", encoding="utf-8") as f:
@@ -133,19 +207,37 @@ def process_large_file(file_path):
             if proxy:
                 buffer.append(proxy)
             if len(buffer) >= chunk_size:
-                results = asyncio.run(run_batch(buffer, api_base, CONFIG['concurrency'], CONFIG['timeout'], extra))
-                write_chunk(CONFIG['outdir'], chunk_id, results, CONFIG['proxy_mode'])
+                results = asyncio.run(run_batch(buffer, api_base, concurrency, CONFIG['timeout'], extra, records, guard))
+                write_chunk(CONFIG['outdir'], chunk_id, results, CONFIG['proxy_mode'], summary)
+                if summary:
+                    summary.write(summary_path)
+                append_records(records)
                 buffer.clear()
                 chunk_id += 1
             processed += 1
     if buffer:
-        results = asyncio.run(run_batch(buffer, api_base, CONFIG['concurrency'], CONFIG['timeout'], extra))
-        write_chunk(CONFIG['outdir'], chunk_id, results, CONFIG['proxy_mode'])
+        results = asyncio.run(run_batch(buffer, api_base, concurrency, CONFIG['timeout'], extra, records, guard))
+        write_chunk(CONFIG['outdir'], chunk_id, results, CONFIG['proxy_mode'], summary)
+        append_records(records)
+    if summary:
+        data = summary.write(summary_path)
+        print(f"汇总: 可用 {data['alive']} 个, 数据中心 {data['datacenter']['yes']} 个, "
+              f"{len(data['country'])} 个国家, {len(data['asn'])} 个 ASN -> {summary_path}")
+    if guard is not None:
+        print(guard.report())
     print(f"处理完成，总 {processed} 条")
 
 if __name__ == '__main__':
-    if len(sys.argv) < 2:
-        print("用法: python interactive_proxy_checker.py proxies.txt")
-        sys.exit(1)
-    file_path = sys.argv[1]
-    process_large_file(file_path)
+    parser = argparse.ArgumentParser(description="通过远程检测接口批量检查代理")
+    parser.add_argument("file", help="代理列表, 每行一个")
+    parser.add_argument("--memory-limit", type=int, help="内存预算 (MB), 用于小内存 VPS")
+    parser.add_argument("--estimate", type=int, nargs="?", const=run_estimate.SAMPLE_SIZE, metavar="N",
+                        help="只抽样 N 个代理估算耗时并推荐超时与并发数, 不运行")
+    args = parser.parse_args()
+    if args.memory_limit:
+        CONFIG['memory_limit_mb'] = args.memory_limit
+    if args.estimate:
+        run_estimate.estimate(args.file, "api", args.estimate, max_threads=CONFIG['concurrency'],
+                              memory_limit=CONFIG['memory_limit_mb'], default_timeout=CONFIG['timeout'])
+        sys.exit(0)
+    process_large_file(args.file)
@@ -0,0 +1,223 @@
+"""
+Go 核心程序的共享构建缓存 (socks5.py / http.py / pool_scheduler.py 共用)。
+
+二进制按内容寻址: 缓存键为源码与目标平台的 SHA-256, 文件名为 <引擎名>-<键前 16 位>, 源码不变就直接复用,
+不同版本的引擎可以并存, 多个包装脚本共用同一缓存目录。引擎在第一次用到时才编译 (get), 需要多个引擎时
+用 prefetch() 在后台并行编译。预编译目录 (--prebuilt 或环境变量 PROXY_TOOLKIT_PREBUILT) 中有对应文件时
+直接使用, 不需要 Go 环境; 该目录可由 export 子命令生成。
+
+用法:
+    python go_build.py status
+    python go_build.py build              # 并行编译全部引擎
+    python go_build.py export dist/       # 导出预编译二进制, 之后 socks5.py --prebuilt dist/
+    python go_build.py prune              # 删除不再对应当前源码的缓存文件
+"""
+import argparse
+import hashlib
+import importlib.util
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.environ.get("PROXY_TOOLKIT_CACHE", ".socks5_toolkit_cache")
+PREBUILT_ENV = "PROXY_TOOLKIT_PREBUILT"
+EXE_SUFFIX = ".exe" if sys.platform == "win32" else ""
+GO_PATHS = ["/usr/local/go/bin/go", "/usr/bin/go", "/snap/bin/go", os.path.expanduser("~/go/bin/go"), "C:\\Go\\bin\\go.exe"]
+MAX_PARALLEL = 4
+
+
+class BuildError(Exception):
+    pass
+
+
+def find_go():
+    go = shutil.which("go")
+    if go:
+        return go
+    for path in GO_PATHS:
+        if os.path.exists(path) and os.access(path, os.X_OK):
+            return path
+    return None
+
+
+def source_key(source):
+    target = f"{sys.platform}/{platform.machine().lower()}"
+    return hashlib.sha256(f"{target}\0{source}".encode("utf-8")).hexdigest()[:16]
+
+
+class BuildCache:
+    """按需、并行地编译已注册的 Go 引擎。源码可以是字符串, 也可以是返回源码的函数 (首次用到时才加载)。"""
+
+    def __init__(self, cache_dir=CACHE_DIR, prebuilt_dir=None, go=None, verbose=True):
+        self.cache_dir = cache_dir
+        self.verbose = verbose
+        self.prebuilt_dir = prebuilt_dir or os.environ.get(PREBUILT_ENV) or None
+        self.go = go
+        self._sources = {}
+        self._futures = {}
+        self._lock = threading.Lock()
+        self._print_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=MAX_PARALLEL)
+
+    def register(self, name, source):
+        with self._lock:
+            self._sources[name] = source
+            self._futures.pop(name, None)
+
+    def names(self):
+        return list(self._sources)
+
+    def source(self, name):
+        with self._lock:
+            src = self._sources.get(name)
+            if src is None:
+                raise BuildError(f"未知的Go核心程序: {name}")
+            if callable(src):
+                src = self._sources[name] = src()
+            return src
+
+    def filename(self, name):
+        return f"{name}-{source_key(self.source(name))}{EXE_SUFFIX}"
+
+    def lookup(self, name):
+        """返回已有的预编译或缓存二进制路径, 不触发编译。"""
+        filename = self.filename(name)
+        for directory in (self.prebuilt_dir, self.cache_dir):
+            if directory and os.path.isfile(os.path.join(directory, filename)):
+                return os.path.join(directory, filename)
+        return None
+
+    def prefetch(self, names=None):
+        """在后台开始编译 (已在缓存中的引擎立即就绪)。"""
+        for name in names or self.names():
+            self._future(name)
+
+    def get(self, name):
+        """返回引擎可执行文件路径, 需要时编译并等待完成; 失败抛出 BuildError。"""
+        return self._future(name).result()
+
+    def _future(self, name):
+        with self._lock:
+            future = self._futures.get(name)
+            if future is None:
+                future = self._futures[name] = self._pool.submit(self._build, name)
+            return future
+
+    def _build(self, name):
+        path = self.lookup(name)
+        if path:
+            return path
+        go = self.go or find_go()
+        if not go:
+            raise BuildError(f"未找到 'go' 命令, 且没有 '{name}' 的预编译二进制。请安装 Go 或指定预编译目录。")
+        os.makedirs(self.cache_dir, exist_ok=True)
+        output = os.path.join(self.cache_dir, self.filename(name))
+        env = os.environ.copy()
+        if "HOME" not in env and "USERPROFILE" not in env and "GOCACHE" not in env:
+            env["GOCACHE"] = os.path.abspath(os.path.join(self.cache_dir, "gocache"))
+        self._log(f"  - 正在编译 '{name}'...")
+        with tempfile.TemporaryDirectory(dir=self.cache_dir) as temp_dir:
+            source_path = os.path.join(temp_dir, "main.go")
+            with open(source_path, "w", encoding="utf-8") as f:
+                f.write(self.source(name))
+            temp_output = os.path.join(temp_dir, os.path.basename(output))
+            result = subprocess.run([go, "build", "-o", temp_output, source_path], capture_output=True, text=True, env=env)
+            if result.returncode != 0:
+                raise BuildError(f"Go程序编译失败: {name}\n{result.stderr}")
+            os.replace(temp_output, output)
+        self._log(f"  - '{name}' 编译完成。")
+        return output
+
+    def _log(self, message):
+        # 并行编译时避免多行输出交错
+        if not self.verbose:
+            return
+        with self._print_lock:
+            print(message, flush=True)
+
+    def ensure(self, names=None):
+        """并行准备多个引擎, 全部就绪返回 True; 失败时打印原因并返回 False。"""
+        names = list(names or self.names())
+        self.prefetch(names)
+        ok = True
+        for name in names:
+            try:
+                self.get(name)
+            except (BuildError, OSError) as e:
+                print(f"\n错误: {e}")
+                ok = False
+        return ok
+
+    def prune(self):
+        """删除缓存目录中不对应当前源码的二进制及旧版 <引擎名>.hash 文件, 返回删除的文件名。"""
+        keep = {self.filename(name) for name in self.names()}
+        removed = []
+        if not os.path.isdir(self.cache_dir):
+            return removed
+        for entry in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, entry)
+            if entry in keep or not os.path.isfile(path):
+                continue
+            os.remove(path)
+            removed.append(entry)
+        return removed
+
+
+def load_http_source():
+    # http.py 与标准库 http 同名, 只能按路径加载
+    spec = importlib.util.spec_from_file_location("http_scanner", os.path.join(HERE, "http.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.GO_SOURCE_CODE
+
+
+def full_cache(prebuilt_dir=None):
+    """注册了全部引擎 (socks5.py 的四个与 http.py 的一个) 的缓存。"""
+    import socks5
+    cache = BuildCache(prebuilt_dir=prebuilt_dir)
+    for name in socks5.BUILD_CACHE.names():
+        cache.register(name, socks5.BUILD_CACHE.source(name))
+    cache.register("http_verifier", load_http_source)
+    return cache
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Go 核心程序构建缓存")
+    parser.add_argument("--prebuilt", help="预编译二进制目录")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("status", help="列出各引擎的缓存状态")
+    sub.add_parser("build", help="并行编译全部引擎")
+    export = sub.add_parser("export", help="编译并导出全部引擎到预编译目录")
+    export.add_argument("directory")
+    sub.add_parser("prune", help="删除过期的缓存文件")
+    args = parser.parse_args(argv)
+
+    cache = full_cache(args.prebuilt)
+    if args.command == "status":
+        for name in cache.names():
+            print(f"{name:<18} {cache.filename(name):<40} {cache.lookup(name) or '未编译'}")
+    elif args.command == "build":
+        return 0 if cache.ensure() else 1
+    elif args.command == "export":
+        if not cache.ensure():
+            return 1
+        os.makedirs(args.directory, exist_ok=True)
+        for name in cache.names():
+            target = os.path.join(args.directory, cache.filename(name))
+            if os.path.abspath(cache.get(name)) != os.path.abspath(target):
+                shutil.copy2(cache.get(name), target)
+        print(f"已导出 {len(cache.names())} 个引擎到 {args.directory}")
+    elif args.command == "prune":
+        removed = cache.prune()
+        print(f"已删除 {len(removed)} 个过期文件。" + (f" ({', '.join(removed)})" if removed else ""))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
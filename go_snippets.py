@@ -0,0 +1,510 @@
+"""
+socks5.py 与 http.py 的 Go 引擎共用的源码片段, 由各引擎的 GO_SOURCE_CODE* 在末尾拼接。
+
+片段使用的标准库包需由引擎自己 import。
+"""
+
+# --- 按采样记录单个目标的阶段时间线 (-traceFile) ---
+# 按 -traceRate 随机采样目标, 记录拨号、问候写/读、CONNECT 写/读、HTTP 写/读等阶段结束时距开始的微秒数
+# (阶段无论成败都在操作返回时打点, 超时会落在卡住的那个阶段); -traceSlow 使超过该耗时的目标无论是否
+# 被采样都写入。文件为 8 字节文件头加定长记录, 由 trace_analyze.py 分析。未开启时不产生任何开销。
+GO_TRACE = r'''
+const (
+	phDial = iota
+	phGreetWrite
+	phGreetRead
+	phConnectWrite
+	phConnectRead
+	phHTTPWrite
+	phHTTPRead
+	phHTTPBody
+	phVerify
+	phClose
+	numPhases
+)
+
+type span struct {
+	start   time.Time
+	sampled bool
+	marks   [numPhases]uint32
+}
+
+type tracer struct {
+	mu     sync.Mutex
+	f      *os.File
+	w      *bufio.Writer
+	rng    *rand.Rand
+	rate   float64
+	slow   time.Duration
+	mode   byte
+	closed bool
+}
+
+var tracing *tracer
+
+func traceFlags() (*string, *float64, *int) {
+	return flag.String("traceFile", "", "(可选) 追加写入采样目标阶段时间线的文件"),
+		flag.Float64("traceRate", 0.01, "时间线采样率 (0-1)"),
+		flag.Int("traceSlow", 0, "总耗时超过该值 (毫秒) 的目标无论是否被采样都记录 (0 关闭)")
+}
+
+func setupTrace(path string, rate float64, slowMs int, mode byte) {
+	if path == "" || (rate <= 0 && slowMs <= 0) { return }
+	f, err := os.OpenFile(path, os.O_CREATE|os.O_WRONLY|os.O_APPEND, 0644)
+	if err != nil { fmt.Fprintf(os.Stderr, "无法打开时间线文件 %s: %v\n", path, err); return }
+	t := &tracer{f: f, w: bufio.NewWriter(f), rng: rand.New(rand.NewSource(time.Now().UnixNano())), rate: rate,
+		slow: time.Duration(slowMs) * time.Millisecond, mode: mode}
+	if st, err := f.Stat(); err == nil && st.Size() == 0 { t.w.Write([]byte{'P', 'S', 'T', 'R', 1, 0, numPhases, 0}) }
+	tracing = t
+}
+
+// startSpan 开始一个目标的时间线; 未开启或不需要记录时返回 nil, span 的方法均可在 nil 上调用
+func startSpan() *span {
+	t := tracing
+	if t == nil { return nil }
+	t.mu.Lock(); sampled := t.rng.Float64() < t.rate; t.mu.Unlock()
+	if !sampled && t.slow <= 0 { return nil }
+	s := &span{start: time.Now(), sampled: sampled}
+	for i := range s.marks { s.marks[i] = ^uint32(0) }
+	return s
+}
+
+func (s *span) mark(ph int) {
+	if s != nil { atomic.StoreUint32(&s.marks[ph], uint32(time.Since(s.start)/time.Microsecond)) }
+}
+
+// finish 写出一条 72 字节记录: 地址、端口、模式、标志 (1 采样, 2 慢目标)、状态、开始时间、总耗时与各阶段打点
+func (s *span) finish(target string, status int16) {
+	if s == nil { return }
+	total := time.Since(s.start)
+	t := tracing
+	if !s.sampled && total < t.slow { return }
+	host, portStr, err := net.SplitHostPort(target); if err != nil { return }
+	ip := net.ParseIP(host); port, err := strconv.Atoi(portStr)
+	if ip == nil || err != nil { return }
+	rec := make([]byte, 32+4*numPhases)
+	copy(rec[0:16], ip.To16())
+	binary.LittleEndian.PutUint16(rec[16:18], uint16(port))
+	rec[18] = t.mode
+	rec[19] = 2
+	if s.sampled { rec[19] = 1 }
+	binary.LittleEndian.PutUint16(rec[20:22], uint16(status))
+	binary.LittleEndian.PutUint32(rec[24:28], uint32(s.start.Unix()))
+	binary.LittleEndian.PutUint32(rec[28:32], uint32(total/time.Microsecond))
+	for i := range s.marks { binary.LittleEndian.PutUint32(rec[32+4*i:], atomic.LoadUint32(&s.marks[i])) }
+	t.mu.Lock(); defer t.mu.Unlock()
+	if !t.closed { t.w.Write(rec) }
+}
+
+func closeTrace() {
+	t := tracing
+	if t == nil { return }
+	t.mu.Lock(); defer t.mu.Unlock()
+	t.closed = true; t.w.Flush(); t.f.Close()
+}
+'''
+
+
+# --- 内存预算 (-memLimit, MB; 需要 Go 1.19+) ---
+# 设置运行时软上限 (预算的 80%), 按每个进行中目标的估算内存把并发压到预算的一半以内 (结果通道随之缩小),
+# 主机健康表等按条目增长的表压到预算的 1/16 以内, 输入改为先数行再边读边派发; 运行时占用超过预算的 85%
+# 时暂停派发新目标, 直到占用回落或进行中的目标降到下限 (与 net_limits.MemoryGuard 相同, 运行时不一定立即
+# 归还内存, 以进行中的目标数为准不会停滞), 以放慢代替被 OOM 杀掉。结束时输出峰值 RSS。未开启时输入一次
+# 读入, 行为与原来相同。
+GO_MEM_BUDGET = r'''
+type memGuard struct {
+	limitMB int
+	high    uint64
+	cur     uint64
+	peak    uint64
+	waits   int64
+}
+
+var memBudget *memGuard
+
+func memFlags() *int {
+	return flag.Int("memLimit", 0, "内存预算 (MB): 设置运行时软上限并按预算限制并发与缓冲, 接近上限时放慢派发 (0 关闭)")
+}
+
+// setupMemLimit 开启内存预算并返回预算允许的并发数; taskKB 为每个进行中目标的估算内存
+func setupMemLimit(limitMB, threads, taskKB int) int {
+	if limitMB <= 0 { return threads }
+	limit := uint64(limitMB) << 20
+	debug.SetMemoryLimit(int64(limit / 10 * 8))
+	if capped := int(limit / 2 / uint64(taskKB<<10)); threads > capped {
+		if capped < 1 { capped = 1 }
+		fmt.Fprintf(os.Stderr, "内存预算 %d MB: 并发数 %d 调整为 %d\n", limitMB, threads, capped)
+		threads = capped
+	}
+	g := &memGuard{limitMB: limitMB, high: limit / 100 * 85}
+	memBudget = g
+	go func() {
+		samples := []metrics.Sample{{Name: "/memory/classes/total:bytes"}, {Name: "/memory/classes/heap/released:bytes"}}
+		for {
+			metrics.Read(samples)
+			used := samples[0].Value.Uint64() - samples[1].Value.Uint64()
+			atomic.StoreUint64(&g.cur, used)
+			if used > atomic.LoadUint64(&g.peak) { atomic.StoreUint64(&g.peak, used) }
+			time.Sleep(50 * time.Millisecond)
+		}
+	}()
+	return threads
+}
+
+// memItems 返回按条目增长的表在预算下的条目上限 (不超过预算的 1/16); 未开启预算时原样返回 n
+func memItems(n, itemBytes int) int {
+	g := memBudget
+	if g == nil { return n }
+	if capped := g.limitMB << 20 / 16 / itemBytes; n <= 0 || n > capped { return capped }
+	return n
+}
+
+// memWait 在占用超过高水位时暂停派发新目标, 直到占用回落或进行中的目标数 (inflight) 降到 floor 以下
+func memWait(inflight func() int, floor int) {
+	g := memBudget
+	if g == nil || atomic.LoadUint64(&g.cur) < g.high || inflight() <= floor { return }
+	atomic.AddInt64(&g.waits, 1)
+	for atomic.LoadUint64(&g.cur) >= g.high && inflight() > floor { time.Sleep(10 * time.Millisecond) }
+}
+
+// memReport 输出峰值 (Linux 上为进程峰值 RSS, 其它平台为运行时占用峰值)
+func memReport() {
+	g := memBudget
+	if g == nil { return }
+	peak, what := float64(atomic.LoadUint64(&g.peak))/(1<<20), "运行时占用峰值"
+	if data, err := os.ReadFile("/proc/self/status"); err == nil {
+		for _, line := range strings.Split(string(data), "\n") {
+			if f := strings.Fields(line); len(f) >= 2 && f[0] == "VmHWM:" {
+				if kb, err := strconv.Atoi(f[1]); err == nil { peak, what = float64(kb)/1024, "峰值 RSS" }
+			}
+		}
+	}
+	fmt.Fprintf(os.Stderr, "内存预算 %d MB: %s %.1f MB, 因接近上限暂停派发 %d 次。\n", g.limitMB, what, peak, atomic.LoadInt64(&g.waits))
+}
+
+// targetSource 逐个产出输入中的目标 (去掉空行与 # 注释); path 为空时读 stdin (由调用方分块, 一次读入)
+type targetSource struct {
+	lines   []string
+	scanner *bufio.Scanner
+	file    *os.File
+	total   int
+}
+
+func targetLine(text string) (string, bool) {
+	t := strings.TrimSpace(text)
+	return t, t != "" && !strings.HasPrefix(t, "#")
+}
+
+func openTargets(path string) (*targetSource, error) {
+	s := &targetSource{}
+	in := os.Stdin
+	if path != "" {
+		f, err := os.Open(path)
+		if err != nil { return nil, err }
+		in = f
+		if memBudget != nil {
+			for sc := bufio.NewScanner(f); sc.Scan(); { if _, ok := targetLine(sc.Text()); ok { s.total++ } }
+			if _, err := f.Seek(0, 0); err != nil { f.Close(); return nil, err }
+			s.file, s.scanner = f, bufio.NewScanner(f)
+			return s, nil
+		}
+		defer f.Close()
+	}
+	sc := bufio.NewScanner(in)
+	for sc.Scan() { if t, ok := targetLine(sc.Text()); ok { s.lines = append(s.lines, t) } }
+	s.total = len(s.lines)
+	return s, sc.Err()
+}
+
+func (s *targetSource) next() (string, bool) {
+	if s.scanner == nil {
+		if len(s.lines) == 0 { return "", false }
+		t := s.lines[0]
+		s.lines[0] = ""
+		s.lines = s.lines[1:]
+		return t, true
+	}
+	for s.scanner.Scan() { if t, ok := targetLine(s.scanner.Text()); ok { return t, true } }
+	return "", false
+}
+
+func (s *targetSource) close() { if s.file != nil { s.file.Close() } }
+'''
+
+
+# --- 单次运行内的主机健康表 (-hostFailLimit 等) ---
+# 同一主机在建连阶段累计 hostFailLimit 次超时/不可达且从未响应过时判定为不可达, 其余目标建连改用
+# hostFailTimeout 的短超时 (为 0 时直接跳过, 状态 -7), 握手与读响应仍用完整超时。hostInflight 限制同一
+# 主机的并发连接数, 超出的目标排入该主机的队列, 由该主机正在运行的任务依次接手, 不额外占用全局并发。
+# 空闲且健康的主机在 finish 时即删除; 其余空闲条目超过 hostTableMax 个时按最近使用时间淘汰最旧的一成。
+# 队列元素类型 T 由引擎决定 (socks5.py 为目标地址, http.py 为带凭证的 Task; 泛型需要 Go 1.18+), addr 取出其 host:port。
+GO_HOST_TABLE = r'''
+type hostState[T any] struct {
+	running, fails int
+	alive          bool
+	used           uint64
+	pending        []T
+}
+
+func (st *hostState[T]) idle() bool { return st.running == 0 && len(st.pending) == 0 }
+
+type hostTable[T any] struct {
+	mu                           sync.Mutex
+	hosts                        map[string]*hostState[T]
+	addr                         func(T) string
+	failLimit, inflight, max     int
+	shortTimeout                 time.Duration
+	tick                         uint64
+	seen, evicted                int
+	degraded, shortened, skipped int
+}
+
+func hostFlags() (*int, *int, *int, *int, *string) {
+	return flag.Int("hostFailLimit", 3, "同一主机建连超时/不可达达到该次数后判定为不可达 (0 关闭)"),
+		flag.Int("hostFailTimeout", 2000, "不可达主机其余目标建连使用的超时 (毫秒, 0 表示直接跳过)"),
+		flag.Int("hostInflight", 8, "同一主机的最大并发连接数 (0 不限制)"),
+		flag.Int("hostTableMax", 65536, "主机健康表保留的空闲主机数上限, 超出时淘汰最久未用的 (0 不限制)"),
+		flag.String("hostStats", "", "(可选) 追加写入主机健康统计 (JSON) 的文件")
+}
+
+func newHostTable[T any](addr func(T) string, failLimit, inflight, max int, shortTimeout time.Duration) *hostTable[T] {
+	return &hostTable[T]{hosts: make(map[string]*hostState[T]), addr: addr, failLimit: failLimit, inflight: inflight, max: max, shortTimeout: shortTimeout}
+}
+
+// targetAddr 用于队列元素本身就是 host:port 的引擎
+func targetAddr(target string) string { return target }
+
+// 连接被拒绝/重置说明主机在线, 只有超时、无路由等错误才计入不可达
+func hostDown(err error) bool {
+	return !errors.Is(err, syscall.ECONNREFUSED) && !errors.Is(err, syscall.ECONNRESET) && !localPortErr(err)
+}
+
+func hostOf(addr string) string {
+	if h, _, err := net.SplitHostPort(addr); err == nil { return h }
+	return addr
+}
+
+func (t *hostTable[T]) isDown(st *hostState[T]) bool { return t.failLimit > 0 && !st.alive && st.fails >= t.failLimit }
+
+// evict 淘汰最久未用的空闲条目, 直到表内条目不超过上限的九成
+func (t *hostTable[T]) evict() {
+	var idle []string
+	for h, st := range t.hosts { if st.idle() { idle = append(idle, h) } }
+	sort.Slice(idle, func(i, j int) bool { return t.hosts[idle[i]].used < t.hosts[idle[j]].used })
+	for _, h := range idle {
+		if len(t.hosts) <= t.max*9/10 { break }
+		delete(t.hosts, h); t.evicted++
+	}
+}
+
+// start 登记一个目标; 该主机并发已满时排入队列并返回 false
+func (t *hostTable[T]) start(item T) bool {
+	t.mu.Lock(); defer t.mu.Unlock()
+	h := hostOf(t.addr(item)); st := t.hosts[h]
+	if st == nil {
+		if t.max > 0 && len(t.hosts) >= t.max { t.evict() }
+		st = &hostState[T]{}; t.hosts[h] = st; t.seen++
+	}
+	t.tick++; st.used = t.tick
+	if t.inflight > 0 && st.running >= t.inflight { st.pending = append(st.pending, item); return false }
+	st.running++
+	return true
+}
+
+// dialTimeout 返回该目标建连应使用的超时; skip 为 true 表示主机已判定不可达且不再尝试
+func (t *hostTable[T]) dialTimeout(item T, timeout time.Duration) (time.Duration, bool) {
+	t.mu.Lock(); defer t.mu.Unlock()
+	if !t.isDown(t.hosts[hostOf(t.addr(item))]) { return timeout, false }
+	if t.shortTimeout <= 0 { t.skipped++; return 0, true }
+	t.shortened++
+	if t.shortTimeout < timeout { return t.shortTimeout, false }
+	return timeout, false
+}
+
+// finish 记录一个目标的结果, 返回该主机队列中的下一个目标 (没有时第二个返回值为 false)
+func (t *hostTable[T]) finish(item T, down, skipped bool) (T, bool) {
+	t.mu.Lock(); defer t.mu.Unlock()
+	h := hostOf(t.addr(item)); st := t.hosts[h]
+	if !skipped {
+		wasDown := t.isDown(st)
+		if down { st.fails++ } else { st.alive = true }
+		if !wasDown && t.isDown(st) { t.degraded++ }
+	}
+	if len(st.pending) > 0 { next := st.pending[0]; st.pending = st.pending[1:]; return next, true }
+	st.running--
+	if st.idle() && (st.alive || st.fails == 0) { delete(t.hosts, h) }
+	var none T
+	return none, false
+}
+
+// report 把统计输出到 stderr, 指定了 statsFile 时再追加一行 JSON
+func (t *hostTable[T]) report(statsFile string) {
+	t.mu.Lock(); defer t.mu.Unlock()
+	fmt.Fprintf(os.Stderr, "主机健康表: 共 %d 个主机 (结束时保留 %d 个, 淘汰 %d 个), %d 个判定为不可达; 缩短建连超时 %d 个目标, 跳过 %d 个目标。\n",
+		t.seen, len(t.hosts), t.evicted, t.degraded, t.shortened, t.skipped)
+	if statsFile == "" { return }
+	f, err := os.OpenFile(statsFile, os.O_CREATE|os.O_WRONLY|os.O_APPEND, 0644); if err != nil { return }; defer f.Close()
+	line, _ := json.Marshal(map[string]int{"hosts": t.seen, "tracked": len(t.hosts), "evicted": t.evicted,
+		"degraded_hosts": t.degraded, "shortened": t.shortened, "skipped": t.skipped})
+	f.Write(append(line, '\n'))
+}
+'''
+
+
+# --- Top-K 提前结束 (-topK/-maxLatency/-budget) ---
+# topK > 0 时, 成功且延迟不超过 maxLatency (毫秒, 0 不限) 的结果进入按延迟排序的大顶堆, 只保留最快的
+# K 个; 凑满 K 个或超出 budget (秒) 后立即停止派发并不再等待在途目标, 把这 K 个按延迟升序写入输出文件。
+# 只设置 budget 时输出文件照常实时写入, 到时停止。配合 history_rank.py 的排序效果最好。
+GO_TOP_K = r'''
+type topEntry struct {
+	target  string
+	latency time.Duration
+}
+
+type topHeap []topEntry
+
+func (h topHeap) Len() int            { return len(h) }
+func (h topHeap) Less(i, j int) bool  { return h[i].latency > h[j].latency }
+func (h topHeap) Swap(i, j int)       { h[i], h[j] = h[j], h[i] }
+func (h *topHeap) Push(x interface{}) { *h = append(*h, x.(topEntry)) }
+func (h *topHeap) Pop() interface{}   { old := *h; x := old[len(old)-1]; *h = old[:len(old)-1]; return x }
+
+type topK struct {
+	k          int
+	maxLatency time.Duration
+	mu         sync.Mutex
+	best       topHeap
+	stopped    int32
+	reason     string
+	quit       chan struct{}
+}
+
+func topKFlags() (*int, *int, *int) {
+	return flag.Int("topK", 0, "只需要最快的 K 个可用目标, 凑满后提前结束 (0 关闭)"),
+		flag.Int("maxLatency", 0, "计入 Top-K 的最大延迟 (毫秒, 0 不限)"),
+		flag.Int("budget", 0, "时间预算 (秒), 到时停止派发新目标 (0 不限)")
+}
+
+func newTopK(k, maxLatencyMs, budgetSec int) *topK {
+	t := &topK{k: k, maxLatency: time.Duration(maxLatencyMs) * time.Millisecond, quit: make(chan struct{})}
+	if budgetSec > 0 { time.AfterFunc(time.Duration(budgetSec)*time.Second, func() { t.stop("时间预算用尽") }) }
+	return t
+}
+
+func (t *topK) stop(reason string) {
+	if atomic.CompareAndSwapInt32(&t.stopped, 0, 1) { t.reason = reason; close(t.quit) }
+}
+
+// offer 记录一个成功目标, 只在写结果的单个协程中调用
+func (t *topK) offer(target string, latency time.Duration) {
+	if t.maxLatency > 0 && latency > t.maxLatency { return }
+	t.mu.Lock(); defer t.mu.Unlock()
+	heap.Push(&t.best, topEntry{target, latency})
+	if t.best.Len() > t.k { heap.Pop(&t.best) }
+	if t.best.Len() >= t.k { t.stop(fmt.Sprintf("已找到 %d 个满足条件的目标", t.k)) }
+}
+
+func (t *topK) done() bool { return atomic.LoadInt32(&t.stopped) == 1 }
+
+// finish 在 Top-K 模式下把结果按延迟升序写入输出, 并报告提前结束的原因
+func (t *topK) finish(w *bufio.Writer) {
+	t.mu.Lock(); defer t.mu.Unlock()
+	if t.k > 0 {
+		sort.Slice(t.best, func(i, j int) bool { return t.best[i].latency < t.best[j].latency })
+		for _, e := range t.best { fmt.Fprintln(w, e.target) }
+		w.Flush()
+		fmt.Fprintf(os.Stderr, "Top-K: 保留最快的 %d/%d 个目标。\n", len(t.best), t.k)
+	}
+	if atomic.LoadInt32(&t.stopped) == 1 { fmt.Fprintf(os.Stderr, "提前结束: %s。\n", t.reason) }
+}
+'''
+
+
+# --- 可选的套接字配置 (-sockProfile) ---
+# 面向每秒数千次建连的场景: 失败的探测用 SO_LINGER=0 中止关闭 (发送 RST, 本地不留 TIME_WAIT),
+# 关闭 TCP keepalive, 按 -sockBuf 缩小收发缓冲区; -portRange 指定本地端口范围并轮流绑定, 端口被占用
+# (含 TIME_WAIT) 时换下一个, 连续几次都不可用时改由系统分配端口并在短暂等待后重试, 直到建连超时。
+# 本地端口耗尽不是目标的问题: errStatus 把它记为 -7 (未检查), 也不计入主机不可达。只使用标准库接口,
+# 各平台均可编译 (因此不设置 SO_REUSEADDR)。未开启时行为与 net.DialTimeout 完全相同。
+GO_SOCKET_PROFILE = r'''
+var sockProfile struct {
+	enabled   bool
+	buf       int
+	lo, hi    int
+	next      uint32
+	fallbacks uint32
+}
+
+func sockFlags() (*bool, *int, *string) {
+	return flag.Bool("sockProfile", false, "启用高频建连套接字配置 (失败中止关闭/关闭 keepalive/缓冲区/本地端口范围)"),
+		flag.Int("sockBuf", 8192, "开启 -sockProfile 时的收发缓冲区大小 (字节, 0 保持系统默认)"),
+		flag.String("portRange", "", "开启 -sockProfile 时使用的本地端口范围, 如 20000-60000 (为空使用系统分配)")
+}
+
+func setupSockProfile(enabled bool, buf int, portRange string) {
+	sockProfile.enabled, sockProfile.buf = enabled, buf
+	if !enabled || portRange == "" { return }
+	parts := strings.SplitN(portRange, "-", 2)
+	if len(parts) == 2 {
+		lo, err1 := strconv.Atoi(strings.TrimSpace(parts[0])); hi, err2 := strconv.Atoi(strings.TrimSpace(parts[1]))
+		if err1 == nil && err2 == nil && 0 < lo && lo <= hi && hi < 65536 { sockProfile.lo, sockProfile.hi = lo, hi; return }
+	}
+	fmt.Fprintf(os.Stderr, "忽略无效的本地端口范围: %s\n", portRange)
+}
+
+// localPortErr 判断建连错误是否由本地端口不可用引起
+func localPortErr(err error) bool {
+	return errors.Is(err, syscall.EADDRINUSE) || errors.Is(err, syscall.EADDRNOTAVAIL)
+}
+
+// sockDial 按套接字配置建连: 先在本地端口范围内轮流绑定, 都不可用时改由系统分配端口并重试到 deadline
+func sockDial(ctx context.Context, d net.Dialer, network, addr string, deadline time.Time) (net.Conn, error) {
+	var conn net.Conn; var err error
+	if sockProfile.hi > 0 {
+		n := uint32(sockProfile.hi - sockProfile.lo + 1)
+		for i := 0; i < 8; i++ {
+			d.LocalAddr = &net.TCPAddr{Port: sockProfile.lo + int(atomic.AddUint32(&sockProfile.next, 1)%n)}
+			if conn, err = d.DialContext(ctx, network, addr); err == nil || !localPortErr(err) { break }
+		}
+		d.LocalAddr = nil
+	}
+	for conn == nil && (err == nil || localPortErr(err)) {
+		if err != nil {
+			if atomic.AddUint32(&sockProfile.fallbacks, 1) == 1 { fmt.Fprintln(os.Stderr, "本地端口暂不可用 (TIME_WAIT 过多?), 改由系统分配端口重试。") }
+			if time.Until(deadline) < 50*time.Millisecond || ctx.Err() != nil { break }
+			time.Sleep(20 * time.Millisecond)
+		}
+		conn, err = d.DialContext(ctx, network, addr)
+	}
+	if err != nil { return nil, err }
+	if tc, ok := conn.(*net.TCPConn); ok && sockProfile.buf > 0 { tc.SetReadBuffer(sockProfile.buf); tc.SetWriteBuffer(sockProfile.buf) }
+	return conn, nil
+}
+
+func dialTCP(target string, timeout time.Duration) (net.Conn, error) {
+	if !sockProfile.enabled { return net.DialTimeout("tcp", target, timeout) }
+	deadline := time.Now().Add(timeout)
+	return sockDial(context.Background(), net.Dialer{Timeout: timeout, KeepAlive: -1, Deadline: deadline}, "tcp", target, deadline)
+}
+
+// dialContext 供 net/http 的 Transport 使用。连接由 Transport 关闭, 无从区分探测成败, 而每个请求只用
+// 一次连接, 因此开启套接字配置时所有连接都以 SO_LINGER=0 关闭 (引擎需同时关闭连接复用)
+func dialContext(timeout time.Duration) func(context.Context, string, string) (net.Conn, error) {
+	d := net.Dialer{Timeout: timeout}
+	if !sockProfile.enabled { return d.DialContext }
+	d.KeepAlive = -1
+	return func(ctx context.Context, network, addr string) (net.Conn, error) {
+		conn, err := sockDial(ctx, d, network, addr, time.Now().Add(timeout))
+		if tc, ok := conn.(*net.TCPConn); ok { tc.SetLinger(0) }
+		return conn, err
+	}
+}
+
+// closeConn 关闭连接; 开启套接字配置时失败的探测直接中止连接
+func closeConn(conn net.Conn, failed bool) {
+	if failed && sockProfile.enabled {
+		if tc, ok := conn.(*net.TCPConn); ok { tc.SetLinger(0) }
+	}
+	conn.Close()
+}
+'''
@@ -0,0 +1,104 @@
+"""
+按历史结果为待验证目标排序。
+
+从结果日志 (result_log.py) 中取出输入文件里各目标以往的验证记录, 按时间衰减加权估计成功率和延迟,
+把最可能成功且最快的目标排在前面; 没有历史的目标使用日志整体成功率作为先验, 保持原有相对顺序。
+排序后的文件配合 Go 引擎的 -topK / -maxLatency / -budget 使用, 可以在很短时间内拿到可用代理池。
+
+用法:
+    python history_rank.py raw.txt -o raw_ranked.txt --mode deep
+    python socks5.py --jobs jobs.json     # 任务中设置 "rank": true, "top_k": 200, "budget_s": 600
+"""
+import argparse
+import sys
+import time
+
+import result_log
+
+PRIOR_WEIGHT = 2.0          # 先验相当于多少次观测
+LATENCY_SCALE_MS = 1000.0   # 延迟折算: score = 成功率 * S / (S + 延迟)
+
+
+def _key(line):
+    ep = result_log.parse_endpoint(line)
+    if not ep:
+        return None
+    ip = result_log.pack_ip(ep[0])
+    return ip + ep[1].to_bytes(2, "little") if ip else None
+
+
+def load_history(log_path, wanted, mode=None, half_life_days=7.0, now=None):
+    """返回 ({key: [加权尝试, 加权成功, 加权成功延迟和]}, 加权整体成功率, 成功延迟中位数)。"""
+    now = now or time.time()
+    half_life = half_life_days * 86400
+    stats = {}
+    total_w = ok_w = 0.0
+    latencies = []
+    for raw in result_log.iter_packed(log_path, mode=mode):
+        key = raw[:18]
+        if key not in wanted:
+            continue
+        _, _, _, _, status, latency, ts = result_log.RECORD.unpack(raw)
+        w = 0.5 ** (max(now - ts, 0) / half_life) if half_life > 0 else 1.0
+        entry = stats.get(key)
+        if entry is None:
+            entry = stats[key] = [0.0, 0.0, 0.0]
+        entry[0] += w
+        total_w += w
+        if status == result_log.STATUS_OK:
+            lat = LATENCY_SCALE_MS if latency == result_log.LATENCY_UNKNOWN else latency
+            entry[1] += w
+            entry[2] += w * lat
+            ok_w += w
+            latencies.append(lat)
+    latencies.sort()
+    median = latencies[len(latencies) // 2] if latencies else LATENCY_SCALE_MS
+    return stats, (ok_w / total_w if total_w else 0.0), median
+
+
+def score(entry, prior, median_latency):
+    attempts, successes, latency_sum = entry if entry else (0.0, 0.0, 0.0)
+    p = (successes + PRIOR_WEIGHT * prior) / (attempts + PRIOR_WEIGHT)
+    latency = latency_sum / successes if successes else median_latency
+    return p * LATENCY_SCALE_MS / (LATENCY_SCALE_MS + latency)
+
+
+def rank_file(input_path, output_path, log_path=result_log.DEFAULT_LOG_PATH, mode=None, half_life_days=7.0):
+    """把 input_path 按历史得分重排后写入 output_path, 返回统计字典。"""
+    with open(input_path, "r", encoding="utf-8", errors="ignore") as f:
+        lines = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    keys = [_key(line) for line in lines]
+    wanted = {k for k in keys if k}
+    try:
+        stats, prior, median = load_history(log_path, wanted, mode, half_life_days)
+    except (OSError, ValueError):
+        stats, prior, median = {}, 0.0, LATENCY_SCALE_MS
+    scores = [score(stats.get(k), prior, median) for k in keys]
+    order = sorted(range(len(lines)), key=lambda i: -scores[i])
+    with open(output_path, "w", encoding="utf-8") as f:
+        for i in order:
+            f.write(lines[i] + "\n")
+    known = [k for k in keys if k in stats]
+    return {"targets": len(lines), "known": len(known), "known_ok": sum(1 for k in known if stats[k][1] > 0),
+            "prior": round(prior, 4)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="按历史成功率与延迟为目标排序")
+    parser.add_argument("input", help="待验证的目标文件")
+    parser.add_argument("-o", "--output", required=True)
+    parser.add_argument("--log", default=result_log.DEFAULT_LOG_PATH, help="结果日志路径")
+    parser.add_argument("--mode", choices=sorted(result_log.MODES), help="只参考该模式的历史记录")
+    parser.add_argument("--half-life", type=float, default=7.0, help="历史记录权重减半的天数 (0 表示不衰减)")
+    args = parser.parse_args(argv)
+    info = rank_file(args.input, args.output, args.log, args.mode, args.half_life)
+    print(f"已排序 {info['targets']} 个目标 (有历史 {info['known']} 个, 其中曾成功 {info['known_ok']} 个, "
+          f"先验成功率 {info['prior']:.2%}) -> {args.output}")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except OSError as e:
+        print(f"错误: {e}")
+        sys.exit(1)
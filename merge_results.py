@@ -0,0 +1,234 @@
+"""
+合并、去重并排序多次运行的结果输出 (内存有界, 可处理大于内存的结果集)。
+
+支持的输入: socks5.py 会话目录中的结果文件 (含认证扫描的 "[+] 成功: ..." 行与识别器的制表符分隔行)、
+http.py 的 .part_N.tmp 分块、fxxk_cm.py 的 working_partN.txt / details_partN.csv; 传入目录时递归收集
+其中的 .txt / .csv / .tmp 文件。同一端点 (IP:端口) 只保留一条: --keep best 取延迟最低者, latest 取最新者。
+延迟与时间默认取自输出本身 (识别器结果带延迟) 和文件修改时间; 指定 --log 时以结果日志中该端点的
+成功记录为准, 日志同样按地址外部排序后归并连接, 不整体载入内存。
+
+用法:
+    python merge_results.py toolkit_session_* results_dir/ -o merged.txt --log proxy_results.plog --sort latency
+    python merge_results.py a.txt b.csv -o merged.csv -f csv --keep latest
+"""
+import argparse
+import csv
+import heapq
+import itertools
+import os
+import re
+import socket
+import sys
+import tempfile
+from datetime import datetime
+
+import result_log
+
+RUN_SIZE = 200000            # 每个有序段的条目数, 决定内存上限
+MERGE_FANOUT = 128           # 单次归并最多打开的段文件数, 超出时先分层归并
+INPUT_SUFFIXES = (".txt", ".csv", ".tmp")
+SKIP_PROTOCOLS = {"unknown", "http-server"}
+AUTH_LINE = re.compile(r"\[\+\] 成功: (\S+) - 用户名: '(.*)' - 密码: '(.*)'$")
+CSV_FIELDS = ["proxy", "ip", "port", "latency_ms", "timestamp", "time"]
+V4_MAPPED_PREFIX = b"\x00" * 10 + b"\xff\xff"
+
+
+# ---------------- 条目 -----------------
+# 条目为 (端点键, 延迟毫秒, 时间戳, 原始代理文本); IP 端点的键为 0x00 + 16 字节地址 + 大端端口,
+# 主机名端点为 0x01 + 主机名 + 0x00 + 端口, 排在所有 IP 之后。
+
+def endpoint_key(host, port):
+    try:
+        ip = V4_MAPPED_PREFIX + socket.inet_pton(socket.AF_INET, host)  # 快速路径, 与 pack_ip 结果相同
+    except OSError:
+        ip = result_log.pack_ip(host)
+    if ip is not None:
+        return b"\x00" + ip + port.to_bytes(2, "big")
+    return b"\x01" + host.lower().encode("utf-8") + b"\x00" + port.to_bytes(2, "big")
+
+
+def _log_order(raw):
+    # 与 endpoint_key 一致的顺序: 结果日志中的端口为小端
+    return raw[:16] + raw[17:18] + raw[16:17]
+
+
+def parse_line(line):
+    """把一行输出解析为 (代理文本, 延迟或 None); 不是结果行时返回 None。"""
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return None
+    latency = None
+    if "\t" in line:
+        fields = line.split("\t")
+        if len(fields) >= 2 and fields[1] in SKIP_PROTOCOLS:
+            return None
+        if len(fields) >= 4 and fields[3].isdigit():
+            latency = int(fields[3])
+        line = fields[0]
+    elif line.startswith("[+] 成功:"):
+        m = AUTH_LINE.match(line)
+        if m:
+            target, user, password = m.groups()
+            line = f"socks5://{user}:{password}@{target}"
+        else:
+            line = line[len("[+] 成功:"):].split(" (", 1)[0].strip()
+    return line, latency
+
+
+def expand_inputs(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for name in sorted(files):
+                    if name.endswith(INPUT_SUFFIXES):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+
+def iter_entries(paths, stats):
+    for path in expand_inputs(paths):
+        stats["files"] += 1
+        ts = int(os.path.getmtime(path))
+        with open(path, "r", encoding="utf-8-sig", errors="ignore") as f:
+            if path.endswith(".csv"):
+                rows = ((row.get("proxy") or "", None) for row in csv.DictReader(f))
+            else:
+                rows = filter(None, map(parse_line, f))
+            for text, latency in rows:
+                ep = result_log.parse_endpoint(text)
+                if not ep:
+                    continue
+                stats["lines"] += 1
+                yield (endpoint_key(*ep), result_log.LATENCY_UNKNOWN if latency is None else latency, ts, text)
+
+
+# ---------------- 外部排序 -----------------
+
+def _encode(entry):
+    key, latency, ts, text = entry
+    return f"{key.hex()}\t{latency}\t{ts}\t{text}\n"
+
+
+def _decode(line):
+    key, latency, ts, text = line.rstrip("\n").split("\t", 3)
+    return bytes.fromhex(key), int(latency), int(ts), text
+
+
+def _spill(entries, tmp_dir):
+    tmp = tempfile.TemporaryFile("w+", encoding="utf-8", dir=tmp_dir)
+    tmp.writelines(map(_encode, entries))
+    tmp.seek(0)
+    return tmp
+
+
+def external_sort(entries, key, run_size=RUN_SIZE, tmp_dir=None):
+    """与 result_log.sort_packed 相同的外部排序, 面向变长条目; 段数超过 MERGE_FANOUT 时分层归并。"""
+    runs = []
+    try:
+        while True:
+            run = list(itertools.islice(entries, run_size))
+            if not run:
+                break
+            run.sort(key=key)
+            if not runs and len(run) < run_size:
+                yield from run
+                return
+            runs.append(_spill(run, tmp_dir))
+        while len(runs) > MERGE_FANOUT:
+            group, runs = runs[:MERGE_FANOUT], runs[MERGE_FANOUT:]
+            runs.append(_spill(heapq.merge(*(map(_decode, t) for t in group), key=key), tmp_dir))
+            for t in group:
+                t.close()
+        yield from heapq.merge(*(map(_decode, t) for t in runs), key=key)
+    finally:
+        for t in runs:
+            t.close()
+
+
+def _preference(keep):
+    if keep == "latest":
+        return lambda e: (e[0], -e[2], e[1])
+    return lambda e: (e[0], e[1], -e[2])
+
+
+def dedupe(sorted_entries):
+    """输入已按 (键, 偏好) 排序, 每个端点保留第一条。"""
+    last = None
+    for entry in sorted_entries:
+        if entry[0] != last:
+            last = entry[0]
+            yield entry
+
+
+def iter_log_best(log_path, keep, run_size=RUN_SIZE):
+    """按端点键顺序产出结果日志中每个端点的 (键, 延迟, 时间戳): 最快 (best) 或最新 (latest) 的成功记录。"""
+    packed = result_log.sort_packed(result_log.iter_packed(log_path, ok_only=True), _log_order, run_size)
+    pick = (lambda r: (-r[6], r[5])) if keep == "latest" else (lambda r: (r[5], -r[6]))
+    for order, group in itertools.groupby(packed, key=_log_order):
+        best = min((result_log.RECORD.unpack(raw) for raw in group), key=pick)
+        yield b"\x00" + order, best[5], best[6]
+
+
+def attach_log(entries, log_entries, stats):
+    """两个按键排序的流做归并连接, 用日志中的延迟和时间覆盖输出中的值。"""
+    current = next(log_entries, None)
+    for key, latency, ts, text in entries:
+        while current is not None and current[0] < key:
+            current = next(log_entries, None)
+        if current is not None and current[0] == key:
+            stats["log_hits"] += 1
+            latency, ts = current[1], current[2]
+        yield key, latency, ts, text
+
+
+# ---------------- 主流程 -----------------
+
+def merge(paths, output, keep="best", sort="address", log_path=None, fmt="txt", run_size=RUN_SIZE, tmp_dir=None):
+    """合并输出文件, 返回统计字典。"""
+    stats = {"files": 0, "lines": 0, "unique": 0, "log_hits": 0}
+    entries = dedupe(external_sort(iter_entries(paths, stats), _preference(keep), run_size, tmp_dir))
+    if log_path:
+        entries = attach_log(entries, iter_log_best(log_path, keep, run_size), stats)
+    if sort == "latency":
+        entries = external_sort(entries, lambda e: (e[1], e[0]), run_size, tmp_dir)
+    elif sort == "time":
+        entries = external_sort(entries, lambda e: (-e[2], e[0]), run_size, tmp_dir)
+    with open(output, "w", newline="", encoding="utf-8") as out:
+        writer = None
+        if fmt == "csv":
+            writer = csv.writer(out)
+            writer.writerow(CSV_FIELDS)
+        for key, latency, ts, text in entries:
+            if writer:
+                host, port = result_log.parse_endpoint(text)
+                writer.writerow([text, host, port, "" if latency == result_log.LATENCY_UNKNOWN else latency,
+                                 ts, datetime.fromtimestamp(ts).isoformat(timespec="seconds")])
+            else:
+                out.write(text + "\n")
+            stats["unique"] += 1
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="合并、去重并排序多次运行的结果输出")
+    parser.add_argument("inputs", nargs="+", help="结果文件或目录 (会话目录、分块文件等)")
+    parser.add_argument("-o", "--output", required=True)
+    parser.add_argument("-f", "--format", choices=["txt", "csv"], default="txt")
+    parser.add_argument("--keep", choices=["best", "latest"], default="best", help="同一端点保留延迟最低或最新的一条")
+    parser.add_argument("--sort", choices=["address", "latency", "time"], default="address")
+    parser.add_argument("--log", help="结果日志路径, 用其中的成功记录补充延迟与时间")
+    parser.add_argument("--run-size", type=int, default=RUN_SIZE, help="每个有序段的条目数 (内存上限)")
+    parser.add_argument("--tmp-dir", help="临时段文件目录 (默认系统临时目录)")
+    args = parser.parse_args(argv)
+    stats = merge(args.inputs, args.output, args.keep, args.sort, args.log, args.format, args.run_size, args.tmp_dir)
+    from_log = f" (其中 {stats['log_hits']} 条的延迟取自结果日志)" if args.log else ""
+    print(f"读取 {stats['files']} 个文件共 {stats['lines']} 条, 去重后 {stats['unique']} 条{from_log} -> {args.output}")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except (OSError, ValueError) as e:
+        print(f"错误: {e}")
+        sys.exit(1)
@@ -0,0 +1,281 @@
+"""
+本机网络资源预检。
+
+高频建连时限制吞吐的往往是本机资源而不是目标: 文件描述符上限 (ulimit -n) 和本地端口范围
+(ip_local_port_range, 扣除仍处于 TIME_WAIT 的端口)。运行引擎前调用 check() 报告这些限制,
+并把并发数压到本机能承受的范围内; 能提高的软上限会先提高到硬上限 (子进程继承)。
+
+小内存机器上可以给出内存预算 (--memory-limit, MB): memory_cap() 按每个进行中任务的估算内存压低并发,
+MemoryGuard 在本进程 RSS 接近预算时让 asyncio 程序放慢派发, wait_peak_rss() 取得子进程的峰值 RSS。
+Go 引擎的对应实现见 go_snippets.py 中的 GO_MEM_BUDGET (-memLimit)。
+
+用法:
+    python net_limits.py --threads 5000 --port-range 20000-60000
+    python net_limits.py --threads 5000 --memory-limit 400 --task-kb 16
+"""
+import argparse
+import asyncio
+import gc
+import os
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PORT_RANGE_FILE = "/proc/sys/net/ipv4/ip_local_port_range"
+SOCKSTAT_FILE = "/proc/net/sockstat"
+TCP_TABLE_FILES = ("/proc/net/tcp", "/proc/net/tcp6")
+TCP_TIME_WAIT = "06"
+FD_RESERVE = 64          # 留给日志、输出文件和运行时自身的描述符
+PORT_HEADROOM = 0.9      # 只使用可用端口的这一比例, 给其它进程留余量
+MEMORY_RESERVE_MB = 48   # Python 解释器与运行时自身的占用
+MEMORY_TASK_SHARE = 0.5  # 进行中的任务最多使用预算的这一比例
+MEMORY_HIGH_WATER = 0.85 # RSS 超过预算的这一比例时放慢派发
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def raise_nofile():
+    """把文件描述符软上限提高到硬上限, 返回 (软上限, 硬上限); 平台不支持时返回 None。"""
+    if resource is None:
+        return None
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard != resource.RLIM_INFINITY and soft < hard:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+            soft = hard
+        except (ValueError, OSError):
+            pass
+    return soft, hard
+
+
+def parse_port_range(text):
+    parts = str(text).replace("-", " ").split()
+    if len(parts) == 2 and all(p.isdigit() for p in parts):
+        lo, hi = int(parts[0]), int(parts[1])
+        if 0 < lo <= hi < 65536:
+            return lo, hi
+    return None
+
+
+def local_port_range():
+    try:
+        with open(PORT_RANGE_FILE, "r") as f:
+            return parse_port_range(f.read())
+    except OSError:
+        return None
+
+
+def time_wait_count(port_range=None):
+    """TIME_WAIT 状态的 TCP 连接数, 读取失败返回 None。
+
+    指定 port_range 时只统计本地端口在该范围内的 (/proc/net/tcp 与 tcp6), 否则取 /proc/net/sockstat
+    中 IPv4 的总数。
+    """
+    if port_range:
+        lo, hi = port_range
+        count, found = 0, False
+        for path in TCP_TABLE_FILES:
+            try:
+                with open(path, "r") as f:
+                    next(f, None)
+                    for line in f:
+                        fields = line.split(None, 4)
+                        if len(fields) > 3 and fields[3] == TCP_TIME_WAIT and lo <= int(fields[1].rsplit(":", 1)[1], 16) <= hi:
+                            count += 1
+                found = True
+            except (OSError, ValueError, IndexError):
+                continue
+        return count if found else None
+    try:
+        with open(SOCKSTAT_FILE, "r") as f:
+            for line in f:
+                if line.startswith("TCP:"):
+                    fields = line.split()[1:]
+                    return int(dict(zip(fields[::2], fields[1::2])).get("tw", 0))
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def port_range_from_args(args):
+    """从引擎参数中取出 -portRange 的值 (仅在开启 -sockProfile 时生效)。"""
+    args = list(args)
+    if "-sockProfile" in args and "-portRange" in args:
+        i = args.index("-portRange")
+        if i + 1 < len(args):
+            return parse_port_range(args[i + 1])
+    return None
+
+
+def check(threads, fds_per_conn=1, port_range=None, quiet=False):
+    """报告本机限制并返回调整后的并发数。port_range 为引擎显式绑定的端口范围。"""
+    threads = int(threads)
+    limits, notes = [], []
+    nofile = raise_nofile()
+    if nofile:
+        fd_cap = max(1, (nofile[0] - FD_RESERVE) // fds_per_conn)
+        limits.append(fd_cap)
+        notes.append(f"文件描述符上限 {nofile[0]} (硬上限 {nofile[1]})")
+    ports = port_range or local_port_range()
+    if ports:
+        tw = time_wait_count(port_range) or 0
+        port_cap = max(1, int((ports[1] - ports[0] + 1 - tw) * PORT_HEADROOM))
+        limits.append(port_cap)
+        notes.append(f"{'引擎' if port_range else '系统'}本地端口范围 {ports[0]}-{ports[1]} "
+                     f"({ports[1] - ports[0] + 1} 个{f', TIME_WAIT 占用 {tw} 个' if tw else ''})")
+    capped = min([threads] + limits)
+    if not quiet and notes:
+        print(f"[预检] {'; '.join(notes)}。")
+        if capped < threads:
+            print(f"[预检] 并发数 {threads} 超出本机限制, 已调整为 {capped}。")
+    return capped
+
+
+def memory_cap(threads, limit_mb, task_kb, reserve_mb=MEMORY_RESERVE_MB, quiet=False):
+    """按内存预算 (MB) 与每个进行中任务的估算内存 (KB) 返回调整后的并发数; 没有预算时原样返回。"""
+    threads = int(threads)
+    if not limit_mb:
+        return threads
+    reserve_mb = min(reserve_mb, limit_mb / 2)  # 预算很小时至少留一半给任务, 避免并发降到 1
+    capped = min(threads, max(1, int((limit_mb - reserve_mb) * 1024 * MEMORY_TASK_SHARE / task_kb)))
+    if not quiet and capped < threads:
+        print(f"[预检] 内存预算 {limit_mb} MB 下并发数 {threads} 已调整为 {capped}。")
+    return capped
+
+
+def rss_mb():
+    """本进程当前的 RSS (MB), 只在 Linux 上可用, 其它平台返回 None。"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE / (1 << 20)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _maxrss_mb(maxrss):
+    return maxrss / (1 << 20 if sys.platform == "darwin" else 1 << 10)
+
+
+def peak_rss_mb():
+    """本进程的峰值 RSS (MB), 平台不支持时返回 None。"""
+    return _maxrss_mb(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss) if resource else None
+
+
+class RSSSampler:
+    """在后台线程中采样子进程 /proc/<pid>/status 的 VmHWM (峰值 RSS, MB), 只在 Linux 上可用。
+
+    exec 之后是新的地址空间, VmHWM 只含子进程自己; wait4 的 ru_maxrss 还包括 fork 时继承的父进程 RSS。
+    应在 Popen 之后立即创建, 子进程退出前最后一次采样之后的增长会漏掉 (至多 INTERVAL 秒)。
+    """
+    INTERVAL = 0.1
+
+    def __init__(self, pid):
+        self.path = f"/proc/{pid}/status"
+        self.peak = None
+        self.available = os.path.exists(self.path)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True) if self.available else None
+        if self._thread:
+            self._thread.start()
+
+    def _read(self):
+        try:
+            with open(self.path, "r") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        return int(line.split()[1]) / 1024
+        except (OSError, ValueError, IndexError):
+            pass
+        return None  # 进程已退出 (僵尸进程没有 VmHWM)
+
+    def _run(self):
+        while True:
+            hwm = self._read()
+            if hwm is None:
+                return
+            self.peak = hwm
+            if self._stop.wait(self.INTERVAL):
+                return
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        return self.peak
+
+
+def wait_peak_rss(process, sampler=None):
+    """等待 subprocess.Popen 子进程退出并返回其峰值 RSS (MB)。
+
+    能读 /proc 时用 RSSSampler 的采样 (调用方等待前还要读管道时应在 Popen 后立即创建并传入; 子进程在第一次
+    采样前就退出时返回 None), 否则退回 wait4 (数值偏大, 见 RSSSampler); 两者都不可用的平台只等待, 返回 None。
+    """
+    sampler = sampler or RSSSampler(process.pid)
+    if not hasattr(os, "wait4"):
+        process.wait()
+        return sampler.stop()
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    peak = sampler.stop()
+    return peak if sampler.available else _maxrss_mb(usage.ru_maxrss)
+
+
+class MemoryGuard:
+    """asyncio 程序的内存预算: RSS 超过高水位时 wait() 暂停派发, 直到回落或进行中的任务降到下限。
+
+    Python 释放的内存不一定还给系统, 单靠等待 RSS 回落可能停滞, 因此进行中的任务降到 floor 以下就继续,
+    效果是接近预算时并发自动收缩; 每次最多等待 max_wait 秒。读不到 RSS 的平台不限速。
+    """
+    SAMPLE_INTERVAL = 0.05
+
+    def __init__(self, limit_mb, max_wait=5.0):
+        self.limit_mb = limit_mb
+        self.high_mb = limit_mb * MEMORY_HIGH_WATER
+        self.max_wait = max_wait
+        self.waits = 0
+        self._checked = 0.0
+        self._over = False
+
+    def over(self, force=False):
+        now = time.monotonic()
+        if force or now - self._checked >= self.SAMPLE_INTERVAL:
+            self._checked = now
+            rss = rss_mb()
+            self._over = rss is not None and rss >= self.high_mb
+        return self._over
+
+    async def wait(self, inflight=lambda: 0, floor=0):
+        if not self.over():
+            return
+        self.waits += 1
+        gc.collect()
+        deadline = time.monotonic() + self.max_wait
+        while self.over(force=True) and inflight() > floor and time.monotonic() < deadline:
+            await asyncio.sleep(self.SAMPLE_INTERVAL)
+
+    def report(self):
+        peak = peak_rss_mb()
+        peak_text = f"峰值 RSS {peak:.1f} MB" if peak is not None else "峰值 RSS 未知"
+        return f"内存预算 {self.limit_mb} MB: {peak_text}, 因接近上限放慢派发 {self.waits} 次"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="报告本机网络资源限制并给出可用的并发上限")
+    parser.add_argument("--threads", type=int, default=10000, help="计划使用的并发数")
+    parser.add_argument("--port-range", help="引擎显式绑定的本地端口范围, 如 20000-60000")
+    parser.add_argument("--fds-per-conn", type=int, default=1, help="每个并发任务同时占用的连接数")
+    parser.add_argument("--memory-limit", type=int, help="内存预算 (MB)")
+    parser.add_argument("--task-kb", type=int, default=16, help="每个进行中任务的估算内存 (KB)")
+    args = parser.parse_args(argv)
+    port_range = parse_port_range(args.port_range) if args.port_range else None
+    capped = check(args.threads, args.fds_per_conn, port_range)
+    capped = memory_cap(capped, args.memory_limit, args.task_kb, reserve_mb=0)
+    print(f"建议并发上限: {capped}")
+
+
+if __name__ == "__main__":
+    main()
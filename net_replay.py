@@ -0,0 +1,528 @@
+"""
+录制/回放目标的网络行为, 让性能测试在没有外网的机器上也可重复。
+
+capture: 对真实目标按 protocol / deep / http 模式执行与引擎相同的探测, 记录每个目标的建连结果与耗时,
+         以及每一步服务端返回的字节、延迟和结束方式 (关闭 / 重置 / 不再响应), 写入紧凑的二进制文件。
+serve:   在回环地址上回放。每个目标映射到独立的 127.x.y.z 地址 (Linux 上整个 127/8 都是本机地址),
+         服务端按连接的本地地址找到对应目标并按录制的延迟应答; 建连被拒绝的目标映射到一个不监听的端口,
+         建连超时的目标映射到接收队列已满的端口 (SYN 被丢弃)。启动后写出映射后的目标列表, 用它运行引擎即可。
+         建连本身的延迟无法在服务端模拟, 计入第一次应答, 因此每个目标的总耗时一致而阶段归属前移。
+         http 模式响应体中的原始 IP 会替换为回放地址, 出口 IP 校验照常通过; 不支持 https 验证 URL。
+         --procs 大于 1 时多个进程以 SO_REUSEPORT 共用监听端口。
+
+文件格式: 文件头 ("PRCP", 版本 u16, 模式 u8, 保留, 录制超时毫秒 u32) 后接变长记录: 16 字节地址、端口 u16、
+建连结果 i8 (0 成功, -1 被拒绝, -2 超时)、会话数 u8、录制时的判定状态 i16、建连毫秒 u32; 每个会话为
+类型 u8 (0 主会话, 1 http 模式的 Web 服务器复核) 与步数 u8, 每步为延迟毫秒 u32、结束方式 u8、长度 u16
+与返回的字节。文件名以 .gz 结尾时按 gzip 读写。
+
+用法:
+    python net_replay.py capture -m deep -i raw.txt -o deep.prc --threads 500 --timeout 5
+    python net_replay.py info deep.prc
+    python net_replay.py serve deep.prc --targets-out replay_targets.txt --procs 4
+    python engine_bench.py --replay deep.prc
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import multiprocessing
+import socket
+import struct
+import sys
+import time
+from collections import Counter, namedtuple
+
+import async_verifier
+import result_log
+
+HEADER = struct.Struct("<4sHBxI")
+HEADER_MAGIC = b"PRCP"
+VERSION = 1
+RECORD = struct.Struct("<16sHbBhI")
+CONV = struct.Struct("<BB")
+STEP = struct.Struct("<IBH")
+
+DIAL_OK, DIAL_REFUSED, DIAL_TIMEOUT = 0, -1, -2
+# 每步应答后的动作: 等待客户端下一次请求 / 关闭 / 保持连接不再响应 / 重置 / 不等待直接进入下一步
+END_WAIT, END_CLOSE, END_STALL, END_RESET, END_NEXT = 0, 1, 2, 3, 4
+CONV_MAIN, CONV_DIRECT = 0, 1
+
+MAX_STEP = 0xFFFF            # 每步最多记录的字节数
+DEFAULT_PORT = 30080         # 回放端口 (低于常见的临时端口范围); 其后两个端口分别用于"被拒绝"与"建连超时"
+GREETING = b"\x05\x01\x00"
+CONNECT = b"\x05\x01\x00\x03" + bytes([len(async_verifier.DEEP_DEST)]) + async_verifier.DEEP_DEST + \
+    async_verifier.DEEP_PORT.to_bytes(2, "big")
+
+Capture = namedtuple("Capture", "host port dial status dial_ms convs")   # convs: [(类型, [(延迟, 结束方式, 字节)])]
+
+
+def _open(path, mode):
+    return gzip.open(path, mode) if path.endswith(".gz") else open(path, mode)
+
+
+def _ms(start):
+    return int((time.monotonic() - start) * 1000)
+
+
+# ---------------- 文件 -----------------
+
+class CaptureWriter:
+    def __init__(self, path, mode, timeout_ms):
+        self.f = _open(path, "wb")
+        self.f.write(HEADER.pack(HEADER_MAGIC, VERSION, result_log.MODES[mode], timeout_ms))
+        self.count = 0
+
+    def write(self, cap):
+        ip = result_log.pack_ip(cap.host)
+        if ip is None:
+            return False
+        parts = [RECORD.pack(ip, cap.port, cap.dial, len(cap.convs), cap.status, cap.dial_ms)]
+        for kind, steps in cap.convs:
+            parts.append(CONV.pack(kind, len(steps)))
+            for delay, end, data in steps:
+                data = data[:MAX_STEP]
+                parts += [STEP.pack(delay, end, len(data)), data]
+        self.f.write(b"".join(parts))
+        self.count += 1
+        return True
+
+    def close(self):
+        self.f.close()
+
+
+def _read_exact(f, n):
+    data = f.read(n)
+    if len(data) != n:
+        raise EOFError
+    return data
+
+
+def read_header(f):
+    magic, version, mode_id, timeout_ms = HEADER.unpack(_read_exact(f, HEADER.size))
+    if magic != HEADER_MAGIC or version != VERSION:
+        raise ValueError("不是录制文件")
+    return result_log.MODE_NAMES.get(mode_id, str(mode_id)), timeout_ms
+
+
+def capture_info(path):
+    """返回 (模式, 录制超时毫秒)。"""
+    with _open(path, "rb") as f:
+        return read_header(f)
+
+
+def iter_captures(path):
+    with _open(path, "rb") as f:
+        read_header(f)
+        while True:
+            try:
+                ip, port, dial, nconv, status, dial_ms = RECORD.unpack(_read_exact(f, RECORD.size))
+                convs = []
+                for _ in range(nconv):
+                    kind, nsteps = CONV.unpack(_read_exact(f, CONV.size))
+                    steps = []
+                    for _ in range(nsteps):
+                        delay, end, length = STEP.unpack(_read_exact(f, STEP.size))
+                        steps.append((delay, end, _read_exact(f, length)))
+                    convs.append((kind, steps))
+            except EOFError:
+                return  # 文件结束或末条记录不完整
+            yield Capture(result_log.unpack_ip(ip), port, dial, status, dial_ms, convs)
+
+
+# ---------------- 录制 -----------------
+
+def _end_of(exc):
+    return END_STALL if isinstance(exc, (asyncio.TimeoutError, TimeoutError)) else END_RESET
+
+
+async def _recv_once(loop, sock, timeout):
+    """与引擎一样只读一次, 返回一步 (延迟, 结束方式, 字节)。"""
+    start = time.monotonic()
+    try:
+        data = await asyncio.wait_for(loop.sock_recv(sock, MAX_STEP), timeout)
+    except (OSError, asyncio.TimeoutError) as e:
+        return _ms(start), _end_of(e), b""
+    return _ms(start), (END_WAIT if data else END_CLOSE), data
+
+
+async def _recv_all(loop, sock, timeout, head_only=False):
+    """读到对端关闭、超时或达到上限为止, 拆成首字节与其余两步 (保留首字节延迟与读响应体的耗时)。"""
+    start = time.monotonic()
+    deadline = start + timeout
+    buf, first, end = b"", None, END_CLOSE
+    while len(buf) < MAX_STEP:
+        try:
+            data = await asyncio.wait_for(loop.sock_recv(sock, MAX_STEP - len(buf)), max(deadline - time.monotonic(), 0.001))
+        except (OSError, asyncio.TimeoutError) as e:
+            end = _end_of(e)
+            break
+        if not data:
+            break
+        if first is None:
+            first = (_ms(start), len(data))
+        buf += data
+        if head_only and b"\r\n\r\n" in buf:
+            end = END_STALL
+            break
+    if first is None:
+        return [(_ms(start), end, b"")]
+    delay, size = first
+    if size == len(buf):
+        return [(delay, end, buf)]
+    return [(delay, END_NEXT, buf[:size]), (max(_ms(start) - delay, 0), end, buf[size:])]
+
+
+def _dechunk(body):
+    out, pos = bytearray(), 0
+    while True:
+        line_end = body.find(b"\r\n", pos)
+        if line_end < 0:
+            return bytes(out)
+        size = int(body[pos:line_end].split(b";", 1)[0] or b"0", 16)
+        if size == 0:
+            return bytes(out)
+        out += body[line_end + 2:line_end + 2 + size]
+        pos = line_end + 4 + size
+
+
+def http_verdict(steps, host):
+    """按 Go 扫描器的规则由录制的代理响应得出状态 (不含 Web 服务器复核)。"""
+    data, end = b"".join(s[2] for s in steps), steps[-1][1]
+    head, sep, body = data.partition(b"\r\n\r\n")
+    if not sep:
+        return result_log.STATUS_TIMEOUT if end == END_STALL else result_log.STATUS_CONNECT_FAILED
+    parts = head.split(b"\r\n", 1)[0].split(b" ", 2)
+    if len(parts) < 2 or not parts[1].isdigit():
+        return result_log.STATUS_CONNECT_FAILED
+    if int(parts[1]) != 200:
+        return int(parts[1])
+    if b"chunked" in head.lower():
+        body = _dechunk(body)
+    try:
+        origin = json.loads(body).get("origin", "")
+    except (ValueError, AttributeError):
+        return result_log.STATUS_BAD_RESPONSE
+    return result_log.STATUS_OK if host in str(origin) else result_log.STATUS_BAD_RESPONSE
+
+
+async def _dial(loop, host, port, timeout):
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setblocking(False)
+    try:
+        await asyncio.wait_for(loop.sock_connect(sock, (host, port)), timeout)
+    except BaseException:
+        sock.close()
+        raise
+    return sock
+
+
+def _http_request(target, host_header, direct=False):
+    if direct:
+        return f"GET / HTTP/1.1\r\nHost: {host_header}\r\nUser-Agent: Go-http-client/1.1\r\nConnection: close\r\n\r\n".encode()
+    netloc = target.split("://", 1)[-1].split("/", 1)[0]
+    return (f"GET {target} HTTP/1.1\r\nHost: {netloc}\r\nUser-Agent: {async_verifier.USER_AGENT}\r\n"
+            f"Connection: close\r\n\r\n").encode()
+
+
+async def capture_target(host, port, mode, timeout, target):
+    loop = asyncio.get_running_loop()
+    start = time.monotonic()
+    try:
+        sock = await _dial(loop, host, port, timeout)
+    except (OSError, asyncio.TimeoutError) as e:
+        timed_out = isinstance(e, (asyncio.TimeoutError, TimeoutError))
+        return Capture(host, port, DIAL_TIMEOUT if timed_out else DIAL_REFUSED,
+                       async_verifier.err_status(e), _ms(start), [])
+    dial_ms = _ms(start)
+    convs = []
+    try:
+        if mode == "http":
+            await loop.sock_sendall(sock, _http_request(target, f"{host}:{port}"))
+            steps = await _recv_all(loop, sock, timeout + async_verifier.HTTP_EXTRA_TIMEOUT)
+            convs.append((CONV_MAIN, steps))
+            status = http_verdict(steps, host)
+        else:
+            await loop.sock_sendall(sock, GREETING)
+            step = await _recv_once(loop, sock, timeout)
+            steps = [step]
+            convs.append((CONV_MAIN, steps))
+            status = {END_STALL: result_log.STATUS_TIMEOUT, END_RESET: result_log.STATUS_CONNECT_FAILED,
+                      END_CLOSE: result_log.STATUS_CONNECT_FAILED}.get(step[1], result_log.STATUS_BAD_HANDSHAKE)
+            if step[2] == b"\x05\x00":
+                status = result_log.STATUS_OK
+                if mode == "deep":
+                    await loop.sock_sendall(sock, CONNECT)
+                    reply = await _recv_once(loop, sock, timeout)
+                    steps.append(reply)
+                    if reply[1] == END_STALL:
+                        status = result_log.STATUS_TIMEOUT
+                    elif not reply[2]:
+                        status = result_log.STATUS_CONNECT_FAILED
+                    else:
+                        status = reply[2][1] if len(reply[2]) >= 4 else result_log.STATUS_BAD_HANDSHAKE
+            if steps[-1][1] == END_WAIT:
+                steps[-1] = steps[-1][:1] + (END_STALL,) + steps[-1][2:]   # 引擎读完即关闭, 之后对端行为未知
+    except OSError:
+        status = result_log.STATUS_CONNECT_FAILED
+    finally:
+        sock.close()
+    if mode == "http" and status == result_log.STATUS_OK:
+        status = await _capture_direct(loop, host, port, timeout, convs)
+    return Capture(host, port, DIAL_OK, status, dial_ms, convs)
+
+
+async def _capture_direct(loop, host, port, timeout, convs):
+    # Web 服务器复核: 直接请求代理地址, 2xx/3xx 判为 Web 服务器
+    try:
+        sock = await _dial(loop, host, port, timeout)
+    except (OSError, asyncio.TimeoutError):
+        return result_log.STATUS_OK
+    try:
+        await loop.sock_sendall(sock, _http_request(None, f"{host}:{port}", direct=True))
+        steps = await _recv_all(loop, sock, timeout, head_only=True)
+    except OSError:
+        return result_log.STATUS_OK
+    finally:
+        sock.close()
+    convs.append((CONV_DIRECT, steps))
+    parts = steps[0][2].split(b"\r\n", 1)[0].split(b" ", 2)
+    if len(parts) >= 2 and parts[1].isdigit() and 200 <= int(parts[1]) < 400:
+        return result_log.STATUS_WEB_SERVER
+    return result_log.STATUS_OK
+
+
+async def capture(input_path, output_path, mode, threads, timeout, target):
+    writer = CaptureWriter(output_path, mode, int(timeout * 1000))
+    statuses = Counter()
+    queue = asyncio.Queue(maxsize=threads * 2)
+
+    async def worker():
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            cap = await capture_target(item[0], item[1], mode, timeout, target)
+            if writer.write(cap):
+                statuses[cap.status] += 1
+
+    workers = [asyncio.create_task(worker()) for _ in range(threads)]
+    with open(input_path, "r", encoding="utf-8", errors="ignore") as f:
+        for line in f:
+            ep = result_log.parse_endpoint(line)
+            if ep and result_log.pack_ip(ep[0]):
+                await queue.put(ep)
+    for _ in workers:
+        await queue.put(None)
+    await asyncio.gather(*workers)
+    writer.close()
+    return writer.count, statuses
+
+
+# ---------------- 回放 -----------------
+
+def replay_address(i):
+    return f"127.{1 + i // 65536 % 254}.{i // 256 % 256}.{i % 256}"
+
+
+def _rewrite_origin(steps, old, new):
+    """把响应体中的原始 IP 换成回放地址, 并修正 Content-Length。"""
+    data = b"".join(s[2] for s in steps)
+    head, sep, body = data.partition(b"\r\n\r\n")
+    if not sep or old.encode() not in body:
+        return steps
+    body = body.replace(old.encode(), new.encode())
+    lines = [f"Content-Length: {len(body)}".encode() if line.lower().startswith(b"content-length:") else line
+             for line in head.split(b"\r\n")]
+    data = b"\r\n".join(lines) + sep + body
+    first = len(steps[0][2]) + len(data) - sum(len(s[2]) for s in steps)
+    if len(steps) == 1 or first >= len(data):
+        return [(steps[0][0], steps[-1][1], data)]
+    return [(steps[0][0], END_NEXT, data[:first]), (steps[1][0], steps[1][1], data[first:])]
+
+
+def load_replay(path, port=DEFAULT_PORT):
+    """返回 (模式, 录制超时毫秒, {回放地址: (建连毫秒, {会话类型: 步骤})}, 目标列表, {(地址, 端口): 录制状态})。"""
+    mode, timeout_ms = capture_info(path)
+    table, targets, expected = {}, [], {}
+    for i, cap in enumerate(iter_captures(path)):
+        addr = replay_address(i)
+        target_port = {DIAL_OK: port, DIAL_REFUSED: port + 1}.get(cap.dial, port + 2)
+        targets.append(f"{addr}:{target_port}")
+        expected[(addr, target_port)] = cap.status
+        if cap.dial == DIAL_OK:
+            convs = {kind: (_rewrite_origin(steps, cap.host, addr) if mode == "http" and kind == CONV_MAIN else steps)
+                     for kind, steps in cap.convs}
+            table[addr] = (cap.dial_ms, convs)
+    return mode, timeout_ms, table, targets, expected
+
+
+async def _read_request(reader, http):
+    if not http:
+        return await reader.read(4096)
+    try:
+        return await reader.readuntil(b"\r\n\r\n")
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+        return b""
+
+
+async def _handle(reader, writer, table, http, speed):
+    entry = table.get(writer.get_extra_info("sockname")[0])
+    try:
+        if entry is None:
+            return
+        first = await _read_request(reader, http)
+        if not first:
+            return
+        extra, convs = entry
+        steps = convs.get(CONV_DIRECT if http and first.startswith(b"GET /") else CONV_MAIN)
+        for delay, end, data in steps or ():
+            await asyncio.sleep((delay + extra) * speed / 1000)
+            extra = 0
+            if data:
+                writer.write(data)
+                await writer.drain()
+            if end == END_WAIT and await _read_request(reader, http):
+                continue
+            if end == END_STALL:
+                while await reader.read(4096):
+                    pass
+            if end == END_RESET:
+                writer.get_extra_info("socket").setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+                writer.transport.abort()
+            if end != END_NEXT:
+                return
+    except OSError:
+        pass
+    finally:
+        writer.close()
+
+
+async def _serve_main(path, host, port, speed, reuse_port, ready):
+    mode, _, table, _, _ = load_replay(path, port)
+    server = await asyncio.start_server(lambda r, w: _handle(r, w, table, mode == "http", speed), host, port,
+                                        backlog=4096, reuse_port=reuse_port or None, reuse_address=True)
+    ready.put(len(table))
+    async with server:
+        await server.serve_forever()
+
+
+def _serve_process(path, host, port, speed, reuse_port, ready):
+    if async_verifier.uvloop is not None:
+        asyncio.set_event_loop_policy(async_verifier.uvloop.EventLoopPolicy())
+    try:
+        asyncio.run(_serve_main(path, host, port, speed, reuse_port, ready))
+    except KeyboardInterrupt:
+        pass
+
+
+class ReplayServer:
+    """在后台进程中回放录制文件; targets 为映射后的目标列表, expected 为各目标录制时的判定状态。"""
+
+    def __init__(self, path, host="0.0.0.0", port=DEFAULT_PORT, procs=1, speed=1.0):
+        self.mode, self.timeout_ms, _, self.targets, self.expected = load_replay(path, port)
+        reuse_port = procs > 1 and hasattr(socket, "SO_REUSEPORT")
+        ready = multiprocessing.Queue()
+        self.procs = []
+        for _ in range(procs if reuse_port else 1):
+            p = multiprocessing.Process(target=_serve_process, args=(path, host, port, speed, reuse_port, ready), daemon=True)
+            p.start()
+            self.procs.append(p)
+        for _ in self.procs:
+            ready.get(timeout=60)
+        self._held = self._hold_ports(host, port)   # 在启动服务进程之后创建, 以免被子进程继承
+
+    @staticmethod
+    def _hold_ports(host, port):
+        # port+1 只绑定不监听 (连接被拒绝); port+2 的接收队列被占满, 新的 SYN 被丢弃 (建连超时)
+        refused = socket.socket()
+        refused.bind((host, port + 1))
+        blackhole = socket.socket()
+        blackhole.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        blackhole.bind((host, port + 2))
+        blackhole.listen(0)
+        fillers = []
+        for _ in range(4):
+            s = socket.socket()
+            s.setblocking(False)
+            s.connect_ex(("127.0.0.1", port + 2))
+            fillers.append(s)
+        return [refused, blackhole] + fillers
+
+    def stop(self):
+        for p in self.procs:
+            p.terminate()
+            p.join()
+        for s in self._held:
+            s.close()
+
+
+# ---------------- 命令行 -----------------
+
+def cmd_capture(args):
+    count, statuses = asyncio.run(capture(args.input, args.output, args.mode, args.threads, args.timeout, args.target))
+    print(f"已录制 {count} 个目标 -> {args.output}; 状态分布: "
+          + ", ".join(f"{k}:{v}" for k, v in sorted(statuses.items())))
+
+
+def cmd_info(args):
+    mode, timeout_ms = capture_info(args.capture)
+    dials, statuses, size, steps = Counter(), Counter(), 0, 0
+    for cap in iter_captures(args.capture):
+        dials[cap.dial] += 1
+        statuses[cap.status] += 1
+        steps += sum(len(s) for _, s in cap.convs)
+        size += sum(len(d) for _, s in cap.convs for _, _, d in s)
+    total = sum(dials.values())
+    print(f"模式 {mode}, 录制超时 {timeout_ms} 毫秒, 目标 {total} 个, 应答 {steps} 步共 {size} 字节")
+    print("建连: " + ", ".join(f"{name} {dials[k]}" for k, name in ((DIAL_OK, "成功"), (DIAL_REFUSED, "被拒绝"), (DIAL_TIMEOUT, "超时"))))
+    print("状态: " + ", ".join(f"{k}:{v}" for k, v in sorted(statuses.items())))
+
+
+def cmd_serve(args):
+    server = ReplayServer(args.capture, args.host, args.port, args.procs, args.speed)
+    with open(args.targets_out, "w", encoding="utf-8") as f:
+        f.writelines(t + "\n" for t in server.targets)
+    print(f"回放 {len(server.targets)} 个目标 (模式 {server.mode}, {len(server.procs)} 个进程), 监听 {args.host}:{args.port}; "
+          f"目标列表 -> {args.targets_out}")
+    print(f"录制时的超时为 {server.timeout_ms / 1000:g} 秒, 运行引擎时使用相同的超时。按 Ctrl+C 停止。")
+    try:
+        for p in server.procs:
+            p.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="录制/回放目标的网络行为")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("capture", help="探测真实目标并录制其行为")
+    p.add_argument("-i", "--input", required=True)
+    p.add_argument("-o", "--output", required=True)
+    p.add_argument("-m", "--mode", choices=["protocol", "deep", "http"], default="deep")
+    p.add_argument("--threads", type=int, default=200)
+    p.add_argument("--timeout", type=float, default=10)
+    p.add_argument("--target", default=async_verifier.DEFAULT_TARGET, help="(http 模式) 验证 URL")
+    p.set_defaults(func=cmd_capture)
+    p = sub.add_parser("info", help="录制文件统计")
+    p.add_argument("capture")
+    p.set_defaults(func=cmd_info)
+    p = sub.add_parser("serve", help="在回环地址上回放")
+    p.add_argument("capture")
+    p.add_argument("--host", default="0.0.0.0", help="监听地址 (需要接收 127/8 上的所有地址)")
+    p.add_argument("--port", type=int, default=DEFAULT_PORT)
+    p.add_argument("--procs", type=int, default=1)
+    p.add_argument("--speed", type=float, default=1.0, help="延迟缩放系数 (0 表示不等待)")
+    p.add_argument("--targets-out", default="replay_targets.txt")
+    p.set_defaults(func=cmd_serve)
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except (OSError, ValueError) as e:
+        print(f"错误: {e}")
+        sys.exit(1)
@@ -0,0 +1,333 @@
+"""
+代理池增量复检调度器 (常驻运行)。
+
+不再每隔几小时对整个代理池跑一遍 deep_verifier, 而是把池中每个代理放进按"下次到期时间"
+排序的优先队列, 只在到期时以受限速率复检:
+  - 稳定度 (成功率的 EWMA) 越高、延迟越低的代理, 复检间隔越长;
+  - 刚失败的代理按 min_interval 起步指数退避, 连续失败 evict_after 次后移出存活池; 移出的代理仍留在
+    队列中, 每隔 max_interval 复检一次, 恢复后重新加入存活池。
+复检借用 socks5.py 的 deep_verifier 与 http.py 的 Go 引擎成批执行 (没有 Go 时改用 async_verifier.py),
+结果同时写入 result_log 的全局结果日志 (每批结束后打开、并入、关闭, 不长期占用日志的写锁)。
+
+用法:
+    python pool_scheduler.py pool.txt --output alive.txt --rate 20
+池文件每行一个代理, 'socks5://' 或 'http://' 前缀指定协议, 无前缀视为 socks5。
+"""
+import argparse
+import heapq
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import go_build
+import result_log
+import socks5
+
+ENGINES = {"socks5": "deep_verifier", "http": "http_verifier"}
+
+DEFAULTS = {
+    "state_file": "pool_state.json",
+    "rate": 20.0,             # 平均每秒最多复检的代理数
+    "window": 30.0,           # 单批最长聚合时间 (秒), 决定令牌桶容量
+    "min_interval": 600,      # 最短复检间隔 (秒)
+    "max_interval": 6 * 3600, # 最长复检间隔 (秒)
+    "threads": 200,
+    "timeout": 10,
+    "evict_after": 6,         # 连续失败多少次后移出存活池
+    "alpha": 0.3,             # EWMA 平滑系数
+    "result_log": result_log.DEFAULT_LOG_PATH,
+}
+
+
+class PoolEntry:
+    __slots__ = ("key", "proto", "host", "port", "auth", "next_due", "last_probe", "probes", "successes",
+                 "consecutive_failures", "stability", "ewma_latency", "alive")
+
+    def __init__(self, key, proto, host, port, auth=""):
+        self.key, self.proto, self.host, self.port, self.auth = key, proto, host, port, auth
+        self.next_due = 0.0
+        self.last_probe = 0.0
+        self.probes = 0
+        self.successes = 0
+        self.consecutive_failures = 0
+        self.stability = 0.5
+        self.ewma_latency = None
+        self.alive = True
+
+    def to_dict(self):
+        return {k: getattr(self, k) for k in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, d):
+        entry = cls(d["key"], d["proto"], d["host"], d["port"], d.get("auth", ""))
+        for k in cls.__slots__:
+            if k in d:
+                setattr(entry, k, d[k])
+        return entry
+
+
+def parse_pool_line(line):
+    s = line.strip()
+    if not s or s.startswith("#"):
+        return None
+    proto = "socks5"
+    if "://" in s:
+        scheme = s.split("://", 1)[0].lower()
+        proto = "http" if scheme in ("http", "https") else "socks5"
+    ep = result_log.parse_endpoint(s)
+    if not ep:
+        return None
+    rest = s.split("://", 1)[-1]
+    auth = rest.rsplit("@", 1)[0] if "@" in rest else ""
+    host, port = ep
+    key = f"{proto}://{auth + '@' if auth else ''}{result_log.format_endpoint(host, port)}"
+    return PoolEntry(key, proto, host, port, auth)
+
+
+def next_interval(entry, cfg):
+    """根据成功历史与 EWMA 延迟计算下一次复检的间隔。"""
+    if entry.consecutive_failures:
+        return min(cfg["max_interval"], cfg["min_interval"] * 2 ** (entry.consecutive_failures - 1))
+    span = cfg["max_interval"] - cfg["min_interval"]
+    interval = cfg["min_interval"] + span * entry.stability ** 2
+    if entry.ewma_latency is not None:
+        # 延迟逼近超时的代理更容易翻转, 缩短间隔
+        interval *= max(0.5, 1 - 0.5 * entry.ewma_latency / (cfg["timeout"] * 1000))
+    return interval * random.uniform(0.9, 1.1)
+
+
+def update_entry(entry, ok, latency_ms, now, cfg):
+    alpha = cfg["alpha"]
+    entry.probes += 1
+    entry.last_probe = now
+    entry.stability = (1 - alpha) * entry.stability + alpha * (1.0 if ok else 0.0)
+    if ok:
+        entry.successes += 1
+        entry.consecutive_failures = 0
+        entry.alive = True
+        if latency_ms is not None:
+            entry.ewma_latency = latency_ms if entry.ewma_latency is None else (1 - alpha) * entry.ewma_latency + alpha * latency_ms
+    else:
+        entry.consecutive_failures += 1
+        if entry.consecutive_failures >= cfg["evict_after"]:
+            entry.alive = False
+    if entry.alive:
+        entry.next_due = now + next_interval(entry, cfg)
+    else:
+        entry.next_due = now + cfg["max_interval"] * random.uniform(0.9, 1.1)
+
+
+def defer_entry(entry, now, cfg):
+    """本次没有得到结论 (如本机端口耗尽时引擎跳过): 不动稳定度与失败计数, 过 min_interval 再复检。"""
+    entry.next_due = now + cfg["min_interval"] * random.uniform(0.9, 1.1)
+
+
+# ---------------- 复检执行 -----------------
+
+def prepare_engines(protos):
+    # http.py 的引擎源码在首次编译 (缓存未命中) 时才加载
+    socks5.BUILD_CACHE.register("http_verifier", go_build.load_http_source)
+    return socks5.prepare_engines({ENGINES[p] for p in protos})
+
+
+def probe_group(entries, proto, auth, cfg, work_dir):
+    """对同一协议/凭证的一组代理执行一次批量复检, 返回 {key: (ok, latency_ms) 或 None} 及裸记录文件路径。
+    只有引擎写出结果记录的代理才有结果; 没有记录的 (引擎中途退出等) 不在返回值中,
+    记录为 STATUS_HOST_SKIPPED (本机端口耗尽等, 未真正探测) 的为 None。"""
+    input_path = os.path.join(work_dir, "targets.txt")
+    output_path = os.path.join(work_dir, "alive.txt")
+    record_path = os.path.join(work_dir, "records.bin")
+    for path in (output_path, record_path):
+        if os.path.exists(path): os.remove(path)
+    with open(input_path, "w", encoding="utf-8") as f:
+        for e in entries:
+            f.write(result_log.format_endpoint(e.host, e.port) + "\n")
+    engine = socks5.engine_command(ENGINES[proto])
+    threads, timeout = str(min(cfg["threads"], len(entries))), str(cfg["timeout"])
+    if proto == "socks5":
+        cmd = engine + ["-inputFile", input_path, "-outputFile", output_path, "-threads", threads,
+               "-timeout", timeout, "-recordFile", record_path]
+    else:
+        cmd = engine + ["-pfile", input_path, "-output", output_path, "-workers", threads,
+               "-timeout", timeout, "-record", record_path]
+        if auth:
+            cred_path = os.path.join(work_dir, "cred.txt")
+            with open(cred_path, "w", encoding="utf-8") as f: f.write(auth + "\n")
+            cmd.extend(["-cfile", cred_path])
+    proc = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, errors="replace")
+    if proc.returncode != 0:
+        detail = proc.stderr.strip().splitlines()[-1:] or [""]
+        print(f"警告: {proto} 复检引擎异常退出 (退出码 {proc.returncode}) {detail[0]}")
+
+    outcomes = {}
+    if os.path.exists(record_path):
+        with open(record_path, "rb") as f:
+            for rec in result_log.RECORD.iter_unpack(f.read()):
+                r = result_log.unpack_record(result_log.RECORD.pack(*rec))
+                if r.status == result_log.STATUS_HOST_SKIPPED:
+                    outcomes[(r.ip, r.port)] = None
+                else:
+                    outcomes[(r.ip, r.port)] = (r.status == result_log.STATUS_OK, r.latency_ms)
+    results = {e.key: outcomes[(e.host, e.port)] for e in entries if (e.host, e.port) in outcomes}
+    return results, record_path
+
+
+def probe_batch(entries, cfg):
+    groups = {}
+    for e in entries:
+        groups.setdefault((e.proto, e.auth), []).append(e)
+    results = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        for (proto, auth), group in groups.items():
+            group_results, record_path = probe_group(group, proto, auth, cfg, work_dir)
+            results.update(group_results)
+            if cfg["result_log"]:
+                with result_log.ResultLog(cfg["result_log"]) as log:
+                    log.append_raw(record_path)
+    return results
+
+
+# ---------------- 调度主循环 -----------------
+
+def load_state(path):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return {d["key"]: PoolEntry.from_dict(d) for d in json.load(f)}
+    except (json.JSONDecodeError, KeyError) as e:
+        print(f"警告: 状态文件 {path} 损坏 ({e}), 将重新开始。")
+        return {}
+
+
+def save_state(path, pool):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump([e.to_dict() for e in pool.values()], f)
+    os.replace(tmp, path)
+
+
+def write_alive(path, pool):
+    tmp = path + ".tmp"
+    ranked = sorted((e for e in pool.values() if e.alive and e.successes),
+                    key=lambda e: (-e.stability, e.ewma_latency if e.ewma_latency is not None else float("inf")))
+    with open(tmp, "w", encoding="utf-8") as f:
+        for e in ranked:
+            f.write(e.key + "\n")
+    os.replace(tmp, path)
+
+
+def load_pool(pool_files, state, cfg, spread=True):
+    now = time.time()
+    pool = {}
+    for path in pool_files:
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            for line in f:
+                entry = parse_pool_line(line)
+                if entry and entry.key not in pool:
+                    # 新加入的代理在第一个 min_interval 内均匀打散, 避免启动时突发
+                    pool[entry.key] = state.get(entry.key) or entry
+                    if entry.key not in state:
+                        entry.next_due = now + (random.uniform(0, cfg["min_interval"]) if spread else 0)
+    return pool
+
+
+def run_scheduler(pool_files, output_file, cfg, once=False):
+    state = load_state(cfg["state_file"])
+    pool = load_pool(pool_files, state, cfg, spread=not once)
+    if not pool:
+        print("代理池为空, 退出。"); return
+    if not prepare_engines({e.proto for e in pool.values()}):
+        sys.exit(1)
+    queue = [(e.next_due, e.key) for e in pool.values()]
+    heapq.heapify(queue)
+    evicted = sum(1 for e in pool.values() if not e.alive)
+    print(f"代理池 {len(pool)} 个 (已移出 {evicted} 个, 按 max_interval 复检), 速率上限 {cfg['rate']}/秒。")
+
+    capacity = max(1, int(cfg["rate"] * cfg["window"]))
+    tokens, last_refill = float(capacity), time.monotonic()
+    started, total_probes = time.time(), 0
+    while queue:
+        now = time.time()
+        mono = time.monotonic()
+        tokens = min(capacity, tokens + (mono - last_refill) * cfg["rate"])
+        last_refill = mono
+        if queue[0][0] > now or tokens < 1:
+            if once and queue[0][0] > now:
+                break
+            wait = max(queue[0][0] - now, (1 - tokens) / cfg["rate"])
+            time.sleep(min(wait, cfg["window"]))
+            continue
+
+        batch = []
+        while queue and queue[0][0] <= now and len(batch) < int(tokens):
+            _, key = heapq.heappop(queue)
+            batch.append(pool[key])
+        tokens -= len(batch)
+
+        t0 = time.time()
+        results = probe_batch(batch, cfg)
+        finished = time.time()
+        ok_count = missing = skipped = 0
+        for e in batch:
+            if results.get(e.key) is not None:
+                ok, latency = results[e.key]
+                ok_count += ok
+                update_entry(e, ok, latency, finished, cfg)
+            elif e.key in results:
+                skipped += 1
+                defer_entry(e, finished, cfg)
+            else:
+                # 没有结果记录: 不计成败, next_due 不变; 常驻时下一批重试, --once 时留给下次运行
+                missing += 1
+                if once:
+                    continue
+            heapq.heappush(queue, (e.next_due, e.key))
+        total_probes += len(batch)
+
+        alive = sum(1 for e in pool.values() if e.alive)
+        hours = max((finished - started) / 3600, 1 / 3600)
+        missing_text = (f", 跳过 {skipped}" if skipped else "") + (f", 无结果 {missing}" if missing else "")
+        print(f"[{time.strftime('%H:%M:%S')}] 复检 {len(batch)} 个 ({finished - t0:.1f}s), 成功 {ok_count}{missing_text}; "
+              f"存活 {alive}/{len(pool)}, 累计复检 {total_probes} (≈{total_probes / hours:.0f}/小时)")
+        save_state(cfg["state_file"], pool)
+        write_alive(output_file, pool)
+    save_state(cfg["state_file"], pool)
+    write_alive(output_file, pool)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="代理池增量复检调度器")
+    parser.add_argument("pool_files", nargs="+", help="代理池文件 (可多个)")
+    parser.add_argument("-o", "--output", default="alive_pool.txt", help="实时更新的存活代理列表")
+    parser.add_argument("--state", default=DEFAULTS["state_file"], help="调度状态文件")
+    parser.add_argument("--rate", type=float, default=DEFAULTS["rate"])
+    parser.add_argument("--min-interval", type=int, default=DEFAULTS["min_interval"])
+    parser.add_argument("--max-interval", type=int, default=DEFAULTS["max_interval"])
+    parser.add_argument("--threads", type=int, default=DEFAULTS["threads"])
+    parser.add_argument("--timeout", type=int, default=DEFAULTS["timeout"])
+    parser.add_argument("--evict-after", type=int, default=DEFAULTS["evict_after"])
+    parser.add_argument("--once", action="store_true", help="只处理当前已到期的代理后退出 (适合 cron)")
+    parser.add_argument("--prebuilt", help="预编译Go核心程序目录 (见 go_build.py export)")
+    parser.add_argument("--engine", choices=["auto", "go", "python"], default="auto",
+                        help="复检引擎, auto 在没有 Go 时改用 Python 异步引擎 (async_verifier.py)")
+    args = parser.parse_args(argv)
+    if args.prebuilt:
+        socks5.BUILD_CACHE.prebuilt_dir = args.prebuilt
+    socks5.ENGINE_PREFERENCE = args.engine
+
+    cfg = dict(DEFAULTS)
+    cfg.update(state_file=args.state, rate=args.rate, min_interval=args.min_interval, max_interval=args.max_interval,
+               threads=args.threads, timeout=args.timeout, evict_after=args.evict_after)
+    run_scheduler(args.pool_files, args.output, cfg, once=args.once)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n调度器已停止, 状态已保存。")
@@ -0,0 +1,166 @@
+"""
+可导入的异步验证接口, 供其它服务直接调用 (不写临时文件, 不启动子进程)。
+
+    import proxy_api
+
+    async for r in proxy_api.verify(["1.2.3.4:1080", ("5.6.7.8", 1080)], mode="deep", concurrency=500):
+        if r.ok:
+            print(r.endpoint, r.latency_ms)
+
+    results = proxy_api.verify_all(open("proxies.txt"), mode="protocol", timeout=5)   # 同步调用
+
+模式:
+  - protocol / deep / http: 与对应 Go 引擎的判定和状态码相同 (实现见 async_verifier.py)
+  - api: 调用 fxxk_cm.py 的远程检测接口 (fetch_check, 需要 aiohttp), 响应 JSON 放在 data 字段
+endpoints 可以是普通或异步可迭代对象, 元素为 'host:port'、带协议与认证的代理 URL 或 (host, port);
+只有空闲的工作协程才会取下一个目标, 结果按完成顺序产出。调用方处理得慢时输出队列会满, 工作协程随之
+暂停且不再读取输入, 因此内存占用只与并发数有关; 提前退出循环会取消进行中的检查。
+"""
+import asyncio
+import time
+from collections import namedtuple
+from urllib.parse import unquote
+
+import async_verifier
+import result_log
+
+MODES = ("protocol", "deep", "http", "api")
+AUTH_MODES = ("http", "api")    # 会使用代理认证的模式; SOCKS5 检查只协商无认证方式
+
+
+class Result(namedtuple("Result", "endpoint host port mode status latency_ms auth data")):
+    """一个目标的检查结果; auth 为实际使用的 'user:pass' (没有或模式不使用认证时为 None), data 为 api 模式的响应。"""
+    __slots__ = ()
+
+    @property
+    def ok(self):
+        return self.status == result_log.STATUS_OK
+
+
+def _task(item, user=None, password=None):
+    if isinstance(item, tuple):
+        host, port = item[0], int(item[1])
+    else:
+        text = str(item).strip()
+        host, port = result_log.parse_endpoint(text) or (None, 0)
+        rest = text.split("://", 1)[-1]
+        if user is None and "@" in rest:
+            user, _, password = rest.rsplit("@", 1)[0].partition(":")
+            user, password = unquote(user), unquote(password)
+    target = result_log.format_endpoint(host, port) if host else str(item)
+    return async_verifier.Task(target, host, port, user or None, password or None)
+
+
+async def _iter_tasks(endpoints, credentials):
+    creds = list(credentials) if credentials else [(None, None)]
+    if hasattr(endpoints, "__aiter__"):
+        async for item in endpoints:
+            for user, password in creds:
+                yield item, _task(item, user, password)
+    else:
+        for item in endpoints:
+            for user, password in creds:
+                yield item, _task(item, user, password)
+
+
+def _api_checker(timeout, api_base, api_params, scheme):
+    """返回 (检查函数, 关闭函数); aiohttp 与 fxxk_cm 只在 api 模式下导入。"""
+    import aiohttp
+    import fxxk_cm
+    api_base = api_base or fxxk_cm.CONFIG["api_base"]
+    scheme = scheme or fxxk_cm.CONFIG["proxy_mode"]
+    if api_params is None and fxxk_cm.CONFIG["token"]:
+        api_params = {"token": fxxk_cm.CONFIG["token"]}
+    session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=None, sock_connect=timeout, sock_read=timeout),
+                                    headers={"User-Agent": "checker/1.0"})
+
+    async def check(item, task):
+        start = time.monotonic()
+        proxy = fxxk_cm.normalize_proxy_line(item if isinstance(item, str) else task.target, scheme)
+        _, ok, data = await fxxk_cm.fetch_check(session, api_base, proxy, api_params, timeout)
+        return fxxk_cm.result_status(ok, data), int((time.monotonic() - start) * 1000), data
+
+    return check, session.close
+
+
+def _engine_checker(mode, timeout, target):
+    async def check(item, task):
+        status, latency = await async_verifier.probe(task, mode, timeout, target)
+        return status, latency, None
+
+    async def close():
+        pass
+
+    return check, close
+
+
+async def verify(endpoints, mode="deep", concurrency=100, timeout=10, target=async_verifier.DEFAULT_TARGET,
+                 credentials=None, api_base=None, api_params=None, scheme=None, queue_size=None, log=None):
+    """异步生成器, 逐个产出 Result。
+
+    target 为 http 模式的验证 URL; credentials 为 (user, password) 序列, 每个目标与每组凭证各检查一次
+    (只用于 http 模式, 其它模式传入时抛出 ValueError); api_base / api_params / scheme 覆盖 fxxk_cm.CONFIG 中的接口地址、附加参数与代理协议;
+    queue_size 为已完成但未被取走的结果上限 (默认等于并发数); log 为打开的 result_log.ResultLog 时
+    同时写入结果日志。
+    """
+    if mode not in MODES:
+        raise ValueError(f"未知模式: {mode} (可选 {', '.join(MODES)})")
+    if credentials and mode != "http":
+        raise ValueError(f"{mode} 模式不使用认证, 不能指定 credentials")
+    concurrency = max(1, int(concurrency))
+    if mode == "api":
+        check, close = _api_checker(timeout, api_base, api_params, scheme)
+    else:
+        check, close = _engine_checker(mode, timeout, target)
+    source = _iter_tasks(endpoints, credentials)
+    pull_lock = asyncio.Lock()      # 异步生成器不能被多个协程同时推进
+    results = asyncio.Queue(maxsize=queue_size or concurrency)
+    done = object()
+
+    async def worker():
+        while True:
+            async with pull_lock:
+                try:
+                    item, task = await source.__anext__()
+                except StopAsyncIteration:
+                    return
+            status, latency, data = await check(item, task)
+            auth = f"{task.user}:{task.password}" if task.user and mode in AUTH_MODES else None
+            await results.put(Result(task.target if isinstance(item, tuple) else str(item).strip(),
+                                     task.host, task.port, mode, status, latency, auth, data))
+
+    async def supervise(workers):
+        try:
+            await asyncio.gather(*workers)
+        except Exception as e:  # 输入迭代器出错等, 交给调用方
+            await results.put(e)
+        else:
+            await results.put(done)
+
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    supervisor = asyncio.create_task(supervise(workers))
+    try:
+        while True:
+            r = await results.get()
+            if r is done:
+                return
+            if isinstance(r, Exception):
+                raise r
+            if log is not None and r.host:
+                log.append(r.host, r.port, mode, r.status, r.latency_ms)
+            yield r
+    finally:
+        for t in workers + [supervisor]:
+            t.cancel()
+        await asyncio.gather(*workers, supervisor, return_exceptions=True)
+        await source.aclose()
+        await close()
+
+
+async def collect(endpoints, **kwargs):
+    return [r async for r in verify(endpoints, **kwargs)]
+
+
+def verify_all(endpoints, **kwargs):
+    """同步封装: 检查全部目标并返回 Result 列表 (不能在已运行的事件循环中调用)。"""
+    return asyncio.run(collect(endpoints, **kwargs))
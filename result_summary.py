@@ -0,0 +1,249 @@
+"""
+按国家、ASN 与数据中心标记汇总可用代理, 并统计滥用评分 (abuser_score) 分布。
+
+单遍流式处理: 每行只把分类字段编码成整数代号、把评分存入列数组 (array), 攒满一批后用 bincount
+一次性累加到各汇总表 (安装了 numpy 时向量化, 否则逐条累加), 内存只与国家/ASN 的种类数有关。
+fxxk_cm.py 在每批结果写出后更新 outdir 下的 summary.json, 运行中随时可以查看; 也可以事后对
+details_partN.csv 重新汇总。汇总文件先写临时文件再替换, 读取方不会看到写了一半的内容。
+
+用法:
+    python result_summary.py api_output/ -o api_output/summary.json
+    python result_summary.py details_part1.csv details_part2.csv --top 20 --asn-limit 100
+"""
+import argparse
+import bisect
+import csv
+import json
+import math
+import os
+import sys
+from array import array
+from datetime import datetime
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+BATCH = 65536                # 每批列数组的行数
+ASN_LIMIT = 500              # 汇总文件中保留的 ASN 条数, 其余合并为一条
+SCORE_EDGES = [0.0, 0.001, 0.005, 0.01, 0.05, 0.1, 0.2, 0.5, 1.0]   # 评分分桶下界, 最后一桶含 1.0 以上
+UNKNOWN = "未知"
+DATACENTER = "数据中心"
+COLUMNS = ("alive", "datacenter", "score_sum", "score_n")
+
+
+def parse_score(value):
+    """API 返回的评分可能是数字或 '0.0039 (Low)' 这样的文本, 无法解析时返回 NaN。"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(str(value).split()[0])
+    except (ValueError, IndexError):
+        return math.nan
+
+
+def _asn_key(value):
+    text = str(value or "").strip().upper()
+    text = text[2:] if text.startswith("AS") else text
+    return f"AS{text}" if text else UNKNOWN
+
+
+def _bincount(codes, n, weights=None):
+    if np is not None:
+        return np.bincount(codes, weights=weights, minlength=n)
+    out = [0.0] * n
+    for i, c in enumerate(codes):
+        out[c] += 1 if weights is None else weights[i]
+    return out
+
+
+class _Table:
+    """一个分类维度的汇总表: 键到代号的映射, 每列一个 array('d'), 按代号索引。"""
+
+    def __init__(self):
+        self.codes = {}
+        self.labels = []
+        self.columns = {name: array("d") for name in COLUMNS}
+
+    def code(self, key):
+        c = self.codes.get(key)
+        if c is None:
+            c = self.codes[key] = len(self.labels)
+            self.labels.append(key)
+        return c
+
+    def accumulate(self, codes, weights):
+        n = len(self.labels)
+        for name, column in self.columns.items():
+            column.extend([0.0] * (n - len(column)))
+            counts = _bincount(codes, n, weights[name])
+            if np is not None:
+                np.frombuffer(column, dtype=np.float64)[:] += counts
+            else:
+                for i, v in enumerate(counts):
+                    column[i] += v
+
+    def rows(self, limit=None):
+        order = sorted(range(len(self.labels)), key=lambda i: -self.columns["alive"][i])
+        out = [self._row(self.labels[i], *(self.columns[c][i] for c in COLUMNS)) for i in order[:limit]]
+        if limit is not None and len(order) > limit:
+            rest = [sum(self.columns[c][i] for i in order[limit:]) for c in COLUMNS]
+            out.append(self._row(f"其它 ({len(order) - limit} 个)", *rest))
+        return out
+
+    @staticmethod
+    def _row(key, alive, dc, score_sum, score_n):
+        return {"key": key, "alive": int(alive), "datacenter": int(dc),
+                "abuse_mean": round(score_sum / score_n, 6) if score_n else None}
+
+
+class Summary:
+    """流式汇总器: add() 逐行追加 (fxxk_cm 的 details 行字典), write() 写出当前汇总。"""
+
+    def __init__(self, batch=BATCH):
+        self.batch = batch
+        self.total = 0
+        self.country = _Table()
+        self.asn = _Table()
+        self.asn_org = {}
+        self.histogram = array("d", [0.0] * 2 * len(SCORE_EDGES))   # [非数据中心..., 数据中心...]
+        self.unscored = array("d", [0, 0])
+        self._reset()
+
+    def _reset(self):
+        self._country = array("I")
+        self._asn = array("I")
+        self._dc = array("B")
+        self._score = array("d")
+
+    def add(self, row):
+        country = (row.get("country") or "").strip().upper() or UNKNOWN
+        asn = _asn_key(row.get("asn"))
+        if asn not in self.asn.codes:
+            self.asn_org[asn] = row.get("org") or ""
+        self._country.append(self.country.code(country))
+        self._asn.append(self.asn.code(asn))
+        self._dc.append(1 if row.get("ip_type") == DATACENTER or row.get("datacenter_name") else 0)
+        self._score.append(parse_score(row.get("abuser_score")))
+        if len(self._dc) >= self.batch:
+            self.flush()
+
+    def update(self, rows):
+        for row in rows:
+            self.add(row)
+
+    def flush(self):
+        if not self._dc:
+            return
+        weights = self._weights()
+        self.country.accumulate(self._columns(self._country), weights)
+        self.asn.accumulate(self._columns(self._asn), weights)
+        self.total += len(self._dc)
+        self._reset()
+
+    def _columns(self, codes):
+        return np.frombuffer(codes, dtype=np.uint32) if np is not None else codes
+
+    def _weights(self):
+        """本批的权重列, 同时把评分计入直方图。"""
+        bins = len(SCORE_EDGES)
+        if np is not None:
+            dc = np.frombuffer(self._dc, dtype=np.uint8).astype(np.float64)
+            score = np.frombuffer(self._score, dtype=np.float64)
+            valid = ~np.isnan(score)
+            idx = np.clip(np.searchsorted(SCORE_EDGES, score[valid], side="right") - 1, 0, bins - 1)
+            np.frombuffer(self.histogram, dtype=np.float64)[:] += np.bincount(
+                idx + bins * dc[valid].astype(np.int64), minlength=2 * bins)
+            self.unscored[0] += int(np.count_nonzero(~valid & (dc == 0)))
+            self.unscored[1] += int(np.count_nonzero(~valid & (dc == 1)))
+            return {"alive": None, "datacenter": dc, "score_sum": np.where(valid, score, 0.0),
+                    "score_n": valid.astype(np.float64)}
+        valid = [s == s for s in self._score]
+        for s, ok, d in zip(self._score, valid, self._dc):
+            if ok:
+                self.histogram[bins * d + min(max(bisect.bisect_right(SCORE_EDGES, s) - 1, 0), bins - 1)] += 1
+            else:
+                self.unscored[d] += 1
+        return {"alive": None, "datacenter": self._dc, "score_sum": [s if ok else 0.0 for s, ok in zip(self._score, valid)],
+                "score_n": [1.0 if ok else 0.0 for ok in valid]}
+
+    def to_dict(self, asn_limit=ASN_LIMIT):
+        self.flush()
+        bins = len(SCORE_EDGES)
+        labels = [f"{lo:g}-{hi:g}" for lo, hi in zip(SCORE_EDGES, SCORE_EDGES[1:])] + [f"{SCORE_EDGES[-1]:g}+"]
+        dc_alive = int(sum(self.country.columns["datacenter"]))
+        asn_rows = self.asn.rows(asn_limit)
+        for row in asn_rows:
+            row["org"] = self.asn_org.get(row["key"], "")
+        return {
+            "updated": datetime.now().isoformat(timespec="seconds"),
+            "alive": self.total,
+            "datacenter": {"yes": dc_alive, "no": self.total - dc_alive},
+            "abuse_score": {
+                "buckets": labels,
+                "non_datacenter": [int(v) for v in self.histogram[:bins]],
+                "datacenter": [int(v) for v in self.histogram[bins:]],
+                "unscored": {"non_datacenter": int(self.unscored[0]), "datacenter": int(self.unscored[1])},
+            },
+            "country": self.country.rows(),
+            "asn": asn_rows,
+        }
+
+    def write(self, path, asn_limit=ASN_LIMIT):
+        data = self.to_dict(asn_limit)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, path)
+        return data
+
+
+def iter_detail_rows(paths):
+    """递归收集目录中的 details_*.csv, 逐行产出字典。"""
+    for path in paths:
+        if os.path.isdir(path):
+            files = sorted(os.path.join(root, name) for root, _, names in os.walk(path) for name in names
+                           if name.startswith("details") and name.endswith(".csv"))
+        else:
+            files = [path]
+        for name in files:
+            with open(name, "r", encoding="utf-8-sig", errors="ignore", newline="") as f:
+                yield from csv.DictReader(f)
+
+
+def print_summary(data, top):
+    print(f"可用 {data['alive']} 个, 其中数据中心 {data['datacenter']['yes']} 个")
+    for dim, title in (("country", "国家"), ("asn", "ASN")):
+        print(f"\n{title:<12}{'可用':>10}{'数据中心':>10}{'平均评分':>12}")
+        for row in data[dim][:top]:
+            mean = f"{row['abuse_mean']:.4f}" if row["abuse_mean"] is not None else "-"
+            print(f"{row['key']:<12}{row['alive']:>10}{row['datacenter']:>10}{mean:>12}  {row.get('org', '')}")
+    score = data["abuse_score"]
+    print(f"\n{'评分区间':<14}{'非数据中心':>10}{'数据中心':>10}")
+    for label, a, b in zip(score["buckets"], score["non_datacenter"], score["datacenter"]):
+        print(f"{label:<14}{a:>10}{b:>10}")
+    print(f"{'无评分':<14}{score['unscored']['non_datacenter']:>10}{score['unscored']['datacenter']:>10}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="按国家/ASN/数据中心汇总可用代理与滥用评分分布")
+    parser.add_argument("inputs", nargs="+", help="fxxk_cm.py 的 details CSV 或输出目录")
+    parser.add_argument("-o", "--output", help="汇总文件 (JSON)")
+    parser.add_argument("--top", type=int, default=15, help="终端显示的条数")
+    parser.add_argument("--asn-limit", type=int, default=ASN_LIMIT, help="汇总文件中保留的 ASN 条数")
+    args = parser.parse_args(argv)
+    summary = Summary()
+    summary.update(iter_detail_rows(args.inputs))
+    data = summary.write(args.output, args.asn_limit) if args.output else summary.to_dict(args.asn_limit)
+    print_summary(data, args.top)
+    if np is None:
+        print("\n(未安装 numpy, 使用纯 Python 累加)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except (OSError, ValueError) as e:
+        print(f"错误: {e}")
+        sys.exit(1)
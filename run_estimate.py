@@ -0,0 +1,200 @@
+"""
+长时间运行前的抽样估算: 推荐超时与并发数, 预估总耗时与结果数量。
+
+单遍读取输入, 用蓄水池抽样 (Algorithm L, 按几何分布跳过, 不必为每行生成随机数) 取出固定数量的
+随机目标并统计总行数; 以宽松的超时检查样本 (proxy_api.verify, 判定与对应引擎相同), 得到可用率与
+延迟分布。推荐的超时为可用目标延迟 P99 的 1.25 倍, 会漏掉的可用目标比例一并给出; 每个目标平均
+占用一个并发槽的时间 (可用的取延迟, 超时的取推荐超时) 乘以总数即为总的并发·秒, 除以目标运行时长
+(默认半小时) 得到所需并发, 再限制在该模式的常用范围 (THREAD_RANGE) 与本机限制 (net_limits) 之内。
+预估耗时不含 CPU 与带宽瓶颈, 应视为下限; 结果数量附可用率的 95% 置信区间。
+
+socks5.py 的协议/深度验证在询问并发与超时前可以先运行估算, fxxk_cm.py 用 --estimate 只估算不运行。
+
+用法:
+    python run_estimate.py socks5_list.txt --mode deep --sample 500
+    python run_estimate.py proxies.txt --mode api --sample 300 --probe-timeout 20
+"""
+import argparse
+import asyncio
+import math
+import random
+import sys
+import time
+
+import async_verifier
+import net_limits
+import proxy_api
+import result_log
+
+SAMPLE_SIZE = 500
+PROBE_TIMEOUT = 15           # 样本检查的超时 (秒), 足够宽以观察到慢目标
+PROBE_CONCURRENCY = 200
+TIMEOUT_QUANTILE = 0.99
+TIMEOUT_MARGIN = 1.25
+TARGET_RUNTIME = 1800        # 推荐并发按约这个秒数跑完计算, 更高的并发只会让远端限速与丢包先出现
+THREAD_RANGE = {             # 各模式推荐并发的常用范围 (socks5.py / http.py / fxxk_cm.py 的默认值在其中)
+    "protocol": (100, 2000), "deep": (50, 1000), "http": (50, 1000), "api": (50, 2000),
+}
+MAX_THREADS = 10000
+API_TASK_KB = 64             # 与 fxxk_cm.TASK_KB 相同 (不导入 fxxk_cm, 以免非 api 模式也依赖 aiohttp)
+Z95 = 1.96
+STATUS_NAMES = {
+    result_log.STATUS_OK: "可用", result_log.STATUS_CONNECT_FAILED: "连接失败", result_log.STATUS_TIMEOUT: "超时",
+    result_log.STATUS_BAD_HANDSHAKE: "握手错误", result_log.STATUS_WEB_SERVER: "Web 服务器",
+    result_log.STATUS_BAD_RESPONSE: "响应错误",
+}
+
+
+def reservoir_sample(lines, k, rng=random):
+    """从可迭代对象中等概率抽取 k 个元素, 返回 (样本列表, 元素总数)。"""
+    sample, total = [], 0
+    it = iter(lines)
+    for item in it:
+        sample.append(item)
+        total += 1
+        if total == k:
+            break
+    if total < k or k <= 0:
+        return sample, total
+    w = math.exp(math.log(rng.random()) / k)
+    nxt = total + int(math.log(rng.random()) / math.log(1 - w))
+    for item in it:
+        if total == nxt:
+            sample[rng.randrange(k)] = item
+            w *= math.exp(math.log(rng.random()) / k)
+            nxt += int(math.log(rng.random()) / math.log(1 - w)) + 1
+        total += 1
+    return sample, total
+
+
+def iter_targets(path):
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                yield line
+
+
+def quantile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def wilson(successes, n, z=Z95):
+    """二项比例的 Wilson 置信区间。"""
+    if n == 0:
+        return 0.0, 0.0
+    p = successes / n
+    center = (p + z * z / (2 * n)) / (1 + z * z / n)
+    half = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / (1 + z * z / n)
+    return max(0.0, center - half), min(1.0, center + half)
+
+
+async def probe_sample(sample, mode, timeout, concurrency, target=async_verifier.DEFAULT_TARGET):
+    """检查样本, 返回 [(状态码, 延迟毫秒)]。"""
+    return [(r.status, r.latency_ms) async for r in
+            proxy_api.verify(sample, mode=mode, concurrency=concurrency, timeout=timeout, target=target)]
+
+
+def recommend(results, total, mode, probe_timeout, max_threads=MAX_THREADS, memory_limit=None, default_timeout=5,
+              target_runtime=TARGET_RUNTIME):
+    """由样本结果计算推荐值与预估, 返回字典。"""
+    n = len(results)
+    alive = sorted(latency for status, latency in results if status == result_log.STATUS_OK)
+    p99 = quantile(alive, TIMEOUT_QUANTILE)
+    timeout = min(probe_timeout, max(1, math.ceil(p99 * TIMEOUT_MARGIN / 1000))) if p99 is not None else default_timeout
+    limit_ms = timeout * 1000
+    kept = sum(1 for v in alive if v <= limit_ms) / len(alive) if alive else 0.0
+    # 每个目标占用并发槽的平均时间: 超过推荐超时的都按超时计
+    busy = sum(min(latency if status != result_log.STATUS_TIMEOUT else limit_ms, limit_ms)
+               for status, latency in results) / 1000 / n if n else 0.0
+    cap = net_limits.check(max_threads, quiet=True)
+    task_kb = API_TASK_KB if mode == "api" else async_verifier.MEM_TASK_KB[mode]
+    cap = net_limits.memory_cap(cap, memory_limit, task_kb, quiet=True)
+    lo, hi = THREAD_RANGE[mode]
+    needed = math.ceil(total * busy / target_runtime)
+    threads = max(1, min(cap, total, max(lo, min(hi, needed))))
+    low, high = wilson(len(alive), n)
+    return {
+        "sample": n, "total": total, "alive": len(alive), "alive_rate": len(alive) / n if n else 0.0,
+        "alive_low": low, "alive_high": high,
+        "latency": {q: quantile(alive, q) for q in (0.5, 0.9, 0.95, 0.99)},
+        "statuses": {s: sum(1 for status, _ in results if status == s) for s in sorted({s for s, _ in results})},
+        "timeout": timeout, "kept": kept, "threads": threads, "thread_cap": cap, "thread_range": (lo, hi),
+        "threads_needed": needed, "target_runtime": target_runtime, "busy_seconds": busy,
+        "runtime": total * busy / threads, "results": total * len(alive) / n * kept if n else 0.0,
+        "results_low": total * low * kept, "results_high": total * high * kept,
+    }
+
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    if seconds < 60:
+        return f"{seconds} 秒"
+    if seconds < 3600:
+        return f"{seconds // 60} 分 {seconds % 60} 秒"
+    return f"{seconds // 3600} 小时 {seconds % 3600 // 60} 分"
+
+
+def format_report(est):
+    lat = est["latency"]
+    lat_text = ", ".join(f"P{int(q * 100)} {v} ms" for q, v in lat.items() if v is not None) or "无可用目标"
+    status_text = ", ".join(f"{STATUS_NAMES.get(s, s)} {c}" for s, c in est["statuses"].items())
+    return [
+        f"抽样 {est['sample']} / {est['total']} 个目标: 可用 {est['alive']} 个 ({est['alive_rate']:.1%}, "
+        f"95% 区间 {est['alive_low']:.1%}-{est['alive_high']:.1%})",
+        f"状态分布: {status_text}",
+        f"可用目标延迟: {lat_text}",
+        f"推荐超时: {est['timeout']} 秒 (可保留样本中 {est['kept']:.1%} 的可用目标)",
+        f"推荐并发: {est['threads']} (约 {format_duration(est['target_runtime'])}跑完需 {est['threads_needed']}, "
+        f"模式范围 {est['thread_range'][0]}-{est['thread_range'][1]}, 本机上限 {est['thread_cap']}; "
+        f"每个目标平均占用 {est['busy_seconds']:.2f} 秒)",
+        f"预计耗时: 约 {format_duration(est['runtime'])} (下限, 不含 CPU/带宽瓶颈)",
+        f"预计结果: 约 {est['results']:,.0f} 个 ({est['results_low']:,.0f} - {est['results_high']:,.0f})",
+    ]
+
+
+def estimate(path, mode, sample_size=SAMPLE_SIZE, probe_timeout=PROBE_TIMEOUT, concurrency=PROBE_CONCURRENCY,
+             max_threads=MAX_THREADS, memory_limit=None, default_timeout=5, seed=None, quiet=False,
+             target_runtime=TARGET_RUNTIME):
+    """抽样并检查输入文件, 返回 recommend() 的字典 (输入为空时返回 None)。"""
+    t0 = time.monotonic()
+    sample, total = reservoir_sample(iter_targets(path), sample_size, random.Random(seed))
+    if not sample:
+        return None
+    if not quiet:
+        print(f"[估算] 读取 {total} 个目标并抽取 {len(sample)} 个, 用时 {time.monotonic() - t0:.1f} 秒; "
+              f"以 {probe_timeout} 秒超时检查样本...")
+    results = asyncio.run(probe_sample(sample, mode, probe_timeout, min(concurrency, len(sample))))
+    est = recommend(results, total, mode, probe_timeout, max_threads, memory_limit, default_timeout, target_runtime)
+    if not quiet:
+        for line in format_report(est):
+            print(f"[估算] {line}")
+    return est
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="抽样估算运行耗时并推荐超时与并发数")
+    parser.add_argument("input", help="目标文件, 每行一个")
+    parser.add_argument("--mode", choices=proxy_api.MODES, default="deep")
+    parser.add_argument("--sample", type=int, default=SAMPLE_SIZE, help="样本大小")
+    parser.add_argument("--probe-timeout", type=int, default=PROBE_TIMEOUT, help="样本检查的超时 (秒)")
+    parser.add_argument("--concurrency", type=int, default=PROBE_CONCURRENCY, help="样本检查的并发数")
+    parser.add_argument("--max-threads", type=int, default=MAX_THREADS, help="推荐并发数的上限")
+    parser.add_argument("--memory-limit", type=int, help="内存预算 (MB), 推荐并发时一并考虑")
+    parser.add_argument("--target-runtime", type=int, default=TARGET_RUNTIME, help="期望的运行时长 (秒), 据此推荐并发")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+    if estimate(args.input, args.mode, args.sample, args.probe_timeout, args.concurrency, args.max_threads,
+                args.memory_limit, seed=args.seed, target_runtime=args.target_runtime) is None:
+        print("输入文件为空。")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except OSError as e:
+        print(f"错误: {e}")
+        sys.exit(1)
@@ -1,13 +1,15 @@
+import argparse
 import subprocess
 import sys
 import tempfile
 import os
 import shutil
-import hashlib
 import json
 import time
 from datetime import datetime
 import getpass
+import gzip
+import queue
 import threading
 
 
@@ -25,6 +27,14 @@ except ImportError:
     print("错误: 缺少 'requests' 库。请运行 'pip install requests' 进行安装。")
     sys.exit(1)
 
+import async_verifier
+import batch_jobs
+import go_build
+import go_snippets
+import net_limits
+import result_log
+import run_estimate
+
 
 # --- GO 语言核心代码 1: SOCKS5 协议验证器 (快速) ---
 GO_SOURCE_CODE_PROTOCOL_VERIFIER = r'''
@@ -32,36 +42,84 @@ package main
 
 import (
 	"bufio"
+	"container/heap"
+	"context"
+	"encoding/binary"
+	"encoding/json"
+	"errors"
 	"flag"
 	"fmt"
+	"math/rand"
 	"net"
 	"os"
+	"runtime/debug"
+	"runtime/metrics"
+	"sort"
+	"strconv"
 	"strings"
 	"sync"
+	"sync/atomic"
+	"syscall"
 	"time"
 )
 
-func verifyProtocol(target string, timeout time.Duration, results chan<- string) {
-	conn, err := net.DialTimeout("tcp", target, timeout)
+type result struct {
+	target  string
+	status  int16
+	latency time.Duration
+	down    bool // 建连阶段失败且不是被拒绝 (主机疑似不可达)
+}
+
+// 状态码与 result_log.py 一致: 0 成功, -1 连接失败, -2 超时, -3 握手失败, -7 主机不可达已跳过
+func errStatus(err error) int16 {
+	if localPortErr(err) { return -7 }
+	if ne, ok := err.(net.Error); ok && ne.Timeout() { return -2 }
+	return -1
+}
+
+// 打包一条 32 字节结果记录 (格式见 result_log.py), 目标不是 IP 地址时返回 nil
+func packRecord(r result, mode byte) []byte {
+	host, portStr, err := net.SplitHostPort(r.target)
+	if err != nil { return nil }
+	ip := net.ParseIP(host)
+	port, err := strconv.Atoi(portStr)
+	if ip == nil || err != nil { return nil }
+	rec := make([]byte, 32)
+	copy(rec[0:16], ip.To16())
+	binary.LittleEndian.PutUint16(rec[16:18], uint16(port))
+	rec[18] = mode
+	binary.LittleEndian.PutUint16(rec[20:22], uint16(r.status))
+	binary.LittleEndian.PutUint32(rec[22:26], uint32(r.latency/time.Millisecond))
+	binary.LittleEndian.PutUint32(rec[26:30], uint32(time.Now().Unix()))
+	return rec
+}
+
+func verifyProtocol(target string, dialTimeout, timeout time.Duration) (r result) {
+	start := time.Now()
+	sp := startSpan()
+	defer func() { sp.finish(target, r.status) }()
+	conn, err := dialTCP(target, dialTimeout)
+	sp.mark(phDial)
 	if err != nil {
-		results <- ""
-		return
+		return result{target, errStatus(err), time.Since(start), hostDown(err)}
 	}
-	defer conn.Close()
+	defer func() { closeConn(conn, r.status != 0); sp.mark(phClose) }()
 
 	_, err = conn.Write([]byte{0x05, 0x01, 0x00})
+	sp.mark(phGreetWrite)
 	if err != nil {
-		results <- ""
-		return
+		return result{target, errStatus(err), time.Since(start), false}
 	}
 	resp := make([]byte, 2)
 	conn.SetReadDeadline(time.Now().Add(timeout))
 	n, err := conn.Read(resp)
+	sp.mark(phGreetRead)
 	if err == nil && n == 2 && resp[0] == 0x05 && resp[1] == 0x00 {
-		results <- target
-	} else {
-		results <- ""
+		return result{target, 0, time.Since(start), false}
+	} else if err != nil {
+		return result{target, errStatus(err), time.Since(start), false}
 	}
+	return result{target, -3, time.Since(start), false}
 }
 
 func main() {
@@ -69,49 +127,85 @@ func main() {
 	outputFile := flag.String("outputFile", "", "输出验证后可用代理的文件")
 	threads := flag.Int("threads", 100, "并发线程数")
 	timeout := flag.Int("timeout", 10, "连接超时时间 (秒)")
+	recordFile := flag.String("recordFile", "", "(可选) 追加写入二进制结果记录的文件")
+	recordMode := flag.Int("recordMode", 1, "结果记录中的模式编号")
+	hostFailLimit, hostFailTimeout, hostInflight, hostTableMax, hostStats := hostFlags()
+	topKN, maxLatency, budget := topKFlags()
+	sockOn, sockBuf, portRange := sockFlags()
+	traceFile, traceRate, traceSlow := traceFlags()
+	memLimit := memFlags()
 	flag.Parse()
+	setupSockProfile(*sockOn, *sockBuf, *portRange)
+	setupTrace(*traceFile, *traceRate, *traceSlow, byte(*recordMode))
+	*threads = setupMemLimit(*memLimit, *threads, 16)
 
 	if *inputFile == "" || *outputFile == "" { os.Exit(1) }
-	file, _ := os.Open(*inputFile); defer file.Close(); scanner := bufio.NewScanner(file); var targets []string
-	for scanner.Scan() { targets = append(targets, strings.TrimSpace(scanner.Text())) }
-	
-	total := len(targets)
+	src, err := openTargets(*inputFile); if err != nil { fmt.Fprintln(os.Stderr, err); os.Exit(1) }; defer src.close()
+	total := src.total
 	fmt.Fprintf(os.Stderr, "开始对 %d 个目标进行 SOCKS5 协议验证...\n", total)
 
 	outFile, _ := os.Create(*outputFile); defer outFile.Close()
 	writer := bufio.NewWriter(outFile)
 	
-	results := make(chan string, *threads)
+	var recWriter *bufio.Writer
+	if *recordFile != "" {
+		recFile, err := os.OpenFile(*recordFile, os.O_CREATE|os.O_WRONLY|os.O_APPEND, 0644)
+		if err == nil { defer recFile.Close(); recWriter = bufio.NewWriter(recFile) }
+	}
+
+	top := newTopK(*topKN, *maxLatency, *budget)
+	results := make(chan result, *threads)
 	var writerWg sync.WaitGroup
 	var validCount int
 	writerWg.Add(1)
 	go func() {
 		defer writerWg.Done()
-		for r := range results {
-			if r != "" {
+		for {
+			var r result; var ok bool
+			select { case r, ok = <-results: case <-top.quit: }
+			if !ok { break }
+			if recWriter != nil {
+				if rec := packRecord(r, byte(*recordMode)); rec != nil { recWriter.Write(rec) }
+			}
+			if r.status == 0 {
 				validCount++
-				fmt.Println(r) // Keep printing to stdout for immediate feedback
-				fmt.Fprintln(writer, r)
-				writer.Flush()
+				fmt.Println(r.target) // Keep printing to stdout for immediate feedback
+				if top.k > 0 { top.offer(r.target, r.latency) } else { fmt.Fprintln(writer, r.target); writer.Flush() }
 			}
 		}
+		if recWriter != nil { recWriter.Flush() }
 	}()
 
+	hosts := newHostTable(targetAddr, *hostFailLimit, *hostInflight, memItems(*hostTableMax, 256), time.Duration(*hostFailTimeout)*time.Millisecond)
 	var workerWg sync.WaitGroup; sem := make(chan struct{}, *threads)
-	for _, target := range targets {
-		if target == "" { continue }
-		workerWg.Add(1); sem <- struct{}{}; go func(t string) {
+dispatch:
+	for target, ok := src.next(); ok; target, ok = src.next() {
+		if !hosts.start(target) { continue }
+		memWait(func() int { return len(sem) }, *threads/4)
+		select { case sem <- struct{}{}: case <-top.quit: break dispatch }
+		workerWg.Add(1); go func(t string) {
 			defer workerWg.Done()
-			verifyProtocol(t, time.Duration(*timeout)*time.Second, results)
+			for more := true; more && !top.done(); {
+				r := result{target: t, status: -7}
+				dialTo, skip := hosts.dialTimeout(t, time.Duration(*timeout)*time.Second)
+				if !skip { r = verifyProtocol(t, dialTo, time.Duration(*timeout)*time.Second) }
+				results <- r
+				t, more = hosts.finish(t, r.down, skip)
+			}
 			<-sem
 		}(target)
 	}
-	workerWg.Wait(); close(results); writerWg.Wait()
+	go func() { workerWg.Wait(); close(results) }()
+	writerWg.Wait()
+	closeTrace()
+	hosts.report(*hostStats)
+	top.finish(writer)
+	memReport()
 
 	fmt.Fprintf(os.Stderr, "验证完成！从 %d 个目标中发现 %d 个响应 SOCKS5 协议的服务器。\n", total, validCount)
 	fmt.Fprintf(os.Stderr, "结果已实时保存至: %s\n", *outputFile)
 }
-'''
+''' + go_snippets.GO_HOST_TABLE + go_snippets.GO_TOP_K + go_snippets.GO_SOCKET_PROFILE + go_snippets.GO_TRACE + go_snippets.GO_MEM_BUDGET
 
 # --- GO 语言核心代码 2: SOCKS5 深度连接验证器 (用于公共代理) ---
 GO_SOURCE_CODE_DEEP_VERIFIER = r'''
@@ -119,76 +213,161 @@ package main
 
 import (
 	"bufio"
+	"container/heap"
+	"context"
 	"encoding/binary"
+	"encoding/json"
+	"errors"
 	"flag"
 	"fmt"
+	"math/rand"
 	"net"
 	"os"
+	"runtime/debug"
+	"runtime/metrics"
+	"sort"
+	"strconv"
 	"strings"
 	"sync"
+	"sync/atomic"
+	"syscall"
 	"time"
 )
 
-func verifyProxyConnectivity(target string, timeout time.Duration, results chan<- string) {
-	conn, err := net.DialTimeout("tcp", target, timeout)
-	if err != nil { results <- ""; return }; defer conn.Close()
-	_, err = conn.Write([]byte{0x05, 0x01, 0x00}); if err != nil { results <- ""; return }
-	resp := make([]byte, 2); conn.SetReadDeadline(time.Now().Add(timeout)); n, err := conn.Read(resp)
-	if err != nil || n != 2 || resp[0] != 0x05 || resp[1] != 0x00 { results <- ""; return }
+type result struct {
+	target  string
+	status  int16
+	latency time.Duration
+	down    bool // 建连阶段失败且不是被拒绝 (主机疑似不可达)
+}
+
+// 状态码与 result_log.py 一致: 0 成功, 正数为 SOCKS5 REP, -1 连接失败, -2 超时, -3 握手失败, -7 主机不可达已跳过
+func errStatus(err error) int16 {
+	if localPortErr(err) { return -7 }
+	if ne, ok := err.(net.Error); ok && ne.Timeout() { return -2 }
+	return -1
+}
+
+func packRecord(r result, mode byte) []byte {
+	host, portStr, err := net.SplitHostPort(r.target)
+	if err != nil { return nil }
+	ip := net.ParseIP(host)
+	port, err := strconv.Atoi(portStr)
+	if ip == nil || err != nil { return nil }
+	rec := make([]byte, 32)
+	copy(rec[0:16], ip.To16())
+	binary.LittleEndian.PutUint16(rec[16:18], uint16(port))
+	rec[18] = mode
+	binary.LittleEndian.PutUint16(rec[20:22], uint16(r.status))
+	binary.LittleEndian.PutUint32(rec[22:26], uint32(r.latency/time.Millisecond))
+	binary.LittleEndian.PutUint32(rec[26:30], uint32(time.Now().Unix()))
+	return rec
+}
+
+func verifyProxyConnectivity(target string, dialTimeout, timeout time.Duration) (r result) {
+	start := time.Now()
+	sp := startSpan()
+	defer func() { sp.finish(target, r.status) }()
+	fail := func(status int16) result { return result{target, status, time.Since(start), false} }
+	conn, err := dialTCP(target, dialTimeout)
+	sp.mark(phDial)
+	if err != nil { return result{target, errStatus(err), time.Since(start), hostDown(err)} }
+	defer func() { closeConn(conn, r.status != 0); sp.mark(phClose) }()
+	_, err = conn.Write([]byte{0x05, 0x01, 0x00}); sp.mark(phGreetWrite); if err != nil { return fail(errStatus(err)) }
+	resp := make([]byte, 2); conn.SetReadDeadline(time.Now().Add(timeout)); n, err := conn.Read(resp); sp.mark(phGreetRead)
+	if err != nil { return fail(errStatus(err)) }
+	if n != 2 || resp[0] != 0x05 || resp[1] != 0x00 { return fail(-3) }
 
 	destHost := "example.com"; destPort := 80
 	req := []byte{0x05, 0x01, 0x00, 0x03}; req = append(req, byte(len(destHost))); req = append(req, destHost...)
 	portBytes := make([]byte, 2); binary.BigEndian.PutUint16(portBytes, uint16(destPort)); req = append(req, portBytes...)
-	_, err = conn.Write(req); if err != nil { results <- ""; return }
+	_, err = conn.Write(req); sp.mark(phConnectWrite); if err != nil { return fail(errStatus(err)) }
 
-	reply := make([]byte, 10); conn.SetReadDeadline(time.Now().Add(timeout)); n, err = conn.Read(reply)
-	if err != nil || n < 4 { results <- ""; return }
-	if reply[1] == 0x00 { results <- target } else { results <- "" }
+	reply := make([]byte, 10); conn.SetReadDeadline(time.Now().Add(timeout)); n, err = conn.Read(reply); sp.mark(phConnectRead)
+	if err != nil { return fail(errStatus(err)) }
+	if n < 4 { return fail(-3) }
+	return fail(int16(reply[1]))
 }
 
 func main() {
-	inputFile := flag.String("inputFile", "", ""); outputFile := flag.String("outputFile", "", ""); threads := flag.Int("threads", 100, ""); timeout := flag.Int("timeout", 10, ""); flag.Parse()
+	inputFile := flag.String("inputFile", "", ""); outputFile := flag.String("outputFile", "", ""); threads := flag.Int("threads", 100, ""); timeout := flag.Int("timeout", 10, "")
+	recordFile := flag.String("recordFile", "", "(可选) 追加写入二进制结果记录的文件"); recordMode := flag.Int("recordMode", 2, "结果记录中的模式编号")
+	hostFailLimit, hostFailTimeout, hostInflight, hostTableMax, hostStats := hostFlags()
+	topKN, maxLatency, budget := topKFlags()
+	sockOn, sockBuf, portRange := sockFlags()
+	traceFile, traceRate, traceSlow := traceFlags()
+	memLimit := memFlags()
+	flag.Parse()
+	setupSockProfile(*sockOn, *sockBuf, *portRange)
+	setupTrace(*traceFile, *traceRate, *traceSlow, byte(*recordMode))
+	*threads = setupMemLimit(*memLimit, *threads, 16)
 	if *inputFile == "" || *outputFile == "" { os.Exit(1) }
-	file, _ := os.Open(*inputFile); defer file.Close(); scanner := bufio.NewScanner(file); var targets []string
-	for scanner.Scan() { targets = append(targets, strings.TrimSpace(scanner.Text())) }
-	
-	total := len(targets)
+	src, err := openTargets(*inputFile); if err != nil { fmt.Fprintln(os.Stderr, err); os.Exit(1) }; defer src.close()
+	total := src.total
 	fmt.Fprintf(os.Stderr, "开始对 %d 个代理进行深度连接验证...\n", total)
 
 	outFile, _ := os.Create(*outputFile); defer outFile.Close()
 	writer := bufio.NewWriter(outFile)
 	
-	results := make(chan string, *threads)
+	var recWriter *bufio.Writer
+	if *recordFile != "" {
+		recFile, err := os.OpenFile(*recordFile, os.O_CREATE|os.O_WRONLY|os.O_APPEND, 0644)
+		if err == nil { defer recFile.Close(); recWriter = bufio.NewWriter(recFile) }
+	}
+
+	top := newTopK(*topKN, *maxLatency, *budget)
+	results := make(chan result, *threads)
 	var writerWg sync.WaitGroup
 	var validCount int
 	writerWg.Add(1)
 	go func() {
 		defer writerWg.Done()
-		for r := range results {
-			if r != "" {
+		for {
+			var r result; var ok bool
+			select { case r, ok = <-results: case <-top.quit: }
+			if !ok { break }
+			if recWriter != nil {
+				if rec := packRecord(r, byte(*recordMode)); rec != nil { recWriter.Write(rec) }
+			}
+			if r.status == 0 {
 				validCount++
-				fmt.Println(r)
-				fmt.Fprintln(writer, r)
-				writer.Flush()
+				fmt.Println(r.target)
+				if top.k > 0 { top.offer(r.target, r.latency) } else { fmt.Fprintln(writer, r.target); writer.Flush() }
 			}
 		}
+		if recWriter != nil { recWriter.Flush() }
 	}()
 
+	hosts := newHostTable(targetAddr, *hostFailLimit, *hostInflight, memItems(*hostTableMax, 256), time.Duration(*hostFailTimeout)*time.Millisecond)
 	var workerWg sync.WaitGroup; sem := make(chan struct{}, *threads)
-	for _, target := range targets {
-		if target == "" { continue }
-		workerWg.Add(1); sem <- struct{}{}; go func(t string) {
+dispatch:
+	for target, ok := src.next(); ok; target, ok = src.next() {
+		if !hosts.start(target) { continue }
+		memWait(func() int { return len(sem) }, *threads/4)
+		select { case sem <- struct{}{}: case <-top.quit: break dispatch }
+		workerWg.Add(1); go func(t string) {
 			defer workerWg.Done()
-			verifyProxyConnectivity(t, time.Duration(*timeout)*time.Second, results)
+			for more := true; more && !top.done(); {
+				r := result{target: t, status: -7}
+				dialTo, skip := hosts.dialTimeout(t, time.Duration(*timeout)*time.Second)
+				if !skip { r = verifyProxyConnectivity(t, dialTo, time.Duration(*timeout)*time.Second) }
+				results <- r
+				t, more = hosts.finish(t, r.down, skip)
+			}
 			<-sem
 		}(target)
 	}
-	workerWg.Wait(); close(results); writerWg.Wait()
+	go func() { workerWg.Wait(); close(results) }()
+	writerWg.Wait()
+	closeTrace()
+	hosts.report(*hostStats)
+	top.finish(writer)
+	memReport()
 
 	fmt.Fprintf(os.Stderr, "验证完成！从 %d 个目标中发现 %d 个真正可用的代理。\n", total, validCount)
 	fmt.Fprintf(os.Stderr, "结果已实时保存至: %s\n", *outputFile)
 }
-'''
+''' + go_snippets.GO_HOST_TABLE + go_snippets.GO_TOP_K + go_snippets.GO_SOCKET_PROFILE + go_snippets.GO_TRACE + go_snippets.GO_MEM_BUDGET
 
 # --- GO 语言核心代码 3: 全功能认证扫描器 (用于私有代理) ---
 GO_SOURCE_CODE_SCANNER = r'''
@@ -196,22 +375,44 @@ package main
 
 import (
 	"bufio"
+	"context"
+	"encoding/binary"
+	"errors"
 	"flag"
 	"fmt"
 	"net"
 	"os"
+	"runtime/debug"
+	"runtime/metrics"
+	"strconv"
 	"strings"
 	"sync"
+	"sync/atomic"
+	"syscall"
 	"time"
 )
 
 type Creds struct { Username string; Password string }
 
-func checkProxyAuth(host, port string, creds Creds, timeout time.Duration) bool {
+// 打包一条 32 字节结果记录 (格式见 result_log.py), 目标不是 IP 地址时返回 nil
+func packRecord(host, port string, latency time.Duration) []byte {
+	ip := net.ParseIP(host)
+	portNum, err := strconv.Atoi(port)
+	if ip == nil || err != nil { return nil }
+	rec := make([]byte, 32)
+	copy(rec[0:16], ip.To16())
+	binary.LittleEndian.PutUint16(rec[16:18], uint16(portNum))
+	rec[18] = 3
+	binary.LittleEndian.PutUint32(rec[22:26], uint32(latency/time.Millisecond))
+	binary.LittleEndian.PutUint32(rec[26:30], uint32(time.Now().Unix()))
+	return rec
+}
+
+func checkProxyAuth(host, port string, creds Creds, timeout time.Duration) (ok bool) {
 	target := fmt.Sprintf("%s:%s", host, port)
-	conn, err := net.DialTimeout("tcp", target, timeout)
+	conn, err := dialTCP(target, timeout)
 	if err != nil { return false }
-	defer conn.Close()
+	defer func() { closeConn(conn, !ok) }()
 
 	conn.SetDeadline(time.Now().Add(timeout))
 
@@ -255,7 +456,12 @@ func main() {
 	openFile := flag.String("openFile", "open_proxies.txt", "Output file for proxies with open authentication")
 	threads := flag.Int("threads", 100, "Concurrency threads")
 	timeout := flag.Int("timeout", 5, "Connection timeout (seconds)")
+	recordFile := flag.String("recordFile", "", "(optional) Append binary result records of successful authentications")
+	sockOn, sockBuf, portRange := sockFlags()
+	memLimit := memFlags()
 	flag.Parse()
+	setupSockProfile(*sockOn, *sockBuf, *portRange)
+	*threads = setupMemLimit(*memLimit, *threads, 16)
 
 	credentials := []Creds{{"", ""}} // Always check for NO AUTH
 	if *dictFile != "" {
@@ -273,8 +479,8 @@ func main() {
 		}
 	}
 	
-	proxies, _ := fileToLines(*proxyFile)
-	fmt.Fprintf(os.Stderr, "开始对 %d 个代理使用 %d 组凭证进行认证扫描...\n", len(proxies), len(credentials))
+	src, err := openTargets(*proxyFile); if err != nil { fmt.Fprintln(os.Stderr, err); os.Exit(1) }; defer src.close()
+	fmt.Fprintf(os.Stderr, "开始对 %d 个代理使用 %d 组凭证进行认证扫描...\n", src.total, len(credentials))
 
 	successCounts := make(map[string]int)
 	var mu sync.Mutex
@@ -287,22 +493,31 @@ func main() {
 	openWriter := bufio.NewWriter(openOutFile)
 	defer openWriter.Flush()
 
+	var recWriter *bufio.Writer
+	if *recordFile != "" {
+		recFile, err := os.OpenFile(*recordFile, os.O_CREATE|os.O_WRONLY|os.O_APPEND, 0644)
+		if err == nil { defer recFile.Close(); recWriter = bufio.NewWriter(recFile); defer recWriter.Flush() }
+	}
+
 	var wg sync.WaitGroup
 	sem := make(chan struct{}, *threads)
 
-	for _, proxy := range proxies {
+	for proxy, ok := src.next(); ok; proxy, ok = src.next() {
 		parts := strings.Split(proxy, ":")
 		if len(parts) != 2 { continue }
 		host, port := parts[0], parts[1]
 
 		for _, cred := range credentials {
 			wg.Add(1)
+			memWait(func() int { return len(sem) }, *threads/4)
 			sem <- struct{}{}
 			go func(h, p string, c Creds) {
 				defer wg.Done()
 				defer func() { <-sem }()
 				
+				start := time.Now()
 				if checkProxyAuth(h, p, c, time.Duration(*timeout)*time.Second) {
+					latency := time.Since(start)
 					target := fmt.Sprintf("%s:%s", h, p)
 					successMsg := fmt.Sprintf("[+] 成功: %s - 用户名: '%s' - 密码: '%s'", target, c.Username, c.Password)
 					if c.Username == "" && c.Password == "" {
@@ -314,6 +529,9 @@ func main() {
 					mu.Lock()
 					// Write to main success file
 					fmt.Fprintln(successWriter, successMsg)
+					if recWriter != nil && successCounts[target] == 0 {
+						if rec := packRecord(h, p, latency); rec != nil { recWriter.Write(rec) }
+					}
 					
 					successCounts[target]++
 					if successCounts[target] == 2 { // First time we detect it as open
@@ -328,16 +546,294 @@ func main() {
 		}
 	}
 	wg.Wait()
+	memReport()
 	fmt.Fprintf(os.Stderr, "认证扫描完成。成功结果已保存至 %s, 开放代理已保存至 %s\n", *outputFile, *openFile)
 }
 
-'''
+''' + go_snippets.GO_SOCKET_PROFILE + go_snippets.GO_MEM_BUDGET
+
+# --- GO 语言核心代码 4: 多协议识别器 (单连接优先) ---
+GO_SOURCE_CODE_CLASSIFIER = r'''
+package main
+
+import (
+	"bufio"
+	"bytes"
+	"context"
+	"encoding/binary"
+	"errors"
+	"flag"
+	"fmt"
+	"io"
+	"io/ioutil"
+	"net"
+	"net/http"
+	"os"
+	"runtime/debug"
+	"runtime/metrics"
+	"strconv"
+	"strings"
+	"sync"
+	"sync/atomic"
+	"syscall"
+	"time"
+)
+
+// 协议编号与 result_log.py 的 PROTOCOLS 一致
+const (
+	protoUnknown = iota
+	protoSocks5
+	protoSocks5Auth
+	protoSocks4
+	protoHTTPConnect
+	protoHTTPForward
+	protoHTTPServer
+	protoHTTPAuth
+)
+
+var protoNames = []string{"unknown", "socks5", "socks5-auth", "socks4", "http-connect", "http-forward", "http-server", "http-auth"}
+
+const probeHost = "example.com"
+
+type result struct {
+	target  string
+	proto   int
+	status  int16
+	dials   int
+	silent  bool // 首次 SOCKS5 握手在嗅探窗口内无任何响应
+	closed  bool // 首次 SOCKS5 握手被对方直接关闭 (常见于只支持 SOCKS4 的服务)
+	latency time.Duration
+}
+
+type prober struct {
+	timeout time.Duration
+	sniff   time.Duration
+}
+
+func errStatus(err error) int16 {
+	if localPortErr(err) { return -7 }
+	if ne, ok := err.(net.Error); ok && ne.Timeout() { return -2 }
+	return -1
+}
+
+func (p *prober) dial(target string, r *result) (net.Conn, bool) {
+	conn, err := dialTCP(target, p.timeout)
+	r.dials++
+	if err != nil { r.status = errStatus(err); return nil, false }
+	return conn, true
+}
+
+// SOCKS5 握手 (同时提供无认证与用户名密码两种方式)。SOCKS4 服务常以 0x00 0x5B 回应 v5 问候,
+// 因此同一次交互也能识别 SOCKS4; 返回 true 表示已得出结论。
+func (p *prober) trySocks5(target string, r *result, wait time.Duration) bool {
+	conn, ok := p.dial(target, r)
+	if !ok { return true }
+	defer func() { closeConn(conn, r.proto == protoUnknown) }()
+	conn.SetDeadline(time.Now().Add(wait))
+	if _, err := conn.Write([]byte{0x05, 0x02, 0x00, 0x02}); err != nil { return false }
+	buf := make([]byte, 16)
+	n, err := io.ReadAtLeast(conn, buf, 2)
+	switch {
+	case n >= 2 && buf[0] == 0x05:
+		if buf[1] == 0x00 { r.proto = protoSocks5 } else { r.proto = protoSocks5Auth }
+		return true
+	case n >= 2 && buf[0] == 0x00 && buf[1] >= 0x5A && buf[1] <= 0x5D:
+		r.proto = protoSocks4
+		return true
+	}
+	if n == 0 {
+		if ne, ok := err.(net.Error); ok && ne.Timeout() { r.silent = true } else if err != nil { r.closed = true }
+	}
+	return false
+}
+
+func (p *prober) trySocks4(target string, r *result) bool {
+	conn, ok := p.dial(target, r)
+	if !ok { return true }
+	defer func() { closeConn(conn, r.proto == protoUnknown) }()
+	conn.SetDeadline(time.Now().Add(p.timeout))
+	req := []byte{0x04, 0x01, 0x00, 0x50, 0x00, 0x00, 0x00, 0x01, 0x00}
+	req = append(append(req, probeHost...), 0x00)
+	if _, err := conn.Write(req); err != nil { return false }
+	buf := make([]byte, 8)
+	n, _ := io.ReadAtLeast(conn, buf, 2)
+	if n >= 2 && buf[0] == 0x00 && buf[1] >= 0x5A && buf[1] <= 0x5D { r.proto = protoSocks4; return true }
+	return false
+}
+
+// 先发 CONNECT; 被拒绝时在同一连接 (对方要求关闭时才重连) 上发送绝对 URI 的 GET 区分转发代理与普通 Web 服务器。
+// 任一请求得到 407 或 Proxy-Authenticate 头即为需要认证的 HTTP 代理 (与 socks5-auth 一样计为发现)
+func (p *prober) tryHTTP(target string, r *result) bool {
+	conn, ok := p.dial(target, r)
+	if !ok { return true }
+	defer func() { if conn != nil { closeConn(conn, r.proto == protoUnknown) } }()
+	conn.SetDeadline(time.Now().Add(p.timeout))
+	fmt.Fprintf(conn, "CONNECT %s:80 HTTP/1.1\r\nHost: %s:80\r\n\r\n", probeHost, probeHost)
+	br := bufio.NewReader(conn)
+	resp, err := http.ReadResponse(br, &http.Request{Method: "CONNECT"})
+	if err != nil { return false }
+	// 真正的隧道应答不带消息体; 对任意请求都回 200 页面的 Web 服务器不算
+	h := resp.Header
+	if isProxyAuth(resp) { r.proto = protoHTTPAuth; return true }
+	if resp.StatusCode == 200 && h.Get("Content-Length") == "" && h.Get("Transfer-Encoding") == "" && !strings.EqualFold(h.Get("Connection"), "close") {
+		r.proto = protoHTTPConnect; return true
+	}
+	io.Copy(ioutil.Discard, io.LimitReader(resp.Body, 64<<10)); resp.Body.Close()
+	if resp.Close || resp.StatusCode == 200 {
+		conn.Close(); conn = nil
+		// 重连失败时不能覆盖 conn (延迟关闭会对 nil 连接调用 Close)
+		redial, ok := p.dial(target, r)
+		if !ok { r.status = 0; r.proto = protoHTTPServer; return true }
+		conn = redial
+		conn.SetDeadline(time.Now().Add(p.timeout))
+		br = bufio.NewReader(conn)
+	}
+	fmt.Fprintf(conn, "GET http://%s/ HTTP/1.1\r\nHost: %s\r\nConnection: close\r\n\r\n", probeHost, probeHost)
+	resp, err = http.ReadResponse(br, nil)
+	r.proto = protoHTTPServer
+	if err != nil { return true }
+	body, _ := ioutil.ReadAll(io.LimitReader(resp.Body, 64<<10)); resp.Body.Close()
+	if isProxyAuth(resp) { r.proto = protoHTTPAuth }
+	if resp.StatusCode == 200 && bytes.Contains(body, []byte("Example Domain")) { r.proto = protoHTTPForward }
+	return true
+}
+
+func isProxyAuth(resp *http.Response) bool {
+	return resp.StatusCode == http.StatusProxyAuthRequired || resp.Header.Get("Proxy-Authenticate") != ""
+}
+
+func (p *prober) classify(target string, httpFirst bool) result {
+	r := result{target: target}
+	start := time.Now()
+	defer func() { r.latency = time.Since(start) }()
+	if httpFirst {
+		if p.tryHTTP(target, &r) || p.trySocks5(target, &r, p.timeout) || p.trySocks4(target, &r) {}
+	} else if !p.trySocks5(target, &r, p.sniff) {
+		// 被直接关闭时更可能是 SOCKS4, 沉默或返回 HTTP 错误页时更可能是 HTTP 代理
+		var done bool
+		if r.closed { done = p.trySocks4(target, &r) || p.tryHTTP(target, &r) } else { done = p.tryHTTP(target, &r) || p.trySocks4(target, &r) }
+		if !done && r.silent && p.sniff < p.timeout {
+			// 首次握手只是慢于嗅探窗口: 以完整超时再试一次 SOCKS5
+			p.trySocks5(target, &r, p.timeout)
+		}
+	}
+	switch {
+	case r.status != 0 && r.dials == 1:
+	case r.proto == protoHTTPServer: r.status = -5
+	case r.proto == protoUnknown: r.status = -3
+	default: r.status = 0
+	}
+	return r
+}
+
+func packRecord(r result, mode byte) []byte {
+	host, portStr, err := net.SplitHostPort(r.target)
+	if err != nil { return nil }
+	ip := net.ParseIP(host)
+	port, err := strconv.Atoi(portStr)
+	if ip == nil || err != nil { return nil }
+	rec := make([]byte, 32)
+	copy(rec[0:16], ip.To16())
+	binary.LittleEndian.PutUint16(rec[16:18], uint16(port))
+	rec[18] = mode
+	rec[19] = byte(r.proto)
+	binary.LittleEndian.PutUint16(rec[20:22], uint16(r.status))
+	binary.LittleEndian.PutUint32(rec[22:26], uint32(r.latency/time.Millisecond))
+	binary.LittleEndian.PutUint32(rec[26:30], uint32(time.Now().Unix()))
+	return rec
+}
+
+func main() {
+	inputFile := flag.String("inputFile", "", "输入的原始目标文件")
+	outputFile := flag.String("outputFile", "", "输出识别结果 (目标\t协议\t连接次数\t耗时ms)")
+	threads := flag.Int("threads", 300, "并发线程数")
+	timeout := flag.Int("timeout", 8, "连接/读取超时 (秒)")
+	sniff := flag.Int("sniff", 1500, "首次 SOCKS5 握手的等待窗口 (毫秒)")
+	httpFirst := flag.Bool("httpFirst", false, "先按 HTTP 代理探测 (目标以 HTTP 代理为主时可减少重连)")
+	recordFile := flag.String("recordFile", "", "(可选) 追加写入二进制结果记录的文件")
+	recordMode := flag.Int("recordMode", 6, "结果记录中的模式编号")
+	sockOn, sockBuf, portRange := sockFlags()
+	memLimit := memFlags()
+	flag.Parse()
+	setupSockProfile(*sockOn, *sockBuf, *portRange)
+	*threads = setupMemLimit(*memLimit, *threads, 32)
+
+	if *inputFile == "" || *outputFile == "" { os.Exit(1) }
+	src, err := openTargets(*inputFile); if err != nil { fmt.Fprintln(os.Stderr, err); os.Exit(1) }; defer src.close()
+	total := src.total
+	fmt.Fprintf(os.Stderr, "开始对 %d 个目标进行多协议识别...\n", total)
+
+	outFile, _ := os.Create(*outputFile); defer outFile.Close()
+	writer := bufio.NewWriter(outFile)
+	var recWriter *bufio.Writer
+	if *recordFile != "" {
+		recFile, err := os.OpenFile(*recordFile, os.O_CREATE|os.O_WRONLY|os.O_APPEND, 0644)
+		if err == nil { defer recFile.Close(); recWriter = bufio.NewWriter(recFile) }
+	}
+
+	p := &prober{timeout: time.Duration(*timeout) * time.Second, sniff: time.Duration(*sniff) * time.Millisecond}
+	if p.sniff <= 0 || p.sniff > p.timeout { p.sniff = p.timeout }
+	results := make(chan result, *threads)
+	counts := make([]int, len(protoNames))
+	var totalDials, dead int
+	var writerWg sync.WaitGroup
+	writerWg.Add(1)
+	go func() {
+		defer writerWg.Done()
+		for r := range results {
+			totalDials += r.dials
+			if recWriter != nil {
+				if rec := packRecord(r, byte(*recordMode)); rec != nil { recWriter.Write(rec) }
+			}
+			if r.status == -1 || r.status == -2 { dead++; continue }
+			counts[r.proto]++
+			line := fmt.Sprintf("%s\t%s\t%d\t%d", r.target, protoNames[r.proto], r.dials, r.latency/time.Millisecond)
+			fmt.Println(line)
+			fmt.Fprintln(writer, line)
+		}
+		writer.Flush()
+		if recWriter != nil { recWriter.Flush() }
+	}()
+
+	var workerWg sync.WaitGroup; sem := make(chan struct{}, *threads)
+	for target, ok := src.next(); ok; target, ok = src.next() {
+		memWait(func() int { return len(sem) }, *threads/4)
+		workerWg.Add(1); sem <- struct{}{}
+		go func(t string) {
+			defer workerWg.Done()
+			results <- p.classify(t, *httpFirst)
+			<-sem
+		}(target)
+	}
+	workerWg.Wait(); close(results); writerWg.Wait()
+	memReport()
+
+	fmt.Fprintf(os.Stderr, "识别完成！%d 个目标共建立 %d 次连接 (平均 %.2f 次/目标), 无法连接 %d 个。\n",
+		total, totalDials, float64(totalDials)/float64(max(total, 1)), dead)
+	for i, name := range protoNames { if counts[i] > 0 { fmt.Fprintf(os.Stderr, "  %-13s %d\n", name, counts[i]) } }
+	fmt.Fprintf(os.Stderr, "结果已保存至: %s\n", *outputFile)
+}
+
+func max(a, b int) int { if a > b { return a }; return b }
+''' + go_snippets.GO_SOCKET_PROFILE + go_snippets.GO_MEM_BUDGET
 
 # --- Python 包装器 ---
 
-COMPILED_BINARIES = {}
-CACHE_DIR = ".socks5_toolkit_cache"
+BUILD_CACHE = go_build.BuildCache()
+for _name, _code in {
+    "protocol_verifier": GO_SOURCE_CODE_PROTOCOL_VERIFIER,
+    "deep_verifier": GO_SOURCE_CODE_DEEP_VERIFIER,
+    "scanner": GO_SOURCE_CODE_SCANNER,
+    "classifier": GO_SOURCE_CODE_CLASSIFIER,
+}.items():
+    BUILD_CACHE.register(_name, _code)
+
+# 没有 Go 环境时这些引擎改用纯 Python 异步引擎 (async_verifier.py), 参数与输入输出相同
+PY_ENGINES = {"protocol_verifier": "protocol", "deep_verifier": "deep", "http_verifier": "http"}
+ENGINE_PREFERENCE = "auto"   # auto / go / python, 由 --engine 设置
+MEMORY_LIMIT_MB = None       # 内存预算 (MB), 由 --memory-limit 设置, 以 -memLimit 传给引擎
 CONFIG_FILE = "config.json"
+RESULT_LOG_FILE = result_log.DEFAULT_LOG_PATH
 
 # --- 配置管理 ---
 def load_config():
@@ -362,6 +858,8 @@ def handle_config_menu(config):
         print(f"  [2] Chat ID:           {config.get('chat_id') or '未设置'}")
         print(f"  [3] 自定义标识名:    {config.get('custom_id_key') or 'VPS'}")
         print(f"  [4] 自定义标识值:    {config.get('custom_id_value') or '未设置'}")
+        print(f"  [5] 高频建连套接字配置: {'开启' if config.get('socket_profile') else '关闭'}"
+              f"{' (端口 ' + config['port_range'] + ')' if config.get('socket_profile') and config.get('port_range') else ''}")
         print("\n  [b] 返回主菜单")
         
         choice = input("\n请选择要修改的项: ").lower()
@@ -373,6 +871,13 @@ def handle_config_menu(config):
             config['custom_id_key'] = input(f"请输入新的标识名 (当前: {config.get('custom_id_key', 'VPS')}): ")
         elif choice == '4':
             config['custom_id_value'] = input(f"请输入新的标识值 (当前: {config.get('custom_id_value')}): ")
+        elif choice == '5':
+            config['socket_profile'] = not config.get('socket_profile')
+            if config['socket_profile']:
+                port_range = input("绑定的本地端口范围 (如 20000-60000, 留空使用系统范围): ").strip()
+                if port_range and not net_limits.parse_port_range(port_range):
+                    print("端口范围格式无效, 使用系统范围。"); port_range = ""
+                config['port_range'] = port_range
         elif choice == 'b':
             break
         else:
@@ -394,131 +899,105 @@ def get_validated_input(prompt, validation_func=lambda x: True, error_message="
 def validate_file_exists(path): return os.path.exists(path)
 def validate_positive_integer(num_str): return num_str.isdigit() and int(num_str) > 0
 
-def get_go_executable_path():
-    go_exec = shutil.which("go")
-    if go_exec: return go_exec
-    common_paths = ["/usr/local/go/bin/go", "/usr/bin/go", "C:\\Go\\bin\\go.exe"]
-    for path in common_paths:
-        if os.path.exists(path): return path
-    return None
-
-def compile_go_binaries():
-    global COMPILED_BINARIES
-    go_executable = get_go_executable_path()
-    if not go_executable:
-        print("\n错误: 未找到 'go' 命令。请确保 Go 环境已正确安装并配置在系统 PATH 中。")
-        return False
-
-    os.makedirs(CACHE_DIR, exist_ok=True); print("正在检查Go核心程序...")
-    sources = {
-        "protocol_verifier": GO_SOURCE_CODE_PROTOCOL_VERIFIER,
-        "deep_verifier": GO_SOURCE_CODE_DEEP_VERIFIER,
-        "scanner": GO_SOURCE_CODE_SCANNER,
-    }
-    try:
-        with tempfile.TemporaryDirectory() as temp_dir:
-            for name, code in sources.items():
-                current_hash = hashlib.sha256(code.encode('utf-8')).hexdigest()
-                exe_name = f"{name}.exe" if sys.platform == "win32" else name
-                output_path = os.path.join(CACHE_DIR, exe_name)
-                hash_path = os.path.join(CACHE_DIR, f"{name}.hash")
-                recompile = True
-                if os.path.exists(output_path) and os.path.exists(hash_path):
-                    with open(hash_path, 'r') as f: stored_hash = f.read()
-                    if stored_hash == current_hash: recompile = False
-                if recompile:
-                    print(f"  - 正在编译 '{name}'...")
-                    source_path = os.path.join(temp_dir, f"{name}.go")
-                    with open(source_path, "w", encoding="utf-8") as f: f.write(code)
-                    cmd = [go_executable, "build", "-o", output_path, source_path]
-                    
-                    build_env = os.environ.copy()
-                    if "HOME" not in build_env and "USERPROFILE" not in build_env:
-                        go_cache_path = os.path.join(temp_dir, "gocache_for_build")
-                        os.makedirs(go_cache_path, exist_ok=True)
-                        build_env["GOCACHE"] = go_cache_path
-                        print(f"  - 提示: 未找到HOME/USERPROFILE，已临时设置GOCACHE: {go_cache_path}")
-                    
-                    result = subprocess.run(cmd, capture_output=True, text=True, env=build_env)
-                    if result.returncode != 0:
-                         print(f"\nGo程序编译失败: {name}\n{result.stderr}")
-                         return False
-
-                    with open(hash_path, 'w') as f: f.write(current_hash)
-                    print(f"  - '{name}' 编译完成。")
-                else:
-                    print(f"  - 使用缓存的 '{name}'。")
-                COMPILED_BINARIES[name] = output_path
-        print("Go核心程序准备就绪。"); return True
-    except Exception as e: print(f"\n发生未知错误: {e}"); return False
+def use_python_engine(name):
+    """auto 时只有找不到 Go 且没有已编译的二进制才改用 Python 引擎。"""
+    if name not in PY_ENGINES or ENGINE_PREFERENCE == "go": return False
+    if ENGINE_PREFERENCE == "python": return True
+    return not (BUILD_CACHE.lookup(name) or BUILD_CACHE.go or go_build.find_go())
+
+def engine_command(name):
+    """返回运行引擎的命令前缀, 需要时编译; 失败抛出 go_build.BuildError。"""
+    if use_python_engine(name):
+        return [sys.executable, async_verifier.__file__, "-mode", PY_ENGINES[name]]
+    return [BUILD_CACHE.get(name)]
+
+def prepare_engines(names=None):
+    """并行准备需要的Go核心程序 (内容寻址缓存, 命中时不编译), 全部就绪返回 True。"""
+    names = list(names or BUILD_CACHE.names())
+    fallback = [name for name in names if use_python_engine(name)]
+    if fallback: print(f"{', '.join(fallback)} 使用 Python 异步引擎 (async_verifier.py)。")
+    names = [name for name in names if name not in fallback]
+    if not names: return True
+    print("正在检查Go核心程序...")
+    if not BUILD_CACHE.ensure(names): return False
+    print("Go核心程序准备就绪。"); return True
 
 
 # ... (脚本的其他部分保持不变) ...
 
-def run_go_executable(executable_name, args_list, pbar_desc="已找到"):
-    executable_path = COMPILED_BINARIES.get(executable_name)
-    if not executable_path:
-        print(f"错误: 未找到 '{executable_name}' 程序。")
-        return
+# 引擎无法准备、启动或非零退出
+ENGINE_ERRORS = (subprocess.CalledProcessError, go_build.BuildError, OSError)
 
-    try:
-        cmd = [executable_path] + args_list
-        print("\n--- 正在执行 Go 高性能核心 (健壮模式) ---")
-        process = subprocess.Popen(
-            cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-            text=True, encoding='utf-8', errors='replace'
-        )
+def run_go_executable(executable_name, args_list, pbar_desc="已找到"):
+    """运行引擎并实时显示输出, 返回子进程峰值 RSS (MB, 平台不支持时为 None)。
+
+    引擎无法准备或启动时抛出 go_build.BuildError / OSError, 非零退出时抛出 subprocess.CalledProcessError。
+    """
+    if MEMORY_LIMIT_MB and "-memLimit" not in args_list:
+        args_list = list(args_list) + ["-memLimit", str(MEMORY_LIMIT_MB)]
+    cmd = engine_command(executable_name) + args_list
+
+    engine_desc = "Python 异步引擎" if use_python_engine(executable_name) else "Go 高性能核心"
+    print(f"\n--- 正在执行 {engine_desc} (健壮模式) ---")
+    process = subprocess.Popen(
+        cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        text=True, encoding='utf-8', errors='replace'
+    )
+    rss_sampler = net_limits.RSSSampler(process.pid)
+
+    # 为 stdout 和 stderr 创建独立的读取线程，防止死锁
+    def reader_thread(pipe, output_list, pbar=None):
+        try:
+            for line in iter(pipe.readline, ''):
+                if line:
+                    output_list.append(line)
+                    if pbar is not None:
+                        # 只有主输出才更新进度条
+                        pbar.update(1)
+                    else:
+                        # 错误流直接打印
+                        print(line.strip(), file=sys.stderr)
+        finally:
+            pipe.close()
+    
+    stdout_output = []
+    stderr_output = []
 
-        # 为 stdout 和 stderr 创建独立的读取线程，防止死锁
-        def reader_thread(pipe, output_list, pbar=None):
+    if executable_name != "scanner":
+        with tqdm(desc=pbar_desc, unit=" 个", dynamic_ncols=True) as pbar:
+            stdout_thread = threading.Thread(target=reader_thread, args=(process.stdout, stdout_output, pbar))
+            stderr_thread = threading.Thread(target=reader_thread, args=(process.stderr, stderr_output, None))
+            
+            stdout_thread.start()
+            stderr_thread.start()
+            
+            stdout_thread.join() # 等待线程结束
+            stderr_thread.join()
+    else: # 认证扫描器模式，直接打印
+        def print_pipe(pipe):
             try:
                 for line in iter(pipe.readline, ''):
-                    if line:
-                        output_list.append(line)
-                        if pbar:
-                            # 只有主输出才更新进度条
-                            pbar.update(1)
-                        else:
-                            # 错误流直接打印
-                            print(line.strip(), file=sys.stderr)
+                    print(line.strip())
             finally:
                 pipe.close()
-        
-        stdout_output = []
-        stderr_output = []
-
-        if "verifier" in executable_name:
-            with tqdm(desc=pbar_desc, unit=" 个", dynamic_ncols=True) as pbar:
-                stdout_thread = threading.Thread(target=reader_thread, args=(process.stdout, stdout_output, pbar))
-                stderr_thread = threading.Thread(target=reader_thread, args=(process.stderr, stderr_output, None))
-                
-                stdout_thread.start()
-                stderr_thread.start()
-                
-                stdout_thread.join() # 等待线程结束
-                stderr_thread.join()
-        else: # 认证扫描器模式，直接打印
-            def print_pipe(pipe):
-                try:
-                    for line in iter(pipe.readline, ''):
-                        print(line.strip())
-                finally:
-                    pipe.close()
-
-            stdout_thread = threading.Thread(target=print_pipe, args=(process.stdout,))
-            stderr_thread = threading.Thread(target=print_pipe, args=(process.stderr,))
-            stdout_thread.start()
-            stderr_thread.start()
-            stdout_thread.join()
-            stderr_thread.join()
 
-        process.wait() # 确保子进程完全退出
+        stdout_thread = threading.Thread(target=print_pipe, args=(process.stdout,))
+        stderr_thread = threading.Thread(target=print_pipe, args=(process.stderr,))
+        stdout_thread.start()
+        stderr_thread.start()
+        stdout_thread.join()
+        stderr_thread.join()
 
-        if "verifier" in executable_name:
-            print("\n--- 任务执行完毕 ---")
-            
-    except Exception as e:
-        print(f"执行Go程序时出错: {e}")
+    peak_rss = net_limits.wait_peak_rss(process, rss_sampler) # 确保子进程完全退出
+    if process.returncode:
+        print(f"错误: 引擎 '{executable_name}' 异常退出 (退出码 {process.returncode})。")
+        raise subprocess.CalledProcessError(process.returncode, cmd)
+
+    if executable_name != "scanner":
+        print("\n--- 任务执行完毕 ---")
+    if peak_rss is not None:
+        print(f"引擎峰值内存 (RSS): {peak_rss:.1f} MB")
+    return peak_rss
 
 
 def create_dict_from_user_pass_files(temp_dir):
@@ -596,38 +1075,122 @@ def handle_auth_scan(output_dir):
         threads = get_validated_input("并发数 (默认100): ", lambda x: x=="" or validate_positive_integer(x), "") or "100"
         timeout = get_validated_input("超时(秒, 默认5): ", lambda x: x=="" or validate_positive_integer(x), "") or "5"
         
-        base, ext = os.path.splitext(os.path.basename(proxy_file))
-        success_output_file = os.path.join(output_dir, f"{base}_auth_success.txt")
-        open_proxy_output_file = os.path.join(output_dir, f"{base}_open_proxies.txt")
-
         print("\n扫描结果将实时打印在控制台。")
-        print(f"所有成功认证的结果将保存到: {success_output_file}")
-        print(f"检测到的开放代理将保存到: {open_proxy_output_file}")
-        
-        cmd_args = [
-            "-proxyFile", proxy_file,
-            "-threads", threads,
-            "-timeout", timeout,
-            "-dictFile", dict_file_path,
-            "-outputFile", success_output_file,
-            "-openFile", open_proxy_output_file
-        ]
-        
-        run_go_executable("scanner", cmd_args)
+        try:
+            run_auth_scan(proxy_file, dict_file_path, threads, timeout, output_dir)
+        except ENGINE_ERRORS as e:
+            print(f"认证扫描失败: {e}")
         
     finally:
         shutil.rmtree(temp_dir_for_dict) # 清理临时目录和里面的文件
 
+def run_auth_scan(proxy_file, dict_file_path, threads, timeout, output_dir, extra_args=()):
+    """执行认证扫描, 返回 (成功结果文件路径, 引擎峰值 RSS MB)。"""
+    base, ext = os.path.splitext(os.path.basename(proxy_file))
+    success_output_file = os.path.join(output_dir, f"{base}_auth_success.txt")
+    open_proxy_output_file = os.path.join(output_dir, f"{base}_open_proxies.txt")
+    print(f"所有成功认证的结果将保存到: {success_output_file}")
+    print(f"检测到的开放代理将保存到: {open_proxy_output_file}")
+
+    record_file = success_output_file + ".records"
+    threads = net_limits.check(threads, port_range=net_limits.port_range_from_args(extra_args))
+    cmd_args = [
+        "-proxyFile", proxy_file,
+        "-threads", str(threads),
+        "-timeout", str(timeout),
+        "-dictFile", dict_file_path,
+        "-outputFile", success_output_file,
+        "-openFile", open_proxy_output_file,
+        "-recordFile", record_file
+    ] + list(extra_args)
+    
+    try:
+        peak_rss = run_go_executable("scanner", cmd_args)
+    finally:
+        merge_records(record_file)  # 异常退出时也保留已写出的记录
+    return success_output_file, peak_rss
+
 # --- 其他任务与主菜单 ---
+def merge_records(record_file):
+    """把 Go 核心程序写出的裸记录并入全局结果日志。"""
+    try:
+        with result_log.ResultLog(RESULT_LOG_FILE) as log:
+            added = log.append_raw(record_file)
+        if added: print(f"已将 {added} 条记录写入结果日志: {RESULT_LOG_FILE}")
+    except (OSError, ValueError) as e: print(f"写入结果日志失败: {e}")
+
 def format_duration(seconds):
     secs = int(seconds)
     mins, secs = divmod(secs, 60)
     return f"{mins} 分 {secs} 秒"
 
-def send_telegram_notification(config, file_path, total_targets, duration_seconds):
+TELEGRAM_API_BASE = "https://api.telegram.org"
+TELEGRAM_PART_SIZE = 45 * 1024 * 1024        # Bot API 文档上限为 50MB, 留出余量
+TELEGRAM_COMPRESS_THRESHOLD = 1024 * 1024    # 超过此大小的结果先 gzip 压缩再发送
+UPLOAD_CHUNK_SIZE = 256 * 1024
+GZIP_PENDING_MARGIN = 64 * 1024              # zlib 尚未落盘的压缩数据余量
+
+class MultipartStream:
+    """流式 multipart/form-data 请求体: 按块读取文件, 不把整个文件读入内存。"""
+    def __init__(self, fields, file_field, filename, file_path):
+        self.boundary = f"----socks5toolkit{os.urandom(12).hex()}"
+        head = b"".join(
+            f'--{self.boundary}\r\nContent-Disposition: form-data; name="{k}"\r\n\r\n{v}\r\n'.encode("utf-8")
+            for k, v in fields.items()
+        )
+        head += (f'--{self.boundary}\r\nContent-Disposition: form-data; name="{file_field}"; filename="{filename}"\r\n'
+                 f'Content-Type: application/octet-stream\r\n\r\n').encode("utf-8")
+        tail = f"\r\n--{self.boundary}--\r\n".encode("utf-8")
+        self._parts = [head, file_path, tail]
+        self._length = len(head) + os.path.getsize(file_path) + len(tail)
+        self._current = None
+
+    @property
+    def content_type(self):
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def __len__(self):
+        return self._length
+
+    def read(self, size=UPLOAD_CHUNK_SIZE):
+        if size is None or size < 0: size = UPLOAD_CHUNK_SIZE
+        while self._parts or self._current:
+            if self._current is None:
+                part = self._parts.pop(0)
+                if isinstance(part, bytes): return part
+                self._current = open(part, "rb")
+            chunk = self._current.read(size)
+            if chunk: return chunk
+            self._current.close(); self._current = None
+        return b""
+
+def split_gzip_parts(file_path, out_dir, part_size=TELEGRAM_PART_SIZE):
+    """把结果文件按行压缩为若干独立的 .gz 分卷 (每卷可单独解压), 返回分卷路径列表。"""
+    base = os.path.basename(file_path)
+    parts, raw, gz = [], None, None
+    with open(file_path, "rb") as f_in:
+        for line in f_in:
+            if gz is None:
+                path = os.path.join(out_dir, f"{base}.part{len(parts) + 1:03d}.gz")
+                raw = open(path, "wb"); gz = gzip.GzipFile(filename=base, mode="wb", fileobj=raw)
+                parts.append(path)
+            gz.write(line)
+            if raw.tell() >= part_size - GZIP_PENDING_MARGIN:
+                gz.close(); raw.close(); gz = None
+    if gz is not None:
+        gz.close(); raw.close()
+    return parts
+
+def upload_telegram_document(config, file_path, filename, caption):
     token = config.get("bot_token")
-    chat_id = config.get("chat_id")
-    
+    url = f"{config.get('telegram_api_base') or TELEGRAM_API_BASE}/bot{token}/sendDocument"
+    body = MultipartStream({'chat_id': config.get("chat_id"), 'caption': caption}, 'document', filename, file_path)
+    response = requests.post(url, data=body, headers={'Content-Type': body.content_type}, timeout=(10, 300))
+    response.raise_for_status()
+    result = response.json()
+    if not result.get("ok"): raise RuntimeError(result.get('description', '未知错误'))
+
+def send_telegram_notification(config, file_path, total_targets, duration_seconds):
     timestamp = datetime.now().strftime("%Y%m%d-%H%M")
     new_filename = f"Socks5-{os.path.basename(file_path)}-{timestamp}.txt"
     
@@ -641,20 +1204,53 @@ def send_telegram_notification(config, file_path, total_targets, duration_second
         f"任务结果: {new_filename}"
     )
     
-    url = f"https://api.telegram.org/bot{token}/sendDocument"
+    work_dir = tempfile.mkdtemp(prefix="tg_delivery_")
     try:
         print("正在发送文件到 Telegram...")
-        with open(file_path, 'rb') as f:
-            files = {'document': (new_filename, f)}
-            data = {'chat_id': chat_id, 'caption': caption}
-            response = requests.post(url, files=files, data=data, timeout=60)
-        
-        response.raise_for_status()
-        result = response.json()
-        if result.get("ok"): print("文件发送成功！")
-        else: print(f"发送失败: {result.get('description', '未知错误')}")
+        if os.path.getsize(file_path) <= TELEGRAM_COMPRESS_THRESHOLD:
+            uploads = [(file_path, new_filename, caption)]
+        else:
+            parts = split_gzip_parts(file_path, work_dir, config.get("telegram_part_size") or TELEGRAM_PART_SIZE)
+            uploads = [(part, f"{new_filename}.part{i:03d}.gz", f"{caption}\n分卷: {i}/{len(parts)} (gzip)")
+                       for i, part in enumerate(parts, 1)]
+        for path, filename, part_caption in uploads:
+            upload_telegram_document(config, path, filename, part_caption)
+        print(f"文件发送成功！({new_filename}, 共 {len(uploads)} 个文件)")
     except requests.exceptions.RequestException as e: print(f"发送时发生网络错误: {e}")
-    except Exception as e: print(f"发生未知错误: {e}")
+    except Exception as e: print(f"发送失败: {e}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+class DeliveryQueue:
+    """后台发送队列: 提交时先快照结果文件, 压缩与上传都在后台线程完成, 不阻塞菜单。"""
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = None
+
+    def submit(self, config, file_path, total_targets, duration_seconds):
+        snapshot_dir = tempfile.mkdtemp(prefix="tg_snapshot_")
+        snapshot = os.path.join(snapshot_dir, os.path.basename(file_path))
+        shutil.copyfile(file_path, snapshot)
+        self._queue.put((dict(config), snapshot, total_targets, duration_seconds))
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._worker, daemon=True)
+            self._thread.start()
+        print("已加入后台发送队列, 可以继续下一个任务。")
+
+    def _worker(self):
+        while True:
+            config, snapshot, total_targets, duration_seconds = self._queue.get()
+            try: send_telegram_notification(config, snapshot, total_targets, duration_seconds)
+            finally:
+                shutil.rmtree(os.path.dirname(snapshot), ignore_errors=True)
+                self._queue.task_done()
+
+    def wait(self):
+        if self._queue.unfinished_tasks:
+            print("正在等待后台 Telegram 发送完成...")
+            self._queue.join()
+
+DELIVERY = DeliveryQueue()
 
 def prompt_and_send_telegram(config, file_path, total_targets, duration_seconds):
     if not os.path.exists(file_path) or os.path.getsize(file_path) == 0:
@@ -667,22 +1263,51 @@ def prompt_and_send_telegram(config, file_path, total_targets, duration_seconds)
 
     choice = input(f"\n是否将结果文件 '{os.path.basename(file_path)}' 发送到 Telegram? (y/n): ").lower()
     if choice == 'y':
-        send_telegram_notification(config, file_path, total_targets, duration_seconds)
+        DELIVERY.submit(config, file_path, total_targets, duration_seconds)
+
+SCAN_TASKS = {
+    "protocol": {
+        "header": "验证Socks5协议 (快速)", "desc": "此模式只检查目标是否响应SOCKS5握手，不测试其可用性。",
+        "threads_prompt": "并发数 (默认500): ", "threads_default": "500", "timeout_prompt": "超时(秒, 推荐5): ", "timeout_default": "5",
+        "output_suffix": "_protocol_verified", "engine": "protocol_verifier"
+    },
+    "deep": {
+        "header": "扫描公共代理 (无认证)", "desc": "此功能将深度验证代理，确保其不仅是SOCKS5服务，还能实际连接到目标网站。",
+        "threads_prompt": "并发数 (默认200): ", "threads_default": "200", "timeout_prompt": "超时(秒, 推荐10): ", "timeout_default": "10",
+        "output_suffix": "_deep_verified", "engine": "deep_verifier"
+    },
+    "classify": {
+        "header": "多协议识别 (单连接优先)", "desc": "每个目标优先只建立一次连接, 识别 SOCKS5 / SOCKS4 / HTTP CONNECT / HTTP 转发代理, 仅在协议需要时重连。",
+        "threads_prompt": "并发数 (默认300): ", "threads_default": "300", "timeout_prompt": "超时(秒, 推荐8): ", "timeout_default": "8",
+        "output_suffix": "_classified", "engine": "classifier"
+    }
+}
+
+def default_output_path(output_dir, input_file, mode):
+    base, ext = os.path.splitext(os.path.basename(input_file))
+    return os.path.join(output_dir, f"{base}{SCAN_TASKS[mode]['output_suffix']}{ext}")
+
+def run_verifier(mode, input_file, output_file_path, threads, timeout, extra_args=()):
+    """运行 protocol/deep 验证器或多协议识别器并把记录并入结果日志, 返回 (耗时秒数, 主机健康统计, 引擎峰值 RSS MB)。"""
+    record_file = output_file_path + ".records"
+    threads = net_limits.check(threads, port_range=net_limits.port_range_from_args(extra_args))
+    cmd_args = ["-inputFile", input_file, "-outputFile", output_file_path, "-threads", str(threads), "-timeout", str(timeout),
+                "-recordFile", record_file, "-recordMode", str(result_log.MODES[mode])] + list(extra_args)
+    stats_file = None
+    if mode in ("protocol", "deep"):
+        stats_file = output_file_path + ".hosts.json"
+        cmd_args += ["-hostStats", stats_file]
+    
+    start_time = time.time()
+    try:
+        peak_rss = run_go_executable(SCAN_TASKS[mode]["engine"], cmd_args)
+    finally:
+        merge_records(record_file)  # 异常退出时也保留已写出的记录
+    end_time = time.time()
+    return end_time - start_time, batch_jobs.read_host_stats(stats_file) if stats_file else None, peak_rss
 
 def execute_scan_task(config, output_dir, mode):
-    task_map = {
-        "protocol": {
-            "header": "验证Socks5协议 (快速)", "desc": "此模式只检查目标是否响应SOCKS5握手，不测试其可用性。",
-            "threads_prompt": "并发数 (默认500): ", "threads_default": "500", "timeout_prompt": "超时(秒, 推荐5): ", "timeout_default": "5",
-            "output_suffix": "_protocol_verified"
-        },
-        "deep": {
-            "header": "扫描公共代理 (无认证)", "desc": "此功能将深度验证代理，确保其不仅是SOCKS5服务，还能实际连接到目标网站。",
-            "threads_prompt": "并发数 (默认200): ", "threads_default": "200", "timeout_prompt": "超时(秒, 推荐10): ", "timeout_default": "10",
-            "output_suffix": "_deep_verified"
-        }
-    }
-    task = task_map[mode]
+    task = SCAN_TASKS[mode]
     print_header(task["header"]); print(task["desc"])
     
     input_file = get_validated_input("请输入原始目标文件路径: ", validate_file_exists, "文件不存在。")
@@ -694,22 +1319,89 @@ def execute_scan_task(config, output_dir, mode):
         
     if total_targets == 0: print("输入文件为空，任务取消。"); return
 
-    threads = get_validated_input(task["threads_prompt"], lambda x: x=="" or validate_positive_integer(x), "") or task["threads_default"]
-    timeout = get_validated_input(task["timeout_prompt"], lambda x: x=="" or validate_positive_integer(x), "") or task["timeout_default"]
+    threads_prompt, threads_default = task["threads_prompt"], task["threads_default"]
+    timeout_prompt, timeout_default = task["timeout_prompt"], task["timeout_default"]
+    if mode in ("protocol", "deep") and input("是否先抽样估算推荐的并发数与超时? (y/N): ").lower() == 'y':
+        est = run_estimate.estimate(input_file, mode, memory_limit=MEMORY_LIMIT_MB, default_timeout=int(timeout_default))
+        if est:
+            threads_default, timeout_default = str(est["threads"]), str(est["timeout"])
+            threads_prompt, timeout_prompt = f"并发数 (推荐{threads_default}): ", f"超时(秒, 推荐{timeout_default}): "
+
+    threads = get_validated_input(threads_prompt, lambda x: x=="" or validate_positive_integer(x), "") or threads_default
+    timeout = get_validated_input(timeout_prompt, lambda x: x=="" or validate_positive_integer(x), "") or timeout_default
     
-    base, ext = os.path.splitext(os.path.basename(input_file))
-    output_file_path = os.path.join(output_dir, f"{base}{task['output_suffix']}{ext}")
+    extra_args = []
+    if mode == "classify" and input("目标是否以 HTTP 代理为主? 是则先按 HTTP 探测 (y/N): ").lower() == 'y':
+        extra_args.append("-httpFirst")
+    extra_args += batch_jobs.engine_args(config, batch_jobs.COMMON_OPTIONS)
+
+    output_file_path = default_output_path(output_dir, input_file, mode)
     print(f"结果将实时保存至: {output_file_path}")
     
-    cmd_args = ["-inputFile", input_file, "-outputFile", output_file_path, "-threads", threads, "-timeout", timeout]
-    
-    start_time = time.time()
-    run_go_executable(mode+"_verifier", cmd_args) # "protocol_verifier" or "deep_verifier"
-    end_time = time.time()
-    
-    duration = end_time - start_time
+    try:
+        duration, _, _ = run_verifier(mode, input_file, output_file_path, threads, timeout, extra_args)
+    except ENGINE_ERRORS as e:
+        print(f"任务失败: {e}"); return
     prompt_and_send_telegram(config, output_file_path, total_targets, duration)
 
+# --- 无人值守批处理 ---
+def run_jobs(config, output_dir, job_file, summary_path=None):
+    """按任务文件顺序执行扫描, 不做任何交互; 每个任务结束后输出一行 JSON 摘要。"""
+    jobs = batch_jobs.load_jobs(job_file)
+    engines = {mode: task["engine"] for mode, task in SCAN_TASKS.items()}
+    engines["scanner"] = "scanner"
+    if not prepare_engines({engines[job.get("mode", "deep")] for job in jobs if job.get("mode", "deep") in engines}):
+        return len(jobs)
+    summary = batch_jobs.SummaryWriter(summary_path)
+    failed = 0
+    try:
+        for job in jobs:
+            mode = job.get("mode", "deep")
+            started = time.time()
+            total_targets = batch_jobs.count_lines(job["input"])
+            print_header(f"批处理任务 {job['name']} ({mode}): {job['input']}")
+            if mode not in ("protocol", "deep", "classify", "scanner") or not os.path.exists(job["input"]) or \
+                    (mode == "scanner" and not os.path.exists(job.get("dict", ""))):
+                summary.write(job, started, total_targets, 0, status="invalid", mode=mode)
+                failed += 1
+                continue
+            host_stats = rank_info = trace_file = output_file_path = None
+            try:
+                if mode == "scanner":
+                    output_file_path, peak_rss = run_auth_scan(job["input"], job["dict"], job.get("threads", 100), job.get("timeout", 5),
+                                                               output_dir, batch_jobs.engine_args(job, batch_jobs.COMMON_OPTIONS))
+                else:
+                    task = SCAN_TASKS[mode]
+                    output_file_path = job.get("output") or default_output_path(output_dir, job["input"], mode)
+                    extra_args = ["-httpFirst"] if job.get("http_first") else []
+                    extra_args += batch_jobs.engine_args(job, batch_jobs.COMMON_OPTIONS if mode == "classify" else None)
+                    if mode != "classify":
+                        args, trace_file = batch_jobs.trace_args(job, output_file_path)
+                        extra_args += args
+                    input_file, rank_info = batch_jobs.ranked_input(job, output_file_path, mode)
+                    try:
+                        _, host_stats, peak_rss = run_verifier(mode, input_file, output_file_path, job.get("threads", task["threads_default"]),
+                                                     job.get("timeout", task["timeout_default"]), extra_args)
+                    finally:
+                        if rank_info: os.remove(input_file)
+            except ENGINE_ERRORS as e:
+                summary.write(job, started, total_targets, 0, status=batch_jobs.failure_status(e), mode=mode, output=output_file_path)
+                failed += 1
+                continue
+            found = batch_jobs.count_lines(output_file_path)
+            extra = {"host_health": host_stats} if host_stats else {}
+            if rank_info: extra["ranking"] = rank_info
+            trace_info = batch_jobs.trace_summary(trace_file)
+            if trace_info: extra["trace"] = trace_info
+            if peak_rss is not None: extra["peak_rss_mb"] = round(peak_rss, 1)
+            summary.write(job, started, total_targets, found, mode=mode, output=output_file_path, **extra)
+            if job.get("telegram") and found and config.get("bot_token") and config.get("chat_id"):
+                DELIVERY.submit(config, output_file_path, total_targets, time.time() - started)
+    finally:
+        summary.close()
+        DELIVERY.wait()
+    return failed
+
 def handle_discover_usability(config, output_dir):
     while True:
         print_header("发现可用Socks5 (深度)")
@@ -723,24 +1415,46 @@ def handle_discover_usability(config, output_dir):
         else: print("无效输入，请重新选择。")
 
 def main():
-    if not compile_go_binaries(): sys.exit(1)
+    global ENGINE_PREFERENCE, MEMORY_LIMIT_MB
+    parser = argparse.ArgumentParser(description="SOCKS5 验证与发现工具 (无参数时进入交互菜单)")
+    parser.add_argument("--jobs", help="无人值守模式: JSON 任务文件")
+    parser.add_argument("--summary", help="任务摘要输出文件 (JSON Lines, 默认 stdout)")
+    parser.add_argument("--prebuilt", help="预编译Go核心程序目录 (见 go_build.py export), 命中时无需 Go 环境")
+    parser.add_argument("--engine", choices=["auto", "go", "python"], default="auto",
+                        help="protocol/deep 验证使用的引擎, auto 在没有 Go 时改用 Python 异步引擎")
+    parser.add_argument("--memory-limit", type=int, metavar="MB",
+                        help="内存预算: 引擎设置软上限并按预算限制并发与缓冲, 接近上限时放慢 (小内存 VPS)")
+    args = parser.parse_args()
+    if args.prebuilt: BUILD_CACHE.prebuilt_dir = args.prebuilt
+    ENGINE_PREFERENCE = args.engine
+    MEMORY_LIMIT_MB = args.memory_limit
     
     config = load_config()
     session_timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
     output_dir = f"toolkit_session_{session_timestamp}"
     os.makedirs(output_dir, exist_ok=True)
+
+    if args.jobs:
+        print(f"--- 无人值守模式: 任务文件 '{args.jobs}', 输出目录 '{output_dir}' ---")
+        try:
+            failed = run_jobs(config, output_dir, args.jobs, args.summary)
+        except ValueError as e:
+            print(f"错误: {e}"); sys.exit(2)
+        sys.exit(1 if failed else 0)
     
     print("\n" + "*"*60); print(" " * 15 + "SOCKS5 验证与发现工具 (配置版)"); print(f"--- 本次会话所有输出文件将保存在: '{output_dir}' 目录 ---")
-    print(f"--- 配置文件: '{CONFIG_FILE}', Go核心缓存: '{CACHE_DIR}' ---"); print("*"*60)
+    print(f"--- 配置文件: '{CONFIG_FILE}', Go核心缓存: '{BUILD_CACHE.cache_dir}', 结果日志: '{RESULT_LOG_FILE}' ---"); print("*"*60)
 
     while True:
         print("\n--- 主菜单 ---")
-        print("  [1] 验证Socks5协议 (快速初筛)"); print("  [2] 发现可用Socks5 (深度验证)"); print("  [3] 设置"); print("  [4] 退出程序")
-        choice = input("\n请输入您的选择 [1-4]: ")
+        print("  [1] 验证Socks5协议 (快速初筛)"); print("  [2] 发现可用Socks5 (深度验证)"); print("  [3] 设置")
+        print("  [4] 多协议识别 (SOCKS5/SOCKS4/HTTP)"); print("  [5] 退出程序")
+        choice = input("\n请输入您的选择 [1-5]: ")
         if choice == '1': execute_scan_task(config, output_dir, "protocol")
         elif choice == '2': handle_discover_usability(config, output_dir)
         elif choice == '3': handle_config_menu(config)
-        elif choice == '4': print("感谢使用，再见！"); break
+        elif choice == '4': execute_scan_task(config, output_dir, "classify")
+        elif choice == '5': DELIVERY.wait(); print("感谢使用，再见！"); break
         else: print("无效的输入。")
         input("\n按 Enter 键返回主菜单...")
 
@@ -0,0 +1,184 @@
+"""
+分析 Go 引擎 -traceFile 写出的采样阶段时间线, 找出拖慢尾部的阶段。
+
+文件格式: 8 字节文件头 ("PSTR", 版本 uint16, 阶段数 uint8, 保留) 后接定长记录, 每条为
+16 字节地址、端口、模式、标志 (1 随机采样, 2 仅因超过 -traceSlow 记录)、状态、开始时间、总耗时 (微秒)
+以及各阶段结束时距开始的微秒数 (未到达为 0xFFFFFFFF)。阶段耗时为相邻打点之差, 超时会记在卡住的阶段上。
+
+用法:
+    python socks5.py --jobs jobs.json       # 任务中设置 "trace_rate": 0.05, "trace_slow_ms": 5000
+    python trace_analyze.py out_deep_verified.txt.trace
+    python trace_analyze.py a.trace b.trace --tail-ms 3000 --json
+"""
+import argparse
+import json
+import struct
+import sys
+
+import result_log
+
+HEADER = struct.Struct("<4sHBx")
+HEADER_MAGIC = b"PSTR"
+PHASES = ["dial", "greet_write", "greet_read", "connect_write", "connect_read",
+          "http_write", "http_read", "http_body", "verify", "close"]
+NOT_REACHED = 0xFFFFFFFF
+FLAG_SAMPLED = 1
+TAIL_QUANTILE = 0.9
+OTHER_MIN_US = 1000          # 最后打点之后不足 1 毫秒的剩余不单列
+
+HINTS = {
+    "dial": "建连慢: 缩短超时或调低 -hostFailTimeout / -hostFailLimit, 让不可达主机尽早退出",
+    "greet_write": "写问候慢: 本机发送缓冲或端口耗尽, 检查 net_limits.py 预检与 -sockProfile",
+    "greet_read": "问候应答慢: 端口开放但不说 SOCKS5, 可先用 protocol 模式或识别器初筛",
+    "connect_write": "写 CONNECT 慢: 代理接收缓慢, 通常与问候阶段同源",
+    "connect_read": "CONNECT 应答慢: 代理出口到目标站慢, 换更近的验证目标或缩短读超时",
+    "http_write": "写 HTTP 请求慢: 代理接收缓慢",
+    "http_read": "等待响应首字节慢: 代理出口或验证 URL 慢, 换更快的 -target",
+    "http_body": "读响应体慢: 验证 URL 响应过大或限速",
+    "verify": "Web 服务器复核慢: 复核请求沿用完整超时",
+    "close": "关闭慢: 考虑 -sockProfile 中止关闭",
+}
+
+
+def record_struct(phase_count):
+    return struct.Struct(f"<16sHBBh2xII{phase_count}I")
+
+
+def iter_records(path):
+    """逐条产出 (地址, 端口, 模式, 标志, 状态, 开始时间, 总耗时微秒, 阶段打点列表)。"""
+    with open(path, "rb") as f:
+        head = f.read(HEADER.size)
+        if not head:
+            return
+        magic, version, phase_count = HEADER.unpack(head)
+        if magic != HEADER_MAGIC or version != 1:
+            raise ValueError(f"{path} 不是时间线文件")
+        rec = record_struct(phase_count)
+        while True:
+            chunk = f.read(rec.size * result_log.READ_BATCH)
+            if not chunk:
+                return
+            usable = len(chunk) - len(chunk) % rec.size   # 丢弃被中断写入的末条记录
+            for fields in rec.iter_unpack(chunk[:usable]):
+                ip, port, mode, flags, status, ts, total = fields[:7]
+                yield result_log.unpack_ip(ip), port, mode, flags, status, ts, total, fields[7:]
+
+
+def phase_durations(marks, total):
+    """按打点时间顺序计算各阶段耗时 (微秒), 返回 {阶段: 耗时}; 最后打点之后的剩余计入 "other"。"""
+    reached = sorted((m, i) for i, m in enumerate(marks) if m != NOT_REACHED)
+    durations, prev = {}, 0
+    for m, i in reached:
+        durations[PHASES[i] if i < len(PHASES) else f"phase{i}"] = max(m - prev, 0)
+        prev = max(prev, m)
+    if total - prev >= OTHER_MIN_US:
+        durations["other"] = total - prev
+    return durations
+
+
+def _quantile(sorted_values, q):
+    if not sorted_values:
+        return 0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def analyze(paths, mode=None, status=None, tail_ms=None):
+    mode_id = result_log.MODES.get(mode, mode) if mode else None
+    rows = []
+    for path in paths:
+        for _, _, r_mode, flags, r_status, _, total, marks in iter_records(path):
+            if (mode_id and r_mode != mode_id) or (status == "ok" and r_status != 0) or (status == "fail" and r_status == 0):
+                continue
+            rows.append((flags, r_status, total, phase_durations(marks, total)))
+    sampled_totals = sorted(r[2] for r in rows if r[0] & FLAG_SAMPLED)
+    threshold = tail_ms * 1000 if tail_ms else _quantile(sampled_totals, TAIL_QUANTILE)
+
+    per_phase, statuses = {}, {}
+    tail = [r for r in rows if r[2] >= threshold and r[2] > 0]
+    tail_time, tail_dominant = {}, {}
+    for flags, r_status, total, durations in rows:
+        statuses[r_status] = statuses.get(r_status, 0) + 1
+        if flags & FLAG_SAMPLED:
+            for name, d in durations.items():
+                per_phase.setdefault(name, []).append(d)
+    for _, _, total, durations in tail:
+        for name, d in durations.items():
+            tail_time[name] = tail_time.get(name, 0) + d
+        if durations:
+            top = max(durations, key=durations.get)
+            tail_dominant[top] = tail_dominant.get(top, 0) + 1
+    tail_total = sum(tail_time.values()) or 1
+    ms = lambda us: round(us / 1000, 1)
+    report = {
+        "records": len(rows),
+        "sampled": len(sampled_totals),
+        "statuses": {str(k): v for k, v in sorted(statuses.items())},
+        "total_ms": {"p50": ms(_quantile(sampled_totals, 0.5)), "p90": ms(_quantile(sampled_totals, 0.9)),
+                     "p99": ms(_quantile(sampled_totals, 0.99)), "max": ms(sampled_totals[-1]) if sampled_totals else 0},
+        "phases": {},
+        "tail": {"threshold_ms": ms(threshold), "records": len(tail), "time_share": {}, "dominant": {}},
+    }
+    for name in PHASES + ["other"]:
+        values = sorted(per_phase.get(name, []))
+        if values:
+            report["phases"][name] = {"n": len(values), "p50": ms(_quantile(values, 0.5)),
+                                      "p90": ms(_quantile(values, 0.9)), "p99": ms(_quantile(values, 0.99))}
+    for name, t in sorted(tail_time.items(), key=lambda kv: -kv[1]):
+        report["tail"]["time_share"][name] = round(t / tail_total, 4)
+    for name, n in sorted(tail_dominant.items(), key=lambda kv: -kv[1]):
+        report["tail"]["dominant"][name] = n
+    return report
+
+
+def summarize(path):
+    """批处理摘要用的简要结果; 文件不存在或为空时返回 None。"""
+    try:
+        report = analyze([path])
+    except (OSError, ValueError):
+        return None
+    if not report["records"]:
+        return None
+    share = report["tail"]["time_share"]
+    top = next(iter(share), None)
+    return {"file": path, "records": report["records"], "p99_ms": report["total_ms"]["p99"],
+            "tail_phase": top, "tail_share": share.get(top)}
+
+
+def print_report(report):
+    print(f"记录 {report['records']} 条 (随机采样 {report['sampled']} 条); 状态分布: "
+          + ", ".join(f"{k}:{v}" for k, v in report["statuses"].items()))
+    t = report["total_ms"]
+    print(f"总耗时 (采样, 毫秒): p50 {t['p50']}  p90 {t['p90']}  p99 {t['p99']}  max {t['max']}")
+    print(f"\n{'阶段':<14}{'次数':>8}{'p50':>10}{'p90':>10}{'p99':>10}  (毫秒)")
+    for name, s in report["phases"].items():
+        print(f"{name:<14}{s['n']:>8}{s['p50']:>10}{s['p90']:>10}{s['p99']:>10}")
+    tail = report["tail"]
+    print(f"\n尾部 (总耗时 >= {tail['threshold_ms']} 毫秒, {tail['records']} 条) 的耗时构成:")
+    for name, share in tail["time_share"].items():
+        print(f"  {name:<14}{share:>8.1%}   主导 {tail['dominant'].get(name, 0)} 条")
+    top = next(iter(tail["time_share"]), None)
+    if top in HINTS:
+        print(f"\n建议优先处理 {top}: {HINTS[top]}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="分析采样阶段时间线, 找出拖慢尾部的阶段")
+    parser.add_argument("traces", nargs="+", help="-traceFile 写出的文件")
+    parser.add_argument("--mode", choices=sorted(result_log.MODES), help="只分析该模式的记录")
+    parser.add_argument("--status", choices=["all", "ok", "fail"], default="all")
+    parser.add_argument("--tail-ms", type=int, help="尾部阈值 (毫秒), 默认取采样总耗时的 p90")
+    parser.add_argument("--json", action="store_true", help="输出 JSON")
+    args = parser.parse_args(argv)
+    report = analyze(args.traces, args.mode, args.status, args.tail_ms)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except (OSError, ValueError) as e:
+        print(f"错误: {e}")
+        sys.exit(1)